@@ -8,6 +8,18 @@ from flask_cors import CORS
 sys.path.append(str(Path(__file__).parent.parent))
 
 from routes import register_routes
+from utils.warp_cache import shared_warp_cache
+from utils.asset_pack import set_shared_asset_pack
+from utils.uploads import StreamingUploadRequest
+from models.dress_segmentation import shared_dress_segmenter
+from utils.registry import component_registry
+from utils.result_cache import ResultCache
+from models.silhouette import SilhouetteRenderer
+from models.dress_assets import DressAssetStore
+from fittingroom.dress_asset_jobs import DressAssetJobs
+from fittingroom.try_on_jobs import TryOnJobQueue
+from utils.image_store import ImageStore
+from utils.image_encoding import ImageEncoder
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -19,56 +31,150 @@ MODEL_PATH = os.path.join(DATA_DIR, 'models/body_shape_classifier.pkl')
 CATALOG_PATH = os.path.join(DATA_DIR, 'processed/dress_catalog.csv')
 RESULTS_DIR = os.path.join(DATA_DIR, 'results')
 TEMP_DIR = os.path.join(DATA_DIR, 'temp')
+WARP_CACHE_DIR = os.path.join(DATA_DIR, 'warp_cache')
+DRESS_ASSETS_DIR = os.path.join(DATA_DIR, 'dress_assets')
+ASSET_PACK_PATH = os.environ.get('ASSET_PACK_PATH', os.path.join(DATA_DIR, 'assets.pack'))
+PERSIST_WARP_FIELDS = os.environ.get('PERSIST_WARP_FIELDS', 'False').lower() in ('true', '1', 't')
+WARP_CACHE_MAX_BYTES = int(os.environ.get('WARP_CACHE_MAX_MB', 128)) * 1024 * 1024
+WARP_CACHE_DIR_MAX_BYTES = int(os.environ.get('WARP_CACHE_DIR_MAX_MB', 512)) * 1024 * 1024
+RESULT_CACHE_DIR = os.path.join(RESULTS_DIR, 'try_on_cache')
+RESULT_CACHE_MAX_BYTES = int(os.environ.get('RESULT_CACHE_MAX_MB', 512)) * 1024 * 1024
+IMAGE_STORE_MAX_BYTES = int(os.environ.get('IMAGE_STORE_MAX_MB', 256)) * 1024 * 1024
+PNG_COMPRESSION_LEVEL = os.environ.get('PNG_COMPRESSION_LEVEL')
+WEBP_QUALITY = int(os.environ.get('WEBP_QUALITY', 80))
+JPEG_QUALITY = int(os.environ.get('JPEG_QUALITY', 85))
+# Wall time GrabCut may spend on a dress without a plain background, 0 for no limit
+SEGMENTATION_BUDGET_MS = float(os.environ.get('SEGMENTATION_BUDGET_MS', 400))
+PRECOMPUTE_DRESS_ASSETS = os.environ.get('PRECOMPUTE_DRESS_ASSETS', 'True').lower() in ('true', '1', 't')
+DRESS_ASSET_WORKERS = int(os.environ.get('DRESS_ASSET_WORKERS', 1))
+TRYON_WORKERS = int(os.environ.get('TRYON_WORKERS', 2))
+TRYON_MAX_PENDING = int(os.environ.get('TRYON_MAX_PENDING', 8))
+# Job status files, read by every Flask worker sharing the data directory
+JOB_STATUS_DIR = os.path.join(RESULTS_DIR, 'jobs')
+WARM_UP_COMPONENTS = os.environ.get('WARM_UP_COMPONENTS', 'True').lower() in ('true', '1', 't')
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(RESULTS_DIR, exist_ok=True)
 os.makedirs(TEMP_DIR, exist_ok=True)
+# Exists from the start so the fitting room picks up bundles built after it was created
+os.makedirs(DRESS_ASSETS_DIR, exist_ok=True)
 os.makedirs(os.path.join(UPLOAD_FOLDER, 'dresses'), exist_ok=True)
 
+def load_classifier(model_path):
+    """Load the body shape classifier, returning (model, scaler) or None"""
+    if not os.path.exists(model_path):
+        logger.warning(f"Body shape classifier not found at {model_path}")
+        return None
+    
+    import pickle
+    with open(model_path, 'rb') as f:
+        model_data = pickle.load(f)
+    
+    # train.py pickles a (model, scaler) tuple; also accept a dict with the same entries
+    if isinstance(model_data, dict):
+        model, scaler = model_data.get('model'), model_data.get('scaler')
+    else:
+        model, scaler = model_data
+    
+    logger.info(f"Loaded body shape classifier from {model_path}")
+    return model, scaler
+
+def load_catalog(catalog_path):
+    """Load the dress catalog service, returning (catalog, recommender) or None"""
+    if not os.path.exists(catalog_path):
+        logger.warning(f"Dress catalog not found at {catalog_path}")
+        return None
+    
+    # One catalog per process; requests share the parsed catalog and its indexes
+    from models.dress_catalog import DressCatalog
+    from models.dress_transformer import DressRecommender
+    catalog_service = DressCatalog(catalog_path)
+    logger.info(f"Loaded dress catalog with {len(catalog_service)} items")
+    return catalog_service, DressRecommender(catalog_service)
+
 def create_app():
     """Create and configure Flask application"""
     app = Flask(__name__)
+    # Uploaded files are streamed to disk in chunks instead of being buffered
+    app.request_class = StreamingUploadRequest
     
     CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True)
 
     app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
     app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max upload size
+    # Same filesystem as the dress uploads, so saving one is a rename
+    app.config['UPLOAD_TMP_DIR'] = os.path.join(UPLOAD_FOLDER, 'dresses')
     app.config['DATA_DIR'] = DATA_DIR
     app.config['MODEL_PATH'] = MODEL_PATH
     app.config['CATALOG_PATH'] = CATALOG_PATH
     app.config['RESULTS_DIR'] = RESULTS_DIR
     app.config['TEMP_DIR'] = TEMP_DIR
     app.config['ALLOWED_EXTENSIONS'] = ALLOWED_EXTENSIONS
+    app.config['WARP_CACHE_DIR'] = WARP_CACHE_DIR if PERSIST_WARP_FIELDS else None
+    app.config['WARP_CACHE_MAX_BYTES'] = WARP_CACHE_MAX_BYTES
+    app.config['WARP_CACHE_DIR_MAX_BYTES'] = WARP_CACHE_DIR_MAX_BYTES
+    app.config['DRESS_ASSETS_DIR'] = DRESS_ASSETS_DIR
+    app.config['PRECOMPUTE_DRESS_ASSETS'] = PRECOMPUTE_DRESS_ASSETS
+    app.config['JOB_STATUS_DIR'] = JOB_STATUS_DIR
+    app.config['ASSET_PACK_PATH'] = ASSET_PACK_PATH if os.path.exists(ASSET_PACK_PATH) else None
+    app.config['RESULT_CACHE_DIR'] = RESULT_CACHE_DIR
+    app.config['RESULT_CACHE_MAX_BYTES'] = RESULT_CACHE_MAX_BYTES
+    app.config['IMAGE_STORE_MAX_BYTES'] = IMAGE_STORE_MAX_BYTES
+    app.config['PNG_COMPRESSION_LEVEL'] = int(PNG_COMPRESSION_LEVEL) if PNG_COMPRESSION_LEVEL else None
+    app.config['WEBP_QUALITY'] = WEBP_QUALITY
+    app.config['JPEG_QUALITY'] = JPEG_QUALITY
+    app.config['SEGMENTATION_BUDGET_MS'] = SEGMENTATION_BUDGET_MS if SEGMENTATION_BUDGET_MS > 0 else None
+    
+    # Optionally keep warp fields on disk so restarts and other workers can mmap them
+    shared_warp_cache.set_max_bytes(app.config['WARP_CACHE_MAX_BYTES'], app.config['WARP_CACHE_DIR_MAX_BYTES'])
+    if app.config['WARP_CACHE_DIR']:
+        shared_warp_cache.set_persist_dir(app.config['WARP_CACHE_DIR'])
+        logger.info(f"Persisting warp fields to {app.config['WARP_CACHE_DIR']}")
+    
+    shared_dress_segmenter.set_time_budget(app.config['SEGMENTATION_BUDGET_MS'])
+    
+    # Templates, dress bundles and standard bodies mapped once and shared by every worker
+    if app.config['ASSET_PACK_PATH']:
+        set_shared_asset_pack(app.config['ASSET_PACK_PATH'])
+        logger.info(f"Mapped shared asset pack {app.config['ASSET_PACK_PATH']}")
+    
+    # The classifier and catalog are loaded on first use, or by the background warm-up,
+    # so the server starts answering health checks immediately
+    component_registry.register('classifier', lambda: load_classifier(app.config['MODEL_PATH']))
+    component_registry.register('catalog', lambda: load_catalog(app.config['CATALOG_PATH']))
+    
+    # Rendered try-ons are stored once per distinct input, bounded on disk
+    component_registry.register('try_on_results', lambda: ResultCache(
+        app.config['RESULT_CACHE_DIR'], max_bytes=app.config['RESULT_CACHE_MAX_BYTES'],
+        encoder=component_registry.get('image_encoder')
+    ))
+    component_registry.register('silhouette_renderer', lambda: SilhouetteRenderer(
+        app.config['RESULTS_DIR'], encoder=component_registry.get('image_encoder')
+    ))
+    # Result encoding: tunable PNG for downloads, WebP/JPEG for previews
+    component_registry.register('image_encoder', lambda: ImageEncoder(
+        png_level=app.config['PNG_COMPRESSION_LEVEL'],
+        webp_quality=app.config['WEBP_QUALITY'],
+        jpeg_quality=app.config['JPEG_QUALITY']
+    ))
+    # Decoded images passed between endpoints in the opt-in in-memory flow
+    component_registry.register('image_store', lambda: ImageStore(
+        max_bytes=app.config['IMAGE_STORE_MAX_BYTES'], encoder=component_registry.get('image_encoder')
+    ))
+    # Prebuilt dress bundles; uploaded dresses are segmented in the background, off the try-on path
+    component_registry.register('dress_assets', lambda: DressAssetStore(app.config['DRESS_ASSETS_DIR']))
+    component_registry.register('dress_asset_jobs', lambda: DressAssetJobs(
+        component_registry.get('dress_assets'), max_workers=DRESS_ASSET_WORKERS,
+        status_dir=os.path.join(app.config['JOB_STATUS_DIR'], 'dress_assets')
+    ) if app.config['PRECOMPUTE_DRESS_ASSETS'] else None)
+    # Queued try-ons; any worker can answer a poll through the status files
+    component_registry.register('try_on_jobs', lambda: TryOnJobQueue(
+        max_workers=TRYON_WORKERS, max_pending=TRYON_MAX_PENDING,
+        status_dir=os.path.join(app.config['JOB_STATUS_DIR'], 'try_on')
+    ))
     
-    try:
-        # Load body shape classifier if it exists
-        if os.path.exists(MODEL_PATH):
-            import pickle
-            with open(MODEL_PATH, 'rb') as f:
-                model_data = pickle.load(f)
-                app.config['MODEL'] = model_data.get('model')
-                app.config['SCALER'] = model_data.get('scaler')
-                logger.info(f"Loaded body shape classifier from {MODEL_PATH}")
-        else:
-            logger.warning(f"Body shape classifier not found at {MODEL_PATH}")
-            app.config['MODEL'] = None
-            app.config['SCALER'] = None
-        
-        # Load dress catalog if it exists
-        if os.path.exists(CATALOG_PATH):
-            import pandas as pd
-            dress_catalog = pd.read_csv(CATALOG_PATH)
-            app.config['DRESS_CATALOG'] = dress_catalog
-            logger.info(f"Loaded dress catalog with {len(dress_catalog)} items")
-        else:
-            logger.warning(f"Dress catalog not found at {CATALOG_PATH}")
-            app.config['DRESS_CATALOG'] = None
-        
-    except Exception as e:
-        logger.error(f"Error initializing components: {str(e)}")
-        app.config['MODEL'] = None
-        app.config['SCALER'] = None
-        app.config['DRESS_CATALOG'] = None
+    if WARM_UP_COMPONENTS:
+        component_registry.warm_up()
     
     # Add helper function to check allowed files
     def allowed_file(filename):
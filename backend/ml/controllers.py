@@ -1,34 +1,103 @@
 import os
 import logging
-import numpy as np
 import time
 import cv2
-from flask import jsonify
+from flask import jsonify, Response
 from werkzeug.utils import secure_filename
 
-from models.body_model import BodyModel
-from models.dress_transformer import DressTransformer
-from utils.visualization import DressLinkVisualizer
-from fittingroom.virtual_try_on import VirtualFittingRoom
-from fittingroom.image_processor import ImageProcessor
-from fittingroom.body_allignment import BodyAligner
-
-virtual_fitting_room = VirtualFittingRoom()
-image_processor = ImageProcessor()
-body_aligner = BodyAligner()
-visualizer = DressLinkVisualizer()
+from models.body_shape import build_feature_arrays, classify_batch as classify_body_shapes
+from models.silhouette import SilhouetteRenderer
+from utils.registry import component_registry
+from utils.image_store import image_url, image_handle
+from utils.image_io import image_header
+from utils.uploads import save_upload
+from fittingroom.fit_adjustment import (
+    adjust_fit_image,
+    AdjustFitEngine,
+    lattice_parameters
+)
+from fittingroom.try_on_jobs import (
+    QueueFullError,
+    overlay_on_silhouette,
+    overlay_height,
+    load_overlay_dress,
+    dress_source,
+    run_overlay_try_on,
+    run_fitting_room_try_on
+)
 
 logger = logging.getLogger(__name__)
 
+# Chunk size for image bodies streamed back by adjust-fit
+STREAM_CHUNK_SIZE = 64 * 1024
+
+def _create_virtual_fitting_room():
+    from fittingroom.virtual_try_on import VirtualFittingRoom
+    # Same data directory as the app, so precomputed dress bundles are found
+    return VirtualFittingRoom(data_dir=os.environ.get('DATA_DIR'),
+                              blend_mode=os.environ.get('TRYON_BLEND_MODE', 'fixed'))
+
+def _create_image_processor():
+    from fittingroom.image_processor import ImageProcessor
+    return ImageProcessor()
+
+def _create_body_aligner():
+    from fittingroom.body_allignment import BodyAligner
+    return BodyAligner()
+
+def _create_adjust_fit_engine():
+    return AdjustFitEngine()
+
+def _create_visualizer():
+    from utils.visualization import DressLinkVisualizer
+    return DressLinkVisualizer()
+
+def encoded_response(encoded, chunk_size=None):
+    """
+    Response with encoded image bytes, their encode time and size in headers.
+
+    Args:
+        encoded: EncodedImage to send
+        chunk_size: When given, send the body from a generator in chunks of this many bytes
+
+    Returns:
+        flask.Response
+    """
+    headers = {
+        "X-Encode-Time-Ms": f"{encoded.encode_ms:.1f}",
+        "X-Encoded-Bytes": str(len(encoded.data))
+    }
+    if chunk_size is None:
+        return Response(encoded.data, mimetype=encoded.mimetype, headers=headers)
+
+    def generate():
+        view = memoryview(encoded.data)
+        for start in range(0, len(view), chunk_size):
+            yield bytes(view[start:start + chunk_size])
+
+    headers["Content-Length"] = str(len(encoded.data))
+    return Response(generate(), mimetype=encoded.mimetype, headers=headers, direct_passthrough=True)
+
+# Heavy components (Haar cascades, matplotlib, sklearn) are built on first use
+# so importing the controllers stays cheap
+component_registry.register('virtual_fitting_room', _create_virtual_fitting_room)
+component_registry.register('image_processor', _create_image_processor)
+component_registry.register('body_aligner', _create_body_aligner)
+component_registry.register('visualizer', _create_visualizer)
+component_registry.register('adjust_fit_engine', _create_adjust_fit_engine)
+
 # Health controller
 class health_controller:
     @staticmethod
-    def check_health(model, catalog):
-        """Check system health"""
+    def check_health(registry):
+        """Check system health without forcing components to load"""
+        components = registry.status()
         return jsonify({
             "status": "healthy",
-            "model_loaded": model is not None,
-            "catalog_loaded": catalog is not None
+            "model_loaded": components.get('classifier', {}).get('loaded', False),
+            "catalog_loaded": components.get('catalog', {}).get('loaded', False),
+            "warming_up": registry.warming_up,
+            "components": components
         })
 
 class body_shape_controller:
@@ -36,27 +105,8 @@ class body_shape_controller:
     def get_body_shape(measurements, use_ml=True, model=None, scaler=None):
         """Determine body shape from measurements"""
         try:
-            # Extract measurements
-            bust = float(measurements.get('bust', 0))
-            waist = float(measurements.get('waist', 0))
-            hips = float(measurements.get('hips', 0))
-            height = float(measurements.get('height', 0))
-            
-            # Calculate ratios
-            bust_to_waist = bust / waist if waist > 0 else 0
-            waist_to_hip = waist / hips if hips > 0 else 0
-            bust_to_hip = bust / hips if hips > 0 else 0
-            
             # Add measurements and ratios to feature set
-            features = {
-                'bust': bust,
-                'waist': waist,
-                'hips': hips,
-                'height': height,
-                'bust_to_waist': bust_to_waist,
-                'waist_to_hip': waist_to_hip,
-                'bust_to_hip': bust_to_hip
-            }
+            features = body_shape_controller.build_features(measurements)
             
             if use_ml and model is not None and scaler is not None:
                 # Use ML model for classification
@@ -78,6 +128,67 @@ class body_shape_controller:
             logger.error(f"Error determining body shape: {str(e)}")
             raise
     
+    @staticmethod
+    def build_features(measurements):
+        """Build the measurement and ratio feature set for one user"""
+        # Extract measurements
+        bust = float(measurements.get('bust', 0))
+        waist = float(measurements.get('waist', 0))
+        hips = float(measurements.get('hips', 0))
+        height = float(measurements.get('height', 0))
+        
+        # Calculate ratios
+        bust_to_waist = bust / waist if waist > 0 else 0
+        waist_to_hip = waist / hips if hips > 0 else 0
+        bust_to_hip = bust / hips if hips > 0 else 0
+        
+        return {
+            'bust': bust,
+            'waist': waist,
+            'hips': hips,
+            'height': height,
+            'bust_to_waist': bust_to_waist,
+            'waist_to_hip': waist_to_hip,
+            'bust_to_hip': bust_to_hip
+        }
+    
+    @staticmethod
+    def get_body_shape_batch(measurements_list, use_ml=True, model=None, scaler=None):
+        """Determine body shapes for many users with one vectorized pass"""
+        features = body_shape_controller.build_batch_features(measurements_list)
+        body_shapes = body_shape_controller.classify_features(features, use_ml, model, scaler)
+        
+        return [
+            {
+                'body_shape': body_shape,
+                'measurements': {name: float(values[i]) for name, values in features.items()}
+            }
+            for i, body_shape in enumerate(body_shapes)
+        ]
+    
+    @staticmethod
+    def build_batch_features(measurements_list):
+        """Build measurement and ratio feature arrays for many users"""
+        return build_feature_arrays(
+            [float(m.get('bust', 0)) for m in measurements_list],
+            [float(m.get('waist', 0)) for m in measurements_list],
+            [float(m.get('hips', 0)) for m in measurements_list],
+            [float(m.get('height', 0)) for m in measurements_list]
+        )
+    
+    @staticmethod
+    def classify_features(features, use_ml=True, model=None, scaler=None):
+        """Classify feature arrays with a single scaler and model call, or the vectorized rules"""
+        if not (use_ml and model is not None and scaler is not None):
+            model, scaler = None, None
+        return [str(body_shape) for body_shape in classify_body_shapes(features, model, scaler)]
+    
+    @staticmethod
+    def classify_batch(measurements_list, use_ml=True, model=None, scaler=None):
+        """Classify many users with a single scaler and model call"""
+        features = body_shape_controller.build_batch_features(measurements_list)
+        return body_shape_controller.classify_features(features, use_ml, model, scaler)
+    
     @staticmethod
     def classify_body_shape(measurements, use_ml, model, scaler):
         """Classify body shape using ML model or rules"""
@@ -128,22 +239,25 @@ class body_shape_controller:
 # Dress recommendation controller
 class recommendation_controller:
     @staticmethod
-    def recommend_dresses(measurements, use_ml, limit, model, scaler, dress_catalog, catalog_path):
+    def recommend_dresses(measurements, use_ml, limit, model, scaler, recommender):
         """Process dress recommendation request"""
         # Check if dress catalog is available
-        if dress_catalog is None:
+        if recommender is None:
             return jsonify({"error": "Dress catalog not available"}), 503
             
-        # Get body shape and model
-        body_shape, body_model = body_shape_controller.get_body_shape(
+        # Get body shape
+        body_shape = body_shape_controller.get_body_shape(
             measurements, use_ml, model, scaler
-        )
+        )['body_shape']
         
-        # Create dress transformer
-        dress_transformer = DressTransformer(body_model, catalog_path)
+        # Build the per-request body model; the catalog is shared by the recommender
+        from models.body_model import BodyModel
+        body_model = BodyModel()
+        body_model.update_measurements(measurements)
+        body_model.body_shape = body_shape
         
         # Get dress recommendations
-        recommendations = dress_transformer.get_recommendations(limit)
+        recommendations = recommender.recommend(body_model, limit)
         
         # Return response
         response = {
@@ -154,6 +268,69 @@ class recommendation_controller:
         
         return jsonify(response)
 
+    @staticmethod
+    def recommend_dresses_batch(measurements_list, use_ml, limit, model, scaler, catalog, chunk_size=32):
+        """
+        Recommend dresses for many users at once.
+        Rows are validated and body shapes come from one model call before anything
+        is streamed, so those errors still reach the caller as a status code. Fit
+        scores come from a users x dresses matrix computed in chunks while streaming;
+        a chunk that fails yields error entries for its rows instead of cutting the
+        response short.
+
+        Returns:
+            Generator of one result dict per input row, in order
+        """
+        rows = []
+        for measurements in measurements_list:
+            try:
+                row = {
+                    "bust": float(measurements.get('bust', 0)),
+                    "waist": float(measurements.get('waist', 0)),
+                    "hips": float(measurements.get('hips', 0)),
+                    "height": float(measurements.get('height', 0))
+                }
+            except (AttributeError, TypeError, ValueError):
+                row = None
+            
+            if row is not None and (row["bust"] <= 0 or row["waist"] <= 0 or row["hips"] <= 0):
+                row = None
+            rows.append(row)
+        
+        valid_measurements = [row for row in rows if row is not None]
+        body_shapes = list(body_shape_controller.classify_batch(valid_measurements, use_ml, model, scaler))
+        return recommendation_controller._stream_batch(rows, body_shapes, limit, catalog, chunk_size)
+    
+    @staticmethod
+    def _stream_batch(rows, body_shapes, limit, catalog, chunk_size):
+        """Rank the valid rows chunk by chunk and yield a result or error per row"""
+        body_shapes = iter(body_shapes)
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            valid_chunk = [row for row in chunk if row is not None]
+            try:
+                rankings = iter(list(catalog.top_compatible_batch(valid_chunk, limit=limit,
+                                                                  chunk_size=max(1, len(valid_chunk)))))
+            except Exception as e:
+                # The response is already streaming, report the failure on the affected rows
+                logger.error(f"Error ranking batch rows {start}-{start + len(chunk) - 1}: {str(e)}")
+                rankings = None
+            
+            for offset, row in enumerate(chunk):
+                index = start + offset
+                if row is None:
+                    yield {"index": index, "error": "Invalid measurements provided"}
+                    continue
+                body_shape = next(body_shapes)
+                if rankings is None:
+                    yield {"index": index, "error": "Could not rank dresses for these measurements"}
+                    continue
+                yield {
+                    "index": index,
+                    "body_shape": str(body_shape),
+                    "recommendations": next(rankings)
+                }
+
 # Upload controller
 class upload_controller:
     @staticmethod
@@ -161,8 +338,8 @@ class upload_controller:
         return '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed_extensions
         
     @staticmethod
-    def upload_dress_image(request, upload_folder, allowed_extensions):
-        """Handle dress image upload for virtual try-on"""
+    def upload_dress_image(request, upload_folder, allowed_extensions, asset_jobs=None):
+        """Handle dress image upload for virtual try-on, queueing its segmentation in the background"""
         if 'file' not in request.files:
             return jsonify({"error": "No file part"}), 400
             
@@ -181,22 +358,37 @@ class upload_controller:
                 dress_dir = os.path.join(upload_folder, 'dresses')
                 os.makedirs(dress_dir, exist_ok=True)
                 
-                # Save the uploaded file
+                # Save the uploaded file, a rename when it was streamed to disk
                 file_path = os.path.join(dress_dir, f"{dress_id}_{filename}")
-                file.save(file_path)
-        
-                try:
-                   
-                    processed_path = file_path
-                except:
-                    processed_path = file_path
+                size = save_upload(file, file_path)
                 
-                return jsonify({
+                # Dimensions come from the header; the pixels are decoded later, at the size needed
+                header = image_header(file_path)
+                if header is None:
+                    os.remove(file_path)
+                    return jsonify({"error": "Uploaded file is not a valid image"}), 400
+        
+                # Try-ons look the precomputed bundle up by content, so the upload path is still used
+                processed_path = file_path
+                response = {
                     "success": True,
                     "message": f"Dress image uploaded successfully",
                     "original_path": file_path,
-                    "processed_path": processed_path
-                })
+                    "processed_path": processed_path,
+                    "width": header.width,
+                    "height": header.height,
+                    "size": size
+                }
+                
+                if asset_jobs is not None:
+                    asset = asset_jobs.submit(file_path)
+                    response.update(
+                        asset_id=asset["asset_id"],
+                        status=asset["status"],
+                        status_url=f"/api/dress-assets/{asset['asset_id']}"
+                    )
+                
+                return jsonify(response)
                 
             except Exception as e:
                 logger.error(f"Error processing uploaded dress image: {str(e)}")
@@ -204,10 +396,21 @@ class upload_controller:
         
         return jsonify({"error": "File type not allowed"}), 400
     
+    @staticmethod
+    def get_dress_asset(asset_id, asset_jobs):
+        """Report whether an uploaded dress has been segmented and is ready for try-on"""
+        if asset_jobs is None:
+            return jsonify({"error": "Dress precomputation is disabled"}), 503
+        
+        status = asset_jobs.status(asset_id)
+        if status is None:
+            return jsonify({"error": f"Invalid dress asset id: {asset_id}"}), 400
+        return jsonify(status)
+    
 #generate silhouette 
 class silhouette_controller:
     @staticmethod
-    def generate_silhouette(request_data, output_dir):
+    def generate_silhouette(request_data, output_dir, renderer=None, image_store=None):
         """Generate a silhouette from measurements"""
         try:
             # Extract data
@@ -217,91 +420,30 @@ class silhouette_controller:
             if not measurements:
                 return jsonify({"error": "No measurements provided"}), 400
             
-            # Create silhouette image
-            
-            bust = float(measurements.get('bust', 90))
-            waist = float(measurements.get('waist', 70))
-            hips = float(measurements.get('hips', 95))
-            height = float(measurements.get('height', 170))
-            
-            # Create a simple silhouette
-            width = max(300, int(max(bust, hips) * 1.5)) 
-            canvas_height = max(600, int(height * 3.5))  
-            
-            # Create a white canvas
-            silhouette = np.ones((canvas_height, width, 3), dtype=np.uint8) * 255
-            
-            # Draw head
-            head_y = int(canvas_height * 0.1)
-            head_radius = int(width * 0.1)
-            cv2.circle(silhouette, (width // 2, head_y), head_radius, (200, 200, 200), -1)
-            
-            # Draw body
-            shoulder_y = head_y + head_radius * 2
-            shoulder_width = int(bust * 1.2)
-            bust_y = int(shoulder_y + canvas_height * 0.1)
-            waist_y = int(bust_y + canvas_height * 0.15)
-            hip_y = int(waist_y + canvas_height * 0.15)
-            
-            # Scale dimensions based on body shape but maintain proportions
-            if body_shape == 'hourglass':
-                bust_width = int(bust * 1.1)
-                waist_width = int(waist * 0.9)  # Narrower waist for hourglass
-                hip_width = int(hips * 1.1)
-            elif body_shape == 'apple':
-                bust_width = int(bust * 1.1)
-                waist_width = int(waist * 1.2)  # Wider waist for apple
-                hip_width = int(hips * 1.0)
-            elif body_shape == 'pear':
-                bust_width = int(bust * 0.9)
-                waist_width = int(waist * 1.0)  
-                hip_width = int(hips * 1.2)  # Wider hips for pear
-            else:  # rectangle
-                bust_width = int(bust * 1.0)
-                waist_width = int(waist * 1.0)
-                hip_width = int(hips * 1.0)
-            
-            # Ensure all widths are within canvas bounds and at least 30% of width
-            min_width = int(width * 0.3)
-            bust_width = max(min_width, min(width - 20, bust_width))
-            waist_width = max(min_width, min(width - 20, waist_width))
-            hip_width = max(min_width, min(width - 20, hip_width))
-            
-            # Draw shoulders
-            cv2.line(silhouette, 
-                    (width // 2 - shoulder_width // 2, shoulder_y),
-                    (width // 2 + shoulder_width // 2, shoulder_y),
-                    (150, 150, 150), 3)
-            
-            # Draw body outline
-            points = np.array([
-                [width // 2 - shoulder_width // 2, shoulder_y],
-                [width // 2 - bust_width // 2, bust_y],
-                [width // 2 - waist_width // 2, waist_y],
-                [width // 2 - hip_width // 2, hip_y],
-                [width // 2 - hip_width // 3, canvas_height - 50],
-                [width // 2 + hip_width // 3, canvas_height - 50],
-                [width // 2 + hip_width // 2, hip_y],
-                [width // 2 + waist_width // 2, waist_y],
-                [width // 2 + bust_width // 2, bust_y],
-                [width // 2 + shoulder_width // 2, shoulder_y]
-            ], np.int32)
-            
-            cv2.fillPoly(silhouette, [points], (180, 180, 180))
-            cv2.polylines(silhouette, [points], True, (120, 120, 120), 2)
-            
-            # Save silhouette image
-            os.makedirs(output_dir, exist_ok=True)
-            silhouette_filename = f"silhouette_{body_shape}_{int(time.time())}.png"
-            silhouette_path = os.path.join(output_dir, silhouette_filename)
-            cv2.imwrite(silhouette_path, silhouette)
-            
-            logger.info(f"Generated silhouette with dimensions: {silhouette.shape}")
+            # Identical shapes and measurements share one rendered file
+            if renderer is None:
+                renderer = SilhouetteRenderer(output_dir)
+            
+            # Opt-in in-memory flow: the try-on reads the array straight from the image store
+            if image_store is not None and request_data.get('in_memory'):
+                session_id = request_data.get('session_id')
+                silhouette_handle = image_store.put(renderer.render_image(body_shape, measurements), session_id)
+                return jsonify({
+                    "success": True,
+                    "body_shape": body_shape,
+                    "silhouette_path": image_url(silhouette_handle, session_id),
+                    "silhouette_image": image_url(silhouette_handle, session_id),
+                    "silhouette_handle": silhouette_handle,
+                    "measurements": measurements
+                })
+            
+            silhouette_path, _ = renderer.render(body_shape, measurements)
             
             return jsonify({
                 "success": True,
                 "body_shape": body_shape,
                 "silhouette_path": silhouette_path,
+                "silhouette_image": f"/api/get-image/results/{os.path.basename(silhouette_path)}",
                 "measurements": measurements
             })
             
@@ -314,7 +456,8 @@ class silhouette_controller:
 # Try-on controller
 class try_on_controller:
     @staticmethod
-    def virtual_try_on(request_data, fitting_room=None, results_dir=None):
+    def virtual_try_on(request_data, fitting_room=None, results_dir=None, result_cache=None, image_store=None,
+                       dress_assets=None, encoder=None):
         """Perform virtual try-on with silhouette and dress"""
         try:
             # Extract data
@@ -322,11 +465,16 @@ class try_on_controller:
             dress_image = request_data.get('dress_image')
             body_shape = request_data.get('body_shape')
             measurements = request_data.get('measurements', {})
+            session_id = request_data.get('session_id')
             
             if not silhouette_path or not dress_image:
                 return jsonify({"error": "Silhouette and dress image are required"}), 400
             
-            if not os.path.exists(silhouette_path):
+            # A silhouette kept in the image store is used without touching the disk
+            silhouette_handle = image_handle(silhouette_path) if image_store is not None else None
+            in_memory = image_store is not None and request_data.get('in_memory', silhouette_handle is not None)
+            
+            if silhouette_handle is None and not os.path.exists(silhouette_path):
                 return jsonify({"error": f"Silhouette image not found at {silhouette_path}"}), 404
                 
             if not os.path.exists(dress_image):
@@ -337,13 +485,43 @@ class try_on_controller:
                 results_dir = "e:/Induvidual project/Dresslink-platform/backend/data/results"
             os.makedirs(results_dir, exist_ok=True)
             
-            # Generate result filename
-            result_filename = f"try_on_{body_shape}_{int(time.time())}.png"
-            result_path = os.path.join(results_dir, result_filename)
+            # Generate a fit description based on body shape and measurements
+            fit_description = try_on_controller.get_fit_description(body_shape, measurements)
+            
+            # The overlay depends only on the two images and where the dress is read from,
+            # so identical inputs share one result
+            cache_key = None
+            if result_cache is not None and not in_memory:
+                source, bundle = dress_source(dress_image, dress_assets)
+                if bundle is None:
+                    # Rendered from the upload even if its bundle is finished meanwhile
+                    dress_assets = None
+                cache_key = result_cache.make_key([silhouette_path, dress_image], dict(source, mode="overlay"))
+                cached_path = result_cache.get(cache_key)
+                if cached_path is not None:
+                    return jsonify({
+                        "success": True,
+                        "body_shape": body_shape,
+                        "result_image": try_on_controller.result_url(cached_path, results_dir),
+                        "fit_description": fit_description
+                    })
+                result_path = result_cache.path_for(cache_key)
+            else:
+                # Generate result filename
+                result_filename = f"try_on_{body_shape}_{int(time.time())}.png"
+                result_path = os.path.join(results_dir, result_filename)
             
             # Load images
-            silhouette_img = cv2.imread(silhouette_path)
-            dress_img = cv2.imread(dress_image)
+            if silhouette_handle is not None:
+                silhouette_img = image_store.get(silhouette_handle, session_id)
+                if silhouette_img is None:
+                    return jsonify({"error": "Silhouette image has expired, please generate it again"}), 404
+            else:
+                silhouette_img = cv2.imread(silhouette_path)
+            dress_img = load_overlay_dress(
+                dress_image, dress_assets,
+                min_height=overlay_height(silhouette_img) if silhouette_img is not None else None
+            )
             
             # Debug info
             logger.info(f"Silhouette image shape: {silhouette_img.shape if silhouette_img is not None else 'None'}")
@@ -355,60 +533,36 @@ class try_on_controller:
             if dress_img is None:
                 return jsonify({"error": f"Failed to load dress image from {dress_image}"}), 500
             
-           
-            # Resize dress to match silhouette width
-            silhouette_height, silhouette_width = silhouette_img.shape[:2]
-            dress_height, dress_width = dress_img.shape[:2]
-            
-            # Calculate dress overlay dimensions that maintain aspect ratio
-            dress_height_new = int(silhouette_height * 0.7)  # 70% of silhouette height
-            dress_width_new = int(dress_width * (dress_height_new / dress_height))
-            
-            # Make sure the new dress width isn't wider than the silhouette
-            if dress_width_new > silhouette_width:
-                dress_width_new = silhouette_width
-                dress_height_new = int(dress_height * (dress_width_new / dress_height))
-            
-            # Resize dress
-            try:
-                resized_dress = cv2.resize(dress_img, (dress_width_new, dress_height_new))
-            except Exception as e:
-                logger.error(f"Error resizing dress: {e}")
-                return jsonify({"error": f"Error resizing dress: {e}"}), 500
-            
-            # Calculate position to center the dress
-            x_offset = (silhouette_width - dress_width_new) // 2
-            y_offset = silhouette_height // 4  # Place at 1/4 from top
-            
-            # Create a composite image with safe bounds checking
-            result_img = silhouette_img.copy()
-            
-            # Calculate the region to place the dress
-            roi_height = min(dress_height_new, silhouette_height - y_offset)
-            roi_width = min(dress_width_new, silhouette_width - x_offset)
-            
-            if roi_height <= 0 or roi_width <= 0:
-                return jsonify({"error": "Dress dimensions don't fit within silhouette"}), 500
-            
-            # Place dress onto silhouette with proper bounds checking
+            # Composite the dress onto the silhouette
             try:
-                result_img[y_offset:y_offset+roi_height, x_offset:x_offset+roi_width] = resized_dress[:roi_height, :roi_width]
+                result_img = overlay_on_silhouette(silhouette_img, dress_img)
             except ValueError as e:
                 logger.error(f"Error during image overlay: {e}")
-                logger.error(f"ROI dimensions: {roi_height}x{roi_width}")
-                logger.error(f"Resized dress dimensions: {resized_dress.shape}")
-                return jsonify({"error": f"Dimension mismatch during overlay: {e}"}), 500
+                return jsonify({"error": str(e)}), 500
             
-            # Save the result
-            cv2.imwrite(result_path, result_img)
+            # Keep the result in memory; it is only encoded if the client fetches it
+            if in_memory:
+                result_handle = image_store.put(result_img, session_id)
+                return jsonify({
+                    "success": True,
+                    "body_shape": body_shape,
+                    "result_image": image_url(result_handle, session_id),
+                    "result_handle": result_handle,
+                    "fit_description": fit_description
+                })
             
-            # Generate a fit description based on body shape and measurements
-            fit_description = try_on_controller.get_fit_description(body_shape, measurements)
+            # Save the result
+            if cache_key is not None:
+                result_path = result_cache.put(cache_key, result_img)
+            elif encoder is not None:
+                encoder.write(result_path, result_img)
+            else:
+                cv2.imwrite(result_path, result_img)
             
             return jsonify({
                 "success": True,
                 "body_shape": body_shape,
-                "result_image": f"/api/get-image/results/{os.path.basename(result_path)}",
+                "result_image": try_on_controller.result_url(result_path, results_dir),
                 "fit_description": fit_description
             })
             
@@ -418,6 +572,121 @@ class try_on_controller:
             logger.error(traceback.format_exc())
             return jsonify({"error": str(e)}), 500
     
+    @staticmethod
+    def result_url(result_path, results_dir):
+        """Image URL of a file stored under the results directory"""
+        relative_path = os.path.relpath(result_path, results_dir).replace(os.sep, '/')
+        return f"/api/get-image/results/{relative_path}"
+    
+    @staticmethod
+    def submit_try_on(request_data, job_queue, results_dir, data_dir=None, result_cache=None, assets_root=None,
+                      encoder=None, dress_assets=None):
+        """Queue a virtual try-on job and return its id for polling"""
+        silhouette_path = request_data.get('silhouette_path')
+        dress_image = request_data.get('dress_image')
+        body_shape = request_data.get('body_shape')
+        measurements = request_data.get('measurements', {})
+        mode = request_data.get('mode', 'overlay')
+        
+        if not silhouette_path or not dress_image:
+            return jsonify({"error": "Silhouette and dress image are required"}), 400
+        
+        if not os.path.exists(silhouette_path):
+            return jsonify({"error": f"Silhouette image not found at {silhouette_path}"}), 404
+            
+        if not os.path.exists(dress_image):
+            return jsonify({"error": f"Dress image not found at {dress_image}"}), 404
+        
+        if mode not in ('overlay', 'fitting_room'):
+            return jsonify({"error": f"Unknown try-on mode: {mode}"}), 400
+        
+        os.makedirs(results_dir, exist_ok=True)
+        blend_mode = os.environ.get('TRYON_BLEND_MODE', 'fixed')
+        # Workers write the result themselves, with the app encoder's PNG level
+        png_level = encoder.png_level if encoder is not None else None
+        metadata = {
+            "body_shape": body_shape,
+            "fit_description": try_on_controller.get_fit_description(body_shape, measurements)
+        }
+        
+        use_assets = True
+        if result_cache is not None:
+            # Workers read the dress from the same place the key records
+            source, bundle = dress_source(dress_image, dress_assets)
+            use_assets = bundle is not None
+            # The fitting room warp also depends on the body shape and measurements
+            params = dict(source, mode=mode)
+            if mode == 'fitting_room':
+                params.update(body_shape=body_shape, measurements=measurements, blend_mode=blend_mode)
+            cache_key = result_cache.make_key([silhouette_path, dress_image], params)
+            
+            cached_path = result_cache.get(cache_key)
+            if cached_path is not None:
+                # Already rendered, answer as a finished job without queueing anything
+                metadata["result_image"] = try_on_controller.result_url(cached_path, results_dir)
+                return jsonify(dict(metadata, success=True, status="done", cached=True))
+            
+            result_path = result_cache.path_for(cache_key)
+            metadata["cache_key"] = cache_key
+        else:
+            result_filename = f"try_on_{body_shape}_{int(time.time())}_{os.urandom(4).hex()}.png"
+            result_path = os.path.join(results_dir, result_filename)
+        
+        metadata["result_image"] = try_on_controller.result_url(result_path, results_dir)
+        
+        if job_queue is None:
+            return jsonify({"error": "Try-on jobs not available"}), 503
+        try:
+            if mode == 'fitting_room':
+                job_id = job_queue.submit(
+                    run_fitting_room_try_on, silhouette_path, dress_image, result_path,
+                    body_shape=body_shape, measurements=measurements, data_dir=data_dir,
+                    blend_mode=blend_mode, png_level=png_level, use_assets=use_assets, metadata=metadata
+                )
+            else:
+                job_id = job_queue.submit(
+                    run_overlay_try_on, silhouette_path, dress_image, result_path,
+                    assets_root=assets_root if use_assets else None, png_level=png_level, metadata=metadata
+                )
+        except QueueFullError as e:
+            logger.warning(str(e))
+            response = jsonify({"error": "Try-on queue is full, please retry shortly"})
+            response.headers['Retry-After'] = '5'
+            return response, 429
+        
+        return jsonify({
+            "success": True,
+            "job_id": job_id,
+            "status": "queued",
+            "status_url": f"/api/virtual-try-on/jobs/{job_id}"
+        }), 202
+    
+    @staticmethod
+    def get_try_on_job(job_id, job_queue, result_cache=None):
+        """Report the status of a queued try-on job, with its result once done"""
+        if job_queue is None:
+            return jsonify({"error": "Try-on jobs not available"}), 503
+        job = job_queue.status(job_id)
+        if job is None:
+            return jsonify({"error": f"Try-on job {job_id} not found"}), 404
+        
+        response = {
+            "job_id": job_id,
+            "status": job["status"]
+        }
+        if job["status"] == "done":
+            metadata = dict(job["metadata"])
+            cache_key = metadata.pop("cache_key", None)
+            # The worker wrote straight into the cache directory; account for the new file
+            if cache_key is not None and result_cache is not None:
+                result_cache.adopt(cache_key)
+            response.update(metadata)
+            response["success"] = True
+        elif job["status"] == "failed":
+            response["error"] = job["error"]
+        
+        return jsonify(response)
+    
     @staticmethod
     def get_fit_description(body_shape, measurements):
         """Generate a description of how the dress fits based on body shape"""
@@ -442,7 +711,66 @@ class try_on_controller:
     
     
     @staticmethod
-    def adjust_dress_fit(json_data, temp_dir):
+    def resolve_previous_result(previous_result, temp_dir):
+        """
+        Resolve the path or URL of a previous result sent back by the client.
+
+        Args:
+            previous_result: File path, filename or /api/get-image/ URL
+            temp_dir: Temp directory holding adjusted results
+
+        Returns:
+            str: Path of an existing file, or None if it cannot be found
+        """
+        # Handle different path formats
+        if previous_result.startswith('http://localhost:5000/api/get-image/'):
+            # Extract relative path from full URL
+            relative_path = previous_result.replace('http://localhost:5000/api/get-image/', '')
+            full_path = os.path.join("e:/Induvidual project/Dresslink-platform/backend/data", relative_path)
+        elif previous_result.startswith('/api/get-image/'):
+            # Extract relative path from API URL
+            relative_path = previous_result.replace('/api/get-image/', '')
+            full_path = os.path.join("e:/Induvidual project/Dresslink-platform/backend/data", relative_path)
+        else:
+            # Assume it's already a full path or just a filename
+            full_path = previous_result
+
+        logger.info(f"Converted path: {full_path}")
+
+        # Check if file exists, try alternative paths if not
+        if not os.path.exists(full_path):
+            # Try with and without results/ prefix
+            basename = os.path.basename(full_path)
+            alt_paths = [
+                os.path.join("e:/Induvidual project/Dresslink-platform/backend/data/results", basename),
+                os.path.join("e:/Induvidual project/Dresslink-platform/backend/data/temp", basename),
+                os.path.join(temp_dir, basename)
+            ]
+
+            for path in alt_paths:
+                if os.path.exists(path):
+                    full_path = path
+                    logger.info(f"Found image at alternative path: {full_path}")
+                    break
+            else:
+                # If none of the alternative paths worked, try extracting just the filename
+                if '/' in previous_result:
+                    basename = previous_result.split('/')[-1]
+                    result_path = os.path.join("e:/Induvidual project/Dresslink-platform/backend/data/results", basename)
+                    if os.path.exists(result_path):
+                        full_path = result_path
+                        logger.info(f"Found image using basename: {full_path}")
+                    else:
+                        logger.error(f"Previous result not found at {full_path} or any alternative paths")
+                        return None
+                else:
+                    logger.error(f"Previous result not found at {full_path} or any alternative paths")
+                    return None
+
+        return full_path
+
+    @staticmethod
+    def adjust_dress_fit(json_data, temp_dir, image_store=None, engine=None, encoder=None):
         """Adjust fit of a previously generated try-on result"""
         try:
             # Extract parameters
@@ -455,143 +783,65 @@ class try_on_controller:
                 return jsonify({"error": "No previous result provided"}), 400
             
             logger.info(f"Received previous_result: {previous_result}")
+            session_id = json_data.get('session_id')
+            
+            # Results kept in the image store are adjusted without a disk round-trip
+            previous_handle = image_handle(previous_result) if image_store is not None else None
+            in_memory = image_store is not None and json_data.get('in_memory', previous_handle is not None)
             
-            # Handle different path formats
-            if previous_result.startswith('http://localhost:5000/api/get-image/'):
-                # Extract relative path from full URL
-                relative_path = previous_result.replace('http://localhost:5000/api/get-image/', '')
-                full_path = os.path.join("e:/Induvidual project/Dresslink-platform/backend/data", relative_path)
-            elif previous_result.startswith('/api/get-image/'):
-                # Extract relative path from API URL
-                relative_path = previous_result.replace('/api/get-image/', '')
-                full_path = os.path.join("e:/Induvidual project/Dresslink-platform/backend/data", relative_path)
+            if previous_handle is not None:
+                previous_ref = previous_handle
+                load_previous = lambda: image_store.get(previous_handle, session_id)
             else:
-                # Assume it's already a full path or just a filename
-                full_path = previous_result
-
-            logger.info(f"Converted path: {full_path}")
-        
-            # Check if file exists, try alternative paths if not
-            if not os.path.exists(full_path):
-                # Try with and without results/ prefix
-                basename = os.path.basename(full_path)
-                alt_paths = [
-                    os.path.join("e:/Induvidual project/Dresslink-platform/backend/data/results", basename),
-                    os.path.join("e:/Induvidual project/Dresslink-platform/backend/data/temp", basename),
-                    os.path.join(temp_dir, basename)
-                ]
+                full_path = try_on_controller.resolve_previous_result(previous_result, temp_dir)
+                if full_path is None:
+                    return jsonify({"error": f"Previous result not found. Please try again with a different image."}), 404
                 
-                for path in alt_paths:
-                    if os.path.exists(path):
-                        full_path = path
-                        logger.info(f"Found image at alternative path: {full_path}")
-                        break
-                else:
-                    # If none of the alternative paths worked, try extracting just the filename
-                    if '/' in previous_result:
-                        basename = previous_result.split('/')[-1]
-                        result_path = os.path.join("e:/Induvidual project/Dresslink-platform/backend/data/results", basename)
-                        if os.path.exists(result_path):
-                            full_path = result_path
-                            logger.info(f"Found image using basename: {full_path}")
-                        else:
-                            logger.error(f"Previous result not found at {full_path} or any alternative paths")
-                            return jsonify({"error": f"Previous result not found. Please try again with a different image."}), 404
-                    else:
-                        logger.error(f"Previous result not found at {full_path} or any alternative paths")
-                        return jsonify({"error": f"Previous result not found. Please try again with a different image."}), 404
-        
-            # Load the image
-            img = cv2.imread(full_path)
-            if img is None:
+                previous_ref = os.path.abspath(full_path)
+                load_previous = lambda: cv2.imread(full_path)
+            
+            # Apply the fit sliders; the engine replays them against the original composite
+            if engine is not None:
+                modified_img, source_ref = engine.adjust(previous_ref, load_previous,
+                                                         tightness, length, shoulder_width)
+            else:
+                img = load_previous()
+                modified_img = adjust_fit_image(img, tightness, length, shoulder_width) if img is not None else None
+            
+            if modified_img is None:
+                if previous_handle is not None:
+                    return jsonify({"error": "Previous result has expired. Please try again."}), 404
                 return jsonify({"error": "Could not load previous result image"}), 500
         
-            # Rest of the function remains the same
-            h, w = img.shape[:2]
-
-            # Convert to HSV for better color detection
-            hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-            # Define range for white/light gray color
-            lower_white = np.array([0, 0, 180]) 
-            upper_white = np.array([180, 30, 255]) 
-            # Create a mask for background
-            background_mask = cv2.inRange(hsv, lower_white, upper_white)
-        
-            # Create a modified image based on adjustments
-            modified_img = img.copy()
-
-            # Use the mask to change the background to white
-            modified_img[background_mask > 0] = [255, 255, 255]
-        
-            # Apply tightness adjustment (horizontal scaling)
-            if tightness != 0:
-                # Calculate scaling factor based on tightness parameter
-                scale_x = 1.0 - (tightness / 20.0)  
-                center_x = w // 2
-                scale_matrix = np.array([
-                    [scale_x, 0, center_x * (1 - scale_x)],
-                    [0, 1, 0]
-                ], dtype=np.float32)
-                modified_img = cv2.warpAffine(modified_img, scale_matrix, (w, h),
-                                            borderMode=cv2.BORDER_CONSTANT, 
-                                            borderValue=(255, 255, 255))
-        
-            # Apply length adjustment
-            if length != 0:
-                # Scale only the bottom half of the image
-                mid_y = h // 2
-                bottom_half = modified_img[mid_y:, :]
-            
-                # Calculate scaling factor based on length parameter
-                scale_y = 1.0 + (length / 20.0)  
-            
-                # Resize bottom half
-                new_h = int(bottom_half.shape[0] * scale_y)
-                resized_bottom = cv2.resize(bottom_half, (w, new_h))
-            
-                # Create new image with adjusted bottom half
-                new_full_height = mid_y + new_h
-                new_img = np.ones((new_full_height, w, 3), dtype=np.uint8) * 255
-                new_img[:mid_y, :] = modified_img[:mid_y, :]
-            
-                # Copy as much of the resized bottom as fits
-                copy_h = min(new_h, new_full_height - mid_y)
-                new_img[mid_y:mid_y+copy_h, :] = resized_bottom[:copy_h, :]
-            
-                modified_img = new_img
-        
-            # Apply shoulder width adjustment
-            if shoulder_width != 0:
-               
-                shoulder_y = int(h * 0.2)
-                shoulder_height = int(h * 0.1)
+            fit_description = f"Dress fit adjusted with {tightness:+d} tightness, {length:+d} length, and {shoulder_width:+d} shoulder width."
             
-                # Calculate scaling factor for shoulders
-                scale_shoulders = 1.0 + (shoulder_width / 20.0)  
+            # Stream the encoded image straight back without storing it
+            if json_data.get('stream') and encoder is not None:
+                encoded = encoder.encode(modified_img, json_data.get('format', 'png'), json_data.get('quality'))
+                return encoded_response(encoded, chunk_size=STREAM_CHUNK_SIZE)
             
-                # Extract and scale shoulder region
-                shoulder_region = modified_img[shoulder_y:shoulder_y+shoulder_height, :]
-                scaled_width = int(w * scale_shoulders)
-                scaled_shoulders = cv2.resize(shoulder_region, (scaled_width, shoulder_height))
+            # Keep the adjusted image in memory; it is only encoded if the client fetches it
+            if in_memory:
+                result_handle = image_store.put(modified_img, session_id)
+                if engine is not None:
+                    engine.link(result_handle, source_ref)
+                return jsonify({
+                    "success": True,
+                    "result_image": image_url(result_handle, session_id),
+                    "result_handle": result_handle,
+                    "fit_description": fit_description
+                })
             
-                # Center the scaled shoulders
-                x_offset = max(0, (w - scaled_width) // 2)
-                if scaled_width <= w:
-                    modified_img[shoulder_y:shoulder_y+shoulder_height, x_offset:x_offset+scaled_width] = scaled_shoulders
-                else:
-                    # If wider than image, take center portion
-                    start_x = (scaled_width - w) // 2
-                    modified_img[shoulder_y:shoulder_y+shoulder_height, :] = scaled_shoulders[:, start_x:start_x+w]
-        
             # Save the modified image
             os.makedirs(temp_dir, exist_ok=True)
             result_filename = f"adjusted_{int(time.time())}.png"
             result_path = os.path.join(temp_dir, result_filename)
-            cv2.imwrite(result_path, modified_img)
-        
-            
-            fit_description = f"Dress fit adjusted with {tightness:+d} tightness, {length:+d} length, and {shoulder_width:+d} shoulder width."
-        
+            if encoder is not None:
+                encoder.write(result_path, modified_img)
+            else:
+                cv2.imwrite(result_path, modified_img)
+            if engine is not None:
+                engine.link(os.path.abspath(result_path), source_ref)
             
             return jsonify({
                 "success": True,
@@ -605,12 +855,81 @@ class try_on_controller:
             import traceback
             logger.error(traceback.format_exc())
             return jsonify({"error": str(e)}), 500
+
+    @staticmethod
+    def preview_fit_lattice(json_data, temp_dir, engine, image_store=None, encoder=None):
+        """
+        Render a sprite of low-resolution fit previews for slider scrubbing.
+
+        Args:
+            json_data: Request body with previous_result and optional session_id,
+                axes, values, combinations, preview_width and columns
+            temp_dir: Directory for the sprite when no image store is available
+            engine: AdjustFitEngine rendering the previews
+            image_store: Optional ImageStore holding the sprite in memory
+            encoder: Optional ImageEncoder writing the sprite when it goes to disk
+
+        Returns:
+            JSON with the sprite URL and the position of each slider combination in it
+        """
+        previous_result = json_data.get('previous_result')
+        if not previous_result:
+            return jsonify({"error": "No previous result provided"}), 400
+        try:
+            combinations, preview_width, columns = lattice_parameters(json_data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if engine is None:
+            return jsonify({"error": "Fit previews are not available"}), 503
+
+        session_id = json_data.get('session_id')
+        previous_handle = image_handle(previous_result) if image_store is not None else None
+        if previous_handle is not None:
+            previous_ref = previous_handle
+            load_previous = lambda: image_store.get(previous_handle, session_id)
+        else:
+            full_path = try_on_controller.resolve_previous_result(previous_result, temp_dir)
+            if full_path is None:
+                return jsonify({"error": "Previous result not found. Please try again with a different image."}), 404
+            previous_ref = os.path.abspath(full_path)
+            load_previous = lambda: cv2.imread(full_path)
+
+        sprite, cells, _ = engine.preview_lattice(
+            previous_ref, load_previous, combinations,
+            preview_width=preview_width,
+            columns=columns
+        )
+        if sprite is None:
+            return jsonify({"error": "Previous result has expired. Please try again."}), 404
+
+        if image_store is not None:
+            sprite_handle = image_store.put(sprite, session_id)
+            sprite_url = image_url(sprite_handle, session_id)
+        else:
+            os.makedirs(temp_dir, exist_ok=True)
+            sprite_filename = f"adjusted_preview_{int(time.time() * 1000)}.png"
+            sprite_path = os.path.join(temp_dir, sprite_filename)
+            if encoder is not None:
+                encoder.write(sprite_path, sprite)
+            else:
+                cv2.imwrite(sprite_path, sprite)
+            sprite_url = f"/api/get-image/temp/{sprite_filename}"
+
+        return jsonify({
+            "success": True,
+            "sprite_image": sprite_url,
+            "sprite_width": sprite.shape[1],
+            "sprite_height": sprite.shape[0],
+            "cells": cells
+        })
         
 # Visualization controller
 class visualization_controller:
     @staticmethod
     def visualize_body_shapes(temp_dir, results_dir):
         """Generate body shape visualizations"""
+        visualizer = component_registry.get('visualizer')
+        
         # Update visualizer results dir if needed
         if visualizer.results_dir != results_dir:
             visualizer.results_dir = results_dir
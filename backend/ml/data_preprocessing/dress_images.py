@@ -1,30 +1,122 @@
 import os
+import time
+import hashlib
 import cv2
 import numpy as np
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 import logging
+from pathlib import Path
+import sys
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+
+from data_preprocessing.ingest_manifest import IngestManifest, MANIFEST_FILENAME
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+def _init_worker():
+    # Each worker is one process; OpenCV's own threads would only oversubscribe the cores
+    cv2.setNumThreads(1)
+
+def _process_chunk(items: List[Dict], image_size: Tuple[int, int]):
+    """
+    Read, resize and write one chunk of images.
+    
+    Each source is read once; the bytes are hashed for the manifest and decoded
+    from memory. Sources whose hash matches the manifest and whose output still
+    exists are not re-encoded.
+    
+    Args:
+        items: Work items from DressImageProcessor._collect_work
+        image_size: Target (height, width)
+    
+    Returns:
+        Tuple of (number of images written, list of failed input paths, manifest rows)
+    """
+    processed = 0
+    errors = []
+    rows = []
+    for item in items:
+        img_path = item['source_path']
+        row = {key: item[key] for key in ('source_path', 'size', 'mtime_ns', 'output_path', 'category')}
+        row['dress_type'] = item['category']
+        try:
+            with open(img_path, 'rb') as f:
+                data = f.read()
+            row['content_hash'] = hashlib.sha256(data).hexdigest()
+            
+            # Touched but unchanged: keep the output and the derived attributes
+            previous = item['previous']
+            if previous and previous['content_hash'] == row['content_hash'] and item['output_exists']:
+                rows.append(dict(previous, size=row['size'], mtime_ns=row['mtime_ns'], processed_at=time.time()))
+                continue
+            
+            # Decode from the bytes already in memory
+            img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+            if img is None:
+                logger.warning(f"Could not read image: {img_path}")
+                errors.append(img_path)
+                rows.append(dict(row, status='failed'))
+                continue
+                
+            # Resize and save processed image
+            resized = cv2.resize(img, (image_size[1], image_size[0]))
+            cv2.imwrite(item['output_path'], resized)
+            processed += 1
+            
+            rows.append(dict(
+                row,
+                width=img.shape[1],
+                height=img.shape[0],
+                mask_coverage=mask_coverage(resized),
+                status='ok'
+            ))
+            
+        except Exception as e:
+            logger.error(f"Error processing {img_path}: {str(e)}")
+            errors.append(img_path)
+            rows.append(dict(row, status='failed'))
+    return processed, errors, rows
+
+def mask_coverage(img: np.ndarray) -> float:
+    """Fraction of an image that is not white background."""
+    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+    background = cv2.inRange(hsv, np.array([0, 0, 200]), np.array([180, 30, 255]))
+    return 1.0 - float(np.count_nonzero(background)) / background.size
+
 class DressImageProcessor:
     """
     Simple and memory-efficient class for dress image preprocessing.
     """
     
     def __init__(self, data_path: str = None, output_path: str = None, 
-                 image_size: Tuple[int, int] = (224, 224)):
+                 image_size: Tuple[int, int] = (224, 224), manifest_path: str = None):
         """
         Initialize the processor.
+        
+        The ingestion manifest defaults to ingest_manifest.sqlite in the output directory.
         """
         self.data_path = data_path
         self.output_path = output_path
         self.image_size = image_size
+        self.manifest_path = manifest_path or (os.path.join(output_path, MANIFEST_FILENAME) if output_path else None)
+        self.last_run_stats = None
         
-    def process_directory(self, batch_size: int = 10):
+    def process_directory(self, batch_size: int = 64, workers: int = 1, use_manifest: bool = True):
         """
-        Process all images in a directory structure, one by one.
+        Process all images in a directory structure.
+        
+        Images are grouped into chunks of batch_size; with workers > 1 the chunks are
+        resized by a process pool so reads, resizes and writes run concurrently. At most
+        two chunks per worker are in flight, which bounds memory on large feeds.
+        
+        With use_manifest, sources whose size and mtime match the ingestion manifest
+        are skipped and changed sources are reprocessed; without it, outputs that
+        already exist are skipped using one listing per category directory.
         """
         if not self.data_path:
             raise ValueError("No data path provided")
@@ -34,21 +126,86 @@ class DressImageProcessor:
         # Create output directory
         os.makedirs(self.output_path, exist_ok=True)
         
-        # Store categories found
-        categories = set()
+        start = time.perf_counter()
+        manifest = IngestManifest(self.manifest_path) if use_manifest else None
+        categories, work, skipped = self._collect_work(manifest)
+        logger.info(f"Found {len(work)} new or changed images to process, {skipped} already processed")
+        
+        chunks = [work[i:i + batch_size] for i in range(0, len(work), batch_size)]
         total_processed = 0
+        failed = 0
+        
+        def collect(result):
+            nonlocal total_processed, failed
+            processed, errors, rows = result
+            total_processed += processed
+            failed += len(errors)
+            if manifest is not None:
+                manifest.record(rows)
+        
+        try:
+            if workers <= 1:
+                for chunk in chunks:
+                    collect(_process_chunk(chunk, self.image_size))
+                    logger.info(f"Processed {total_processed} images so far")
+            else:
+                with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+                    pending = set()
+                    chunk_iter = iter(chunks)
+                    while True:
+                        # Keep a bounded number of chunks queued so results are not held in bulk
+                        while len(pending) < workers * 2:
+                            chunk = next(chunk_iter, None)
+                            if chunk is None:
+                                break
+                            pending.add(executor.submit(_process_chunk, chunk, self.image_size))
+                        if not pending:
+                            break
+                        
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            collect(future.result())
+                        logger.info(f"Processed {total_processed} images so far")
+        finally:
+            if manifest is not None:
+                manifest.close()
+        
+        # Final report
+        elapsed = time.perf_counter() - start
+        self.last_run_stats = {
+            "processed": total_processed,
+            "skipped": skipped,
+            "unchanged": len(work) - total_processed - failed,
+            "failed": failed,
+            "seconds": elapsed,
+            "images_per_second": total_processed / elapsed if elapsed > 0 else 0.0
+        }
+        logger.info(f"Completed processing {total_processed} images across {len(categories)} categories "
+                    f"in {elapsed:.1f}s ({self.last_run_stats['images_per_second']:.1f} images/s, "
+                    f"{skipped} skipped, {failed} failed)")
+        return total_processed, categories
+    
+    def _collect_work(self, manifest: Optional[IngestManifest] = None):
+        """Walk the input tree and list the images that are new, changed or missing an output."""
+        categories = set()
+        outputs = {}
+        claimed = set()
+        work = []
+        skipped = 0
+        data_path = os.path.abspath(self.data_path)
+        entries = manifest.entries(prefix=data_path) if manifest is not None else {}
+        seen = set()
         
-        # Walk through directory structure
         logger.info(f"Processing images from {self.data_path}")
-        for root, _, files in os.walk(self.data_path):
+        for root, _, files in os.walk(data_path):
             # Get only image files
-            image_files = [f for f in files if f.lower().endswith(('.jpg', '.jpeg', '.png'))]
+            image_files = sorted(f for f in files if f.lower().endswith(('.jpg', '.jpeg', '.png')))
             
             if not image_files:
                 continue
                 
             # Get category from directory name
-            rel_path = os.path.relpath(root, self.data_path)
+            rel_path = os.path.relpath(root, data_path)
             if rel_path == '.':
                 category = 'unknown'
             else:
@@ -56,56 +213,51 @@ class DressImageProcessor:
             
             categories.add(category)
             
-            # Create output category directory
+            # Create output category directory and list what it already holds
             category_dir = os.path.join(self.output_path, category)
             os.makedirs(category_dir, exist_ok=True)
+            existing = outputs.setdefault(category_dir, set(os.listdir(category_dir)))
             
-            logger.info(f"Processing {len(image_files)} images in '{category}' from {root}")
-            
-            # Process images in batches
-            for i in range(0, len(image_files), batch_size):
-                batch = image_files[i:i+batch_size]
-                for img_file in batch:
-                    try:
-                        # Full file paths
-                        img_path = os.path.join(root, img_file)
-                        output_name = f"{os.path.splitext(img_file)[0]}.png"
-                        output_path = os.path.join(category_dir, output_name)
-                        
-                        # Skip if already processed
-                        if os.path.exists(output_path):
-                            continue
-                            
-                        # Read image
-                        img = cv2.imread(img_path)
-                        if img is None:
-                            logger.warning(f"Could not read image: {img_path}")
-                            continue
-                            
-                        # Resize image
-                        resized = cv2.resize(img, (self.image_size[1], self.image_size[0]))
-                        
-                        # Save processed image
-                        cv2.imwrite(output_path, resized)
-                        total_processed += 1
-                        
-                        # Free memory immediately
-                        del img
-                        del resized
-                        
-                    except Exception as e:
-                        logger.error(f"Error processing {img_path}: {str(e)}")
+            for img_file in image_files:
+                img_path = os.path.join(root, img_file)
+                output_name = f"{os.path.splitext(img_file)[0]}.png"
+                output_path = os.path.join(category_dir, output_name)
+                seen.add(img_path)
+                
+                # Two sources with the same stem share one output; the first one wins
+                if output_path in claimed:
+                    skipped += 1
+                    continue
+                claimed.add(output_path)
                 
-                # Force garbage collection after each batch
-                import gc
-                gc.collect()
+                entry = entries.get(img_path)
+                if manifest is None:
+                    if output_name in existing:
+                        skipped += 1
+                        continue
+                    stat = None
+                else:
+                    stat = os.stat(img_path)
+                    if (manifest.is_current(entry, stat.st_size, stat.st_mtime_ns)
+                            and (entry['status'] != 'ok' or output_name in existing)):
+                        skipped += 1
+                        continue
                 
-                # Log progress
-                logger.info(f"Processed {total_processed} images so far")
+                work.append({
+                    'source_path': img_path,
+                    'output_path': output_path,
+                    'category': category,
+                    'size': stat.st_size if stat else None,
+                    'mtime_ns': stat.st_mtime_ns if stat else None,
+                    'previous': entry,
+                    'output_exists': output_name in existing
+                })
         
-        # Final report
-        logger.info(f"Completed processing {total_processed} images across {len(categories)} categories")
-        return total_processed, categories
+        # Forget sources that were deleted from the feed
+        if manifest is not None:
+            manifest.remove(path for path in entries if path not in seen)
+        
+        return categories, work, skipped
         
     def create_segmentation_mask(self, input_path: str, output_path: str):
         """
@@ -175,8 +327,9 @@ if __name__ == "__main__":
     
     try:
         # Process all images
-        total, categories = processor.process_directory(batch_size=5)
+        total, categories = processor.process_directory(batch_size=64, workers=os.cpu_count())
         print(f"Processed {total} images in categories: {categories}")
+        print(f"Throughput: {processor.last_run_stats['images_per_second']:.1f} images/s")
         
         sample_image = r"F:\dresses\woman\dresses\some_dress.jpg"
         if os.path.exists(sample_image):
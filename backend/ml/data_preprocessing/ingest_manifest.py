@@ -0,0 +1,138 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+import pandas as pd
+from typing import Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Default file name, kept under data/processed next to the catalog CSV
+MANIFEST_FILENAME = "ingest_manifest.sqlite"
+MANIFEST_EXTENSIONS = ('.sqlite', '.db')
+
+MANIFEST_COLUMNS = [
+    'source_path', 'size', 'mtime_ns', 'content_hash', 'output_path', 'category',
+    'dress_type', 'width', 'height', 'mask_coverage', 'status', 'processed_at'
+]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    source_path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    content_hash TEXT,
+    output_path TEXT,
+    category TEXT,
+    dress_type TEXT,
+    width INTEGER,
+    height INTEGER,
+    mask_coverage REAL,
+    status TEXT NOT NULL,
+    processed_at REAL
+);
+CREATE INDEX IF NOT EXISTS images_output_name ON images (output_path);
+"""
+
+class IngestManifest:
+    """
+    Persistent record of every ingested dress image, stored in SQLite.
+    Rows hold the source size, mtime and content hash, so re-runs only touch
+    new or changed files, plus the output path and derived attributes, so
+    the manifest also serves as an index of the processed catalog images.
+    """
+
+    def __init__(self, db_path: str):
+        """
+        Open or create the manifest.
+
+        Args:
+            db_path: SQLite file path
+        """
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def entries(self, prefix: Optional[str] = None) -> Dict[str, Dict]:
+        """
+        Load manifest rows keyed by source path.
+
+        Args:
+            prefix: Only return sources under this directory
+
+        Returns:
+            Dict mapping source path to its row
+        """
+        query = f"SELECT {', '.join(MANIFEST_COLUMNS)} FROM images"
+        params = ()
+        if prefix:
+            query += " WHERE source_path LIKE ? ESCAPE '\\'"
+            escaped = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            params = (escaped.rstrip(os.sep) + os.sep + '%',)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return {row[0]: dict(zip(MANIFEST_COLUMNS, row)) for row in rows}
+
+    def is_current(self, entry: Optional[Dict], size: int, mtime_ns: int) -> bool:
+        """Whether a row was recorded for a source with this size and mtime."""
+        return entry is not None and entry['size'] == size and entry['mtime_ns'] == mtime_ns
+
+    def record(self, rows: Iterable[Dict]):
+        """
+        Insert or replace rows in one transaction.
+
+        Args:
+            rows: Dicts with MANIFEST_COLUMNS keys; missing keys are stored as NULL
+        """
+        now = time.time()
+        values = [tuple(row.get(column, now if column == 'processed_at' else None)
+                        for column in MANIFEST_COLUMNS) for row in rows]
+        if not values:
+            return
+        placeholders = ', '.join('?' * len(MANIFEST_COLUMNS))
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO images ({', '.join(MANIFEST_COLUMNS)}) VALUES ({placeholders})",
+                values
+            )
+
+    def remove(self, source_paths: Iterable[str]):
+        """Drop rows for sources that no longer exist."""
+        paths = [(path,) for path in source_paths]
+        if not paths:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM images WHERE source_path = ?", paths)
+
+    def to_dataframe(self, status: Optional[str] = 'ok') -> pd.DataFrame:
+        """
+        Manifest as a catalog table, one row per processed image.
+
+        Args:
+            status: Only include rows with this status, None for all
+
+        Returns:
+            DataFrame with an 'id' column (output file stem) and the manifest columns
+        """
+        query = f"SELECT {', '.join(MANIFEST_COLUMNS)} FROM images"
+        params = ()
+        if status is not None:
+            query += " WHERE status = ?"
+            params = (status,)
+        with self._lock:
+            df = pd.read_sql_query(query + " ORDER BY source_path", self._conn, params=params)
+        df.insert(0, 'id', [os.path.splitext(os.path.basename(path or ''))[0] for path in df['output_path']])
+        df['image_path'] = df['output_path']
+        return df
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,139 @@
+import os
+import re
+import logging
+from pathlib import Path
+import sys
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+
+from models.dress_assets import DressAssetStore
+from fittingroom.try_on_jobs import TryOnJobQueue, QueueFullError
+from utils.result_cache import file_digest
+
+logger = logging.getLogger(__name__)
+
+# Readiness of an uploaded dress
+STATUS_READY = "ready"              # bundle built, try-ons skip decoding and segmentation
+STATUS_PROCESSING = "processing"    # bundle build queued or running
+STATUS_FAILED = "failed"            # bundle build raised, try-ons segment per request
+STATUS_UNPROCESSED = "unprocessed"  # no bundle and no build, e.g. the queue was full
+
+# Asset ids are SHA-256 content hashes; anything else never reaches the bundle directory
+ASSET_ID = re.compile(r'^[0-9a-f]{64}$')
+
+# One transformer per worker process, built on the first job it runs
+_worker_transformer = None
+
+def run_dress_asset_build(image_path, assets_root):
+    """
+    Job entry point building the dress bundle of an uploaded image in a worker process.
+
+    Args:
+        image_path: Uploaded dress image
+        assets_root: Bundle directory shared with the fitting room
+
+    Returns:
+        Dict: The bundle metadata
+    """
+    global _worker_transformer
+    if _worker_transformer is None:
+        from models.dress_transformer import DressTransformer
+        from models.dress_segmentation import DressSegmenter
+        # Off the request path, so GrabCut may take its full iterations
+        _worker_transformer = DressTransformer(segmenter=DressSegmenter(time_budget_ms=None))
+    return DressAssetStore(assets_root).build(image_path, _worker_transformer)
+
+class DressAssetJobs:
+    """
+    Background precomputation of dress bundles for uploaded images.
+    Uploads return at once with a readiness status; a worker computes the alpha
+    mask, tight crop, dress type and normalized RGBA, and try-ons that find the
+    bundle skip all per-request segmentation. Dresses are identified by the
+    content hash of the image, so re-uploads of the same file are not rebuilt.
+    """
+
+    def __init__(self, store, max_workers=1, max_pending=32, job_ttl=3600, status_dir=None):
+        """
+        Initialize the jobs. Worker processes are started on the first submit.
+
+        Args:
+            store: DressAssetStore over the fitting room's data_dir/dress_assets
+            max_workers: Number of worker processes
+            max_pending: Builds allowed to wait on top of the ones running
+            job_ttl: Seconds a finished build is kept for status polling
+            status_dir: Optional directory for build status files shared between
+                Flask workers; without it only this process knows a build is running
+        """
+        self.store = store
+        self.assets_root = store.root
+        # Builds are queued under their asset id, so any worker can look one up
+        self._queue = TryOnJobQueue(max_workers=max_workers, max_pending=max_pending, job_ttl=job_ttl,
+                                    status_dir=status_dir)
+
+        os.makedirs(self.assets_root, exist_ok=True)
+
+    def submit(self, image_path):
+        """
+        Queue the bundle build for an uploaded image unless it already has one.
+
+        Args:
+            image_path: Saved upload
+
+        Returns:
+            Dict with asset_id and status
+        """
+        asset_id = file_digest(image_path)
+        status = self.status(asset_id)
+        if status["status"] in (STATUS_READY, STATUS_PROCESSING):
+            return status
+
+        try:
+            self._queue.submit(run_dress_asset_build, os.path.abspath(image_path), self.assets_root,
+                               metadata={"asset_id": asset_id}, job_id=asset_id)
+        except QueueFullError as e:
+            logger.warning(f"Not precomputing dress {asset_id}: {str(e)}")
+            return {"asset_id": asset_id, "status": STATUS_UNPROCESSED}
+
+        logger.info(f"Queued dress asset build {asset_id} for {image_path}")
+        return {"asset_id": asset_id, "status": STATUS_PROCESSING}
+
+    def status(self, asset_id):
+        """
+        Readiness of a dress.
+
+        Args:
+            asset_id: Content hash returned by submit
+
+        Returns:
+            Dict with asset_id, status and, once ready, the dress type, bounding box
+            and segmentation quality; error when the build failed. None for a malformed id
+        """
+        if not ASSET_ID.match(asset_id):
+            return None
+        # None once the build expired from the queue; the bundle on disk is the record from then on
+        job = self._queue.status(asset_id)
+
+        if job is not None and job["status"] in ("queued", "running"):
+            return {"asset_id": asset_id, "status": STATUS_PROCESSING}
+        if job is not None and job["status"] == "failed":
+            return {"asset_id": asset_id, "status": STATUS_FAILED, "error": job["error"]}
+
+        bundle = self.store.load_bundle(asset_id)
+        if bundle is None:
+            return {"asset_id": asset_id, "status": STATUS_UNPROCESSED}
+        return {
+            "asset_id": asset_id,
+            "status": STATUS_READY,
+            "dress_type": bundle.dress_type,
+            "bbox": list(bundle.bbox),
+            "segmentation": bundle.meta.get('segmentation')
+        }
+
+    def stats(self):
+        """Return worker and build counts."""
+        return self._queue.stats()
+
+    def shutdown(self, wait=True):
+        """Stop the worker processes."""
+        self._queue.shutdown(wait=wait)
@@ -0,0 +1,468 @@
+import logging
+import threading
+from collections import OrderedDict
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+def adjust_fit_image(img, tightness=0, length=0, shoulder_width=0):
+    """
+    Apply the fit sliders to a try-on result.
+
+    Args:
+        img: BGR try-on result
+        tightness: Horizontal squeeze, -5 to 5
+        length: Stretch of the bottom half, -5 to 5
+        shoulder_width: Scale of the shoulder band, -5 to 5
+
+    Returns:
+        np.ndarray: The adjusted image, a new array
+    """
+    h, w = img.shape[:2]
+
+    # Convert to HSV for better color detection
+    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+    # Define range for white/light gray color
+    lower_white = np.array([0, 0, 180]) 
+    upper_white = np.array([180, 30, 255]) 
+    # Create a mask for background
+    background_mask = cv2.inRange(hsv, lower_white, upper_white)
+
+    # Create a modified image based on adjustments
+    modified_img = img.copy()
+
+    # Use the mask to change the background to white
+    modified_img[background_mask > 0] = [255, 255, 255]
+
+    # Apply tightness adjustment (horizontal scaling)
+    if tightness != 0:
+        # Calculate scaling factor based on tightness parameter
+        scale_x = 1.0 - (tightness / 20.0)  
+        center_x = w // 2
+        scale_matrix = np.array([
+            [scale_x, 0, center_x * (1 - scale_x)],
+            [0, 1, 0]
+        ], dtype=np.float32)
+        modified_img = cv2.warpAffine(modified_img, scale_matrix, (w, h),
+                                    borderMode=cv2.BORDER_CONSTANT, 
+                                    borderValue=(255, 255, 255))
+
+    # Apply length adjustment
+    if length != 0:
+        # Scale only the bottom half of the image
+        mid_y = h // 2
+        bottom_half = modified_img[mid_y:, :]
+
+        # Calculate scaling factor based on length parameter
+        scale_y = 1.0 + (length / 20.0)  
+
+        # Resize bottom half
+        new_h = int(bottom_half.shape[0] * scale_y)
+        resized_bottom = cv2.resize(bottom_half, (w, new_h))
+
+        # Create new image with adjusted bottom half
+        new_full_height = mid_y + new_h
+        new_img = np.ones((new_full_height, w, 3), dtype=np.uint8) * 255
+        new_img[:mid_y, :] = modified_img[:mid_y, :]
+
+        # Copy as much of the resized bottom as fits
+        copy_h = min(new_h, new_full_height - mid_y)
+        new_img[mid_y:mid_y+copy_h, :] = resized_bottom[:copy_h, :]
+
+        modified_img = new_img
+
+    # Apply shoulder width adjustment
+    if shoulder_width != 0:
+
+        shoulder_y = int(h * 0.2)
+        shoulder_height = int(h * 0.1)
+
+        # Calculate scaling factor for shoulders
+        scale_shoulders = 1.0 + (shoulder_width / 20.0)  
+
+        # Extract and scale shoulder region
+        shoulder_region = modified_img[shoulder_y:shoulder_y+shoulder_height, :]
+        scaled_width = int(w * scale_shoulders)
+        scaled_shoulders = cv2.resize(shoulder_region, (scaled_width, shoulder_height))
+
+        # Center the scaled shoulders
+        x_offset = max(0, (w - scaled_width) // 2)
+        if scaled_width <= w:
+            modified_img[shoulder_y:shoulder_y+shoulder_height, x_offset:x_offset+scaled_width] = scaled_shoulders
+        else:
+            # If wider than image, take center portion
+            start_x = (scaled_width - w) // 2
+            modified_img[shoulder_y:shoulder_y+shoulder_height, :] = scaled_shoulders[:, start_x:start_x+w]
+
+    return modified_img
+
+# Integer positions of the frontend fit sliders
+SLIDER_VALUES = tuple(range(-5, 6))
+SLIDER_AXES = ('tightness', 'length', 'shoulder_width')
+# Most previews one lattice request may ask for, three full axes fit with room to spare
+MAX_LATTICE_COMBINATIONS = 64
+
+def slider_combinations(axes=SLIDER_AXES, values=SLIDER_VALUES):
+    """
+    Slider positions varying one axis at a time, the others held at 0.
+
+    Args:
+        axes: Slider names to vary
+        values: Positions for each varied slider
+
+    Returns:
+        List of (tightness, length, shoulder_width) tuples, one row of values per axis
+    """
+    combinations = []
+    for axis in axes:
+        position = SLIDER_AXES.index(axis)
+        for value in values:
+            combo = [0, 0, 0]
+            combo[position] = value
+            combinations.append(tuple(combo))
+    return combinations
+
+def lattice_parameters(json_data):
+    """
+    Validate the slider combinations and sprite layout of a preview lattice request.
+
+    Args:
+        json_data: Request body with optional axes, values, combinations,
+            preview_width and columns
+
+    Returns:
+        Tuple of (list of (tightness, length, shoulder_width) tuples, preview_width, columns),
+        columns None for the default layout
+
+    Raises:
+        ValueError: If a parameter is malformed or the lattice is too large
+    """
+    combinations = json_data.get('combinations')
+    if combinations is None:
+        axes = json_data.get('axes', SLIDER_AXES)
+        values = json_data.get('values', SLIDER_VALUES)
+        if not isinstance(axes, (list, tuple)) or any(axis not in SLIDER_AXES for axis in axes):
+            raise ValueError(f"axes must be a list of {', '.join(SLIDER_AXES)}")
+        if not isinstance(values, (list, tuple)) or not all(_slider_value(v) for v in values):
+            raise ValueError(f"values must be a list of integers from {SLIDER_VALUES[0]} to {SLIDER_VALUES[-1]}")
+        if len(axes) * len(values) > MAX_LATTICE_COMBINATIONS:
+            raise ValueError(f"At most {MAX_LATTICE_COMBINATIONS} combinations can be previewed at once")
+        combinations = slider_combinations(axes=axes, values=values)
+    else:
+        if not isinstance(combinations, list) or not all(isinstance(c, dict) for c in combinations):
+            raise ValueError("combinations must be a list of objects")
+        if len(combinations) > MAX_LATTICE_COMBINATIONS:
+            raise ValueError(f"At most {MAX_LATTICE_COMBINATIONS} combinations can be previewed at once")
+        positions = [tuple(c.get(axis, 0) for axis in SLIDER_AXES) for c in combinations]
+        if not all(_slider_value(v) for combo in positions for v in combo):
+            raise ValueError(f"Slider positions must be integers from {SLIDER_VALUES[0]} to {SLIDER_VALUES[-1]}")
+        combinations = positions
+    if not combinations:
+        raise ValueError("No combinations to preview")
+
+    preview_width = json_data.get('preview_width', 160)
+    if not _positive_int(preview_width):
+        raise ValueError("preview_width must be a positive integer")
+    columns = json_data.get('columns')
+    if columns is not None:
+        if not _positive_int(columns):
+            raise ValueError("columns must be a positive integer")
+        columns = min(columns, len(combinations))
+    return combinations, preview_width, columns
+
+def _positive_int(value):
+    # bool is an int subclass, but true is not a width
+    return isinstance(value, int) and not isinstance(value, bool) and value > 0
+
+def _slider_value(value):
+    return isinstance(value, int) and not isinstance(value, bool) and SLIDER_VALUES[0] <= value <= SLIDER_VALUES[-1]
+
+def background_mask(img):
+    """
+    Mask of the white / light grey background of a try-on result.
+
+    Args:
+        img: BGR image
+
+    Returns:
+        np.ndarray: uint8 mask, 255 where the pixel is background
+    """
+    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+    return cv2.inRange(hsv, np.array([0, 0, 180]), np.array([180, 30, 255]))
+
+def build_fit_remap(height, width, tightness=0, length=0, shoulder_width=0):
+    """
+    Fold the tightness, length and shoulder adjustments of adjust_fit_image into one remap.
+    Each output pixel is traced back through the shoulder resize, the bottom-half
+    stretch and the horizontal squeeze to a single position in the source.
+
+    Args:
+        height: Source image height
+        width: Source image width
+        tightness: Horizontal squeeze, -5 to 5
+        length: Stretch of the bottom half, -5 to 5
+        shoulder_width: Scale of the shoulder band, -5 to 5
+
+    Returns:
+        Tuple of float32 (map_x, map_y) arrays with the adjusted output size
+    """
+    h, w = height, width
+    mid_y = h // 2
+
+    # Length: rows below the middle come from a resized bottom half
+    out_h = h
+    if length != 0:
+        bottom_h = h - mid_y
+        new_h = int(bottom_h * (1.0 + length / 20.0))
+        out_h = mid_y + new_h
+    rows = np.arange(out_h, dtype=np.float64)
+    src_rows = rows.copy()
+    if length != 0:
+        local = (rows[mid_y:] - mid_y + 0.5) * (bottom_h / new_h) - 0.5
+        src_rows[mid_y:] = mid_y + np.clip(local, 0, bottom_h - 1)
+
+    # Shoulders: a horizontally resized band, centred, replaces part of those rows
+    cols = np.arange(w, dtype=np.float64)
+    map_x = np.repeat(cols[np.newaxis, :], out_h, axis=0)
+    if shoulder_width != 0:
+        shoulder_y = int(h * 0.2)
+        shoulder_height = int(h * 0.1)
+        scaled_width = int(w * (1.0 + shoulder_width / 20.0))
+        if scaled_width <= w:
+            x_offset = max(0, (w - scaled_width) // 2)
+            band = slice(x_offset, x_offset + scaled_width)
+            resized_x = cols[band] - x_offset
+        else:
+            band = slice(0, w)
+            resized_x = cols + (scaled_width - w) // 2
+        band_x = np.clip((resized_x + 0.5) * (w / scaled_width) - 0.5, 0, w - 1)
+        map_x[shoulder_y:shoulder_y + shoulder_height, band] = band_x
+
+    # Tightness: invert the horizontal scale about the centre column
+    if tightness != 0:
+        scale_x = 1.0 - tightness / 20.0
+        center_x = w // 2
+        map_x = (map_x - center_x * (1 - scale_x)) / scale_x
+
+    map_y = np.repeat(src_rows[:, np.newaxis], w, axis=1)
+    return map_x.astype(np.float32), map_y.astype(np.float32)
+
+class AdjustFitEngine:
+    """
+    Re-renders fit adjustments from the original composite.
+    The background-cleaned source is prepared once per try-on result and every
+    slider change is a single cv2.remap from it, so repeated tweaks never
+    resample an already-resampled image. Adjusted outputs are linked back to
+    their source, so slider values are absolute, not cumulative.
+    """
+
+    def __init__(self, max_sources=32, max_maps=64):
+        """
+        Initialize the engine.
+
+        Args:
+            max_sources: Number of prepared source composites kept in memory
+            max_maps: Number of remap grids kept in memory
+        """
+        self.max_sources = max_sources
+        self.max_maps = max_maps
+        self._sources = OrderedDict()
+        self._lineage = OrderedDict()
+        self._maps = OrderedDict()
+        self._sprites = OrderedDict()
+        self._lock = threading.Lock()
+
+    def adjust(self, image_ref, load_image, tightness=0, length=0, shoulder_width=0):
+        """
+        Render an adjustment of an image or of the composite it was adjusted from.
+
+        Args:
+            image_ref: Identifier of the image sent by the client (handle or path)
+            load_image: Callable loading that image on a cache miss, may return None
+            tightness: Horizontal squeeze, -5 to 5
+            length: Stretch of the bottom half, -5 to 5
+            shoulder_width: Scale of the shoulder band, -5 to 5
+
+        Returns:
+            Tuple of (adjusted image, source_ref), or (None, None) if the image cannot be loaded
+        """
+        source, source_ref = self._source(image_ref, load_image)
+        if source is None:
+            return None, None
+
+        if tightness == 0 and length == 0 and shoulder_width == 0:
+            return source.copy(), source_ref
+
+        h, w = source.shape[:2]
+        map_x, map_y = self._remap(h, w, tightness, length, shoulder_width)
+        adjusted = cv2.remap(source, map_x, map_y, cv2.INTER_LINEAR,
+                             borderMode=cv2.BORDER_CONSTANT, borderValue=(255, 255, 255))
+        return adjusted, source_ref
+
+    def preview_lattice(self, image_ref, load_image, combinations=None, preview_width=160, columns=None):
+        """
+        Render low-resolution previews of many slider positions packed into one sprite.
+        The source is downscaled once and each preview is a single remap of the small
+        image, so the client can scrub the sliders locally and only request a
+        full-resolution adjustment when a slider is released.
+
+        Args:
+            image_ref: Identifier of the image sent by the client (handle or path)
+            load_image: Callable loading that image on a cache miss, may return None
+            combinations: (tightness, length, shoulder_width) tuples, defaults to slider_combinations()
+            preview_width: Width of each preview in pixels
+            columns: Previews per sprite row, defaults to the number of values per axis;
+                never more than the number of combinations
+
+        Returns:
+            Tuple of (sprite image, list of cell dicts, source_ref), or (None, None, None)
+            if the image cannot be loaded
+        """
+        source, source_ref = self._source(image_ref, load_image)
+        if source is None:
+            return None, None, None
+
+        combinations = [tuple(int(v) for v in combo) for combo in (combinations or slider_combinations())]
+        columns = min(columns or len(SLIDER_VALUES), len(combinations))
+        key = (source_ref, preview_width, columns, tuple(combinations))
+        with self._lock:
+            cached = self._sprites.get(key)
+            if cached is not None:
+                self._sprites.move_to_end(key)
+                return cached[0], cached[1], source_ref
+
+        h, w = source.shape[:2]
+        preview_width = min(preview_width, w)
+        preview_height = max(1, int(round(h * preview_width / w)))
+        small = cv2.resize(source, (preview_width, preview_height), interpolation=cv2.INTER_AREA)
+
+        # Cells are sized for the longest preview so the grid stays regular
+        cell_height = preview_height + int((preview_height - preview_height // 2) * 0.25) + 1
+        rows = (len(combinations) + columns - 1) // columns
+        sprite = np.full((rows * cell_height, columns * preview_width, 3), 255, dtype=np.uint8)
+
+        cells = []
+        for index, (tightness, length, shoulder_width) in enumerate(combinations):
+            if tightness == 0 and length == 0 and shoulder_width == 0:
+                preview = small
+            else:
+                map_x, map_y = build_fit_remap(preview_height, preview_width, tightness, length, shoulder_width)
+                preview = cv2.remap(small, map_x, map_y, cv2.INTER_LINEAR,
+                                    borderMode=cv2.BORDER_CONSTANT, borderValue=(255, 255, 255))
+            x = (index % columns) * preview_width
+            y = (index // columns) * cell_height
+            ph = min(preview.shape[0], cell_height)
+            sprite[y:y + ph, x:x + preview_width] = preview[:ph]
+            cells.append({
+                "tightness": tightness,
+                "length": length,
+                "shoulder_width": shoulder_width,
+                "x": x,
+                "y": y,
+                "width": preview_width,
+                "height": ph
+            })
+
+        with self._lock:
+            self._sprites[key] = (sprite, cells)
+            while len(self._sprites) > self.max_sources:
+                self._sprites.popitem(last=False)
+        return sprite, cells, source_ref
+
+    def _source(self, image_ref, load_image):
+        with self._lock:
+            source_ref = self._lineage.get(image_ref, image_ref)
+            source = self._sources.get(source_ref)
+            if source is not None:
+                self._sources.move_to_end(source_ref)
+
+        if source is None:
+            # Unknown or evicted source: start a new lineage from the image we were given
+            img = load_image()
+            if img is None:
+                return None, image_ref
+            source_ref = image_ref
+            source = img.copy()
+            source[background_mask(img) > 0] = 255
+            with self._lock:
+                self._sources[source_ref] = source
+                while len(self._sources) > self.max_sources:
+                    self._sources.popitem(last=False)
+        return source, source_ref
+
+    def link(self, result_ref, source_ref):
+        """
+        Remember that a result was rendered from a source, so adjusting it replays the source.
+
+        Args:
+            result_ref: Identifier the client will send back for the result
+            source_ref: Source returned by adjust
+        """
+        with self._lock:
+            self._lineage[result_ref] = source_ref
+            while len(self._lineage) > self.max_sources * 16:
+                self._lineage.popitem(last=False)
+
+    def _remap(self, h, w, tightness, length, shoulder_width):
+        key = (h, w, tightness, length, shoulder_width)
+        with self._lock:
+            maps = self._maps.get(key)
+            if maps is not None:
+                self._maps.move_to_end(key)
+                return maps
+
+        maps = build_fit_remap(h, w, tightness, length, shoulder_width)
+        with self._lock:
+            self._maps[key] = maps
+            while len(self._maps) > self.max_maps:
+                self._maps.popitem(last=False)
+        return maps
+
+
+if __name__ == "__main__":
+    # Slider latency and drift after repeated tweaks, legacy pipeline vs the engine
+    import time
+
+    rng = np.random.default_rng(0)
+    composite = np.full((900, 600, 3), 245, dtype=np.uint8)
+    composite[200:800, 150:450] = rng.integers(0, 160, (600, 300, 3), dtype=np.uint8)
+
+    engine = AdjustFitEngine()
+    engine.adjust("composite", lambda: composite)
+    sliders = [(t, l, s) for t in (-3, 0, 2) for l in (-2, 0, 3) for s in (-1, 0, 4)]
+
+    start = time.perf_counter()
+    for t, l, s in sliders:
+        legacy = adjust_fit_image(composite, t, l, s)
+    legacy_time = (time.perf_counter() - start) / len(sliders)
+
+    engine_times = []
+    max_diff = 0.0
+    for t, l, s in sliders:
+        engine.adjust("composite", None, t, l, s)  # first use builds the remap
+        start = time.perf_counter()
+        adjusted, _ = engine.adjust("composite", None, t, l, s)
+        engine_times.append(time.perf_counter() - start)
+        legacy = adjust_fit_image(composite, t, l, s)
+        if legacy.shape == adjusted.shape:
+            max_diff = max(max_diff, np.abs(legacy.astype(int) - adjusted.astype(int)).mean())
+
+    print(f"Legacy per adjustment: {legacy_time * 1000:.1f} ms, "
+          f"engine (cached remap): {np.mean(engine_times) * 1000:.1f} ms, "
+          f"mean abs difference up to {max_diff:.2f}")
+
+    # Ten tightness tweaks settling back at 0: legacy compounds, the engine replays the source
+    compounded = composite
+    for t in (1, 2, 3, 2, 1, -1, -2, -1, 1, 0):
+        compounded = adjust_fit_image(compounded, t, 0, 0)
+    replayed, _ = engine.adjust("composite", None, 0, 0, 0)
+    reference = adjust_fit_image(composite, 0, 0, 0)
+    print(f"Drift after 10 tweaks: legacy {np.abs(compounded.astype(int) - reference).mean():.2f}, "
+          f"engine {np.abs(replayed.astype(int) - reference).mean():.2f}")
+
+    # Preview lattice: 33 slider positions in one sprite
+    start = time.perf_counter()
+    sprite, cells, _ = engine.preview_lattice("composite", None)
+    print(f"Preview sprite {sprite.shape[1]}x{sprite.shape[0]} with {len(cells)} cells "
+          f"in {(time.perf_counter() - start) * 1000:.1f} ms")
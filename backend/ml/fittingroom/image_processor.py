@@ -8,6 +8,8 @@ import sys
 # Add parent directory to path for imports
 sys.path.append(str(Path(__file__).parent.parent))
 
+from utils.image_io import read_image
+
 logger = logging.getLogger(__name__)
 
 class ImageProcessor:
@@ -31,14 +33,14 @@ class ImageProcessor:
         Returns:
             Preprocessed image
         """
-        # Load image
-        img = cv2.imread(image_path)
+        # Load image, large JPEGs at reduced resolution
+        target_height = 800
+        img = read_image(image_path, min_height=target_height)
         
         if img is None:
             raise ValueError(f"Could not load image from {image_path}")
         
         # Resize to standard height while maintaining aspect ratio
-        target_height = 800
         aspect_ratio = img.shape[1] / img.shape[0]
         target_width = int(target_height * aspect_ratio)
         img_resized = cv2.resize(img, (target_width, target_height))
@@ -84,14 +86,14 @@ class ImageProcessor:
         Returns:
             Processed dress image
         """
-        # Load image
-        img = cv2.imread(image_path)
+        # Load image, large JPEGs at reduced resolution
+        target_height = 800
+        img = read_image(image_path, min_height=target_height)
         
         if img is None:
             raise ValueError(f"Could not load image from {image_path}")
         
         # Resize to standard height while maintaining aspect ratio
-        target_height = 800
         aspect_ratio = img.shape[1] / img.shape[0]
         target_width = int(target_height * aspect_ratio)
         img_resized = cv2.resize(img, (target_width, target_height))
@@ -133,14 +135,14 @@ class ImageProcessor:
         Returns:
             Dictionary of estimated measurements
         """
-        # Load image
-        img = cv2.imread(image_path)
+        # Load image, large JPEGs at reduced resolution
+        target_height = 800
+        img = read_image(image_path, min_height=target_height)
         
         if img is None:
             raise ValueError(f"Could not load image from {image_path}")
         
         # Resize to standard height while maintaining aspect ratio
-        target_height = 800
         aspect_ratio = img.shape[1] / img.shape[0]
         target_width = int(target_height * aspect_ratio)
         img_resized = cv2.resize(img, (target_width, target_height))
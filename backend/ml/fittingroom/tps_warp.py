@@ -0,0 +1,178 @@
+import time
+import logging
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class ThinPlateSplineWarp:
+    """
+    Thin plate spline mapping from target (output) coordinates back to source coordinates.
+    The spline is solved once and then evaluated over a whole pixel grid with NumPy,
+    producing map_x/map_y arrays suitable for a single cv2.remap call.
+    """
+
+    def __init__(self, target_points, source_points, regularization=0.0):
+        """
+        Solve the thin plate spline for the given control points.
+
+        Args:
+            target_points: (N, 2) control points in output image coordinates
+            source_points: (N, 2) matching points in source image coordinates
+            regularization: Optional smoothing term added to the kernel diagonal
+        """
+        self.control_points = np.asarray(target_points, dtype=np.float64).reshape(-1, 2)
+        source_points = np.asarray(source_points, dtype=np.float64).reshape(-1, 2)
+
+        if len(self.control_points) != len(source_points):
+            raise ValueError("Target and source meshes must have the same number of points")
+
+        n = len(self.control_points)
+
+        # Build the TPS system  [K P; P^T 0] [w; a] = [v; 0]
+        kernel = self._kernel(self.control_points, self.control_points)
+        kernel[np.diag_indices(n)] += regularization
+        affine = np.hstack([np.ones((n, 1)), self.control_points])
+
+        system = np.zeros((n + 3, n + 3))
+        system[:n, :n] = kernel
+        system[:n, n:] = affine
+        system[n:, :n] = affine.T
+
+        values = np.zeros((n + 3, 2))
+        values[:n] = source_points
+
+        # lstsq copes with duplicated control points, which the meshes can produce
+        solution = np.linalg.lstsq(system, values, rcond=None)[0]
+        self.weights = solution[:n]
+        self.affine = solution[n:]
+
+    @staticmethod
+    def _kernel(points, control_points):
+        """Radial basis U(r) = r^2 log(r^2), matching OpenCV's shape transformer."""
+        diff = points[:, None, :] - control_points[None, :, :]
+        r2 = np.einsum('ijk,ijk->ij', diff, diff)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            u = r2 * np.log(r2)
+        u[r2 == 0] = 0.0
+        return u
+
+    def transform_points(self, points):
+        """
+        Map points from target coordinates to source coordinates.
+
+        Args:
+            points: (M, 2) array of x, y coordinates
+
+        Returns:
+            (M, 2) float64 array of mapped coordinates
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        return (self._kernel(points, self.control_points) @ self.weights
+                + self.affine[0] + points @ self.affine[1:])
+
+    def build_remap(self, height, width, source_size=None, chunk_rows=128):
+        """
+        Evaluate the spline for every pixel of a height x width output grid.
+
+        Args:
+            height: Output height
+            width: Output width
+            source_size: Optional (width, height) of the source image. When given the
+                coordinates are truncated like the original per-pixel loop and points
+                falling outside the source are set to -1, so a cv2.INTER_NEAREST remap
+                with a constant border reproduces its nearest-neighbour output.
+            chunk_rows: Number of rows evaluated per batch to bound temporary memory
+
+        Returns:
+            Tuple of float32 (map_x, map_y) arrays with shape (height, width)
+        """
+        map_x = np.empty((height, width), dtype=np.float32)
+        map_y = np.empty((height, width), dtype=np.float32)
+
+        for start in range(0, height, chunk_rows):
+            stop = min(start + chunk_rows, height)
+            grid_y, grid_x = np.mgrid[start:stop, 0:width].astype(np.float64)
+            points = np.column_stack([grid_x.ravel(), grid_y.ravel()])
+            mapped = self.transform_points(points)
+            map_x[start:stop] = mapped[:, 0].reshape(stop - start, width)
+            map_y[start:stop] = mapped[:, 1].reshape(stop - start, width)
+
+        if source_size is not None:
+            src_w, src_h = source_size
+            np.trunc(map_x, out=map_x)
+            np.trunc(map_y, out=map_y)
+            outside = (map_x < 0) | (map_x >= src_w) | (map_y < 0) | (map_y >= src_h)
+            map_x[outside] = -1
+            map_y[outside] = -1
+
+        return map_x, map_y
+
+def remap_nearest(images, map_x, map_y):
+    """
+    Apply one precomputed remap to several images with nearest-neighbour sampling.
+
+    Args:
+        images: Iterable of images sharing the same source geometry (e.g. dress and mask)
+        map_x: float32 x coordinates from ThinPlateSplineWarp.build_remap
+        map_y: float32 y coordinates from ThinPlateSplineWarp.build_remap
+
+    Returns:
+        List of remapped images, pixels without a source are zero
+    """
+    return [
+        cv2.remap(img, map_x, map_y, cv2.INTER_NEAREST,
+                  borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+        for img in images
+    ]
+
+
+if __name__ == "__main__":
+    # Benchmark against the per-pixel OpenCV loop on a reduced grid
+    h_dress, w_dress = 400, 300
+    target_height, target_width = 200, 150
+
+    src_mesh = np.array([
+        [0, 0], [w_dress, 0],
+        [0, int(h_dress * 0.3)], [w_dress, int(h_dress * 0.3)],
+        [0, int(h_dress * 0.4)], [w_dress, int(h_dress * 0.4)],
+        [0, int(h_dress * 0.6)], [w_dress, int(h_dress * 0.6)],
+        [0, h_dress], [w_dress, h_dress]
+    ], dtype=np.float32)
+    dst_mesh = np.array([
+        [30, 0], [120, 0],
+        [20, 60], [130, 60],
+        [35, 80], [115, 80],
+        [15, 120], [135, 120],
+        [25, 200], [125, 200]
+    ], dtype=np.float32)
+
+    dress = np.random.randint(0, 255, (h_dress, w_dress, 3), dtype=np.uint8)
+
+    start = time.perf_counter()
+    warp = ThinPlateSplineWarp(dst_mesh, src_mesh)
+    map_x, map_y = warp.build_remap(target_height, target_width, source_size=(w_dress, h_dress))
+    fast = remap_nearest([dress], map_x, map_y)[0]
+    fast_time = time.perf_counter() - start
+    print(f"Vectorized TPS warp: {fast_time * 1000:.1f} ms")
+
+    if hasattr(cv2, 'createThinPlateSplineShapeTransformer'):
+        tps = cv2.createThinPlateSplineShapeTransformer()
+        matches = [cv2.DMatch(i, i, 0) for i in range(len(src_mesh))]
+        tps.estimateTransformation(dst_mesh.reshape(1, -1, 2), src_mesh.reshape(1, -1, 2), matches)
+
+        start = time.perf_counter()
+        reference = np.zeros((target_height, target_width, 3), dtype=np.uint8)
+        for y in range(target_height):
+            for x in range(target_width):
+                pt = np.array([[x, y]], dtype=np.float32).reshape(1, 1, 2)
+                tx, ty = tps.applyTransformation(pt)[1][0][0].astype(int)
+                if 0 <= tx < w_dress and 0 <= ty < h_dress:
+                    reference[y, x] = dress[ty, tx]
+        loop_time = time.perf_counter() - start
+
+        mismatch = np.mean(np.any(reference != fast, axis=2))
+        print(f"Per-pixel OpenCV loop: {loop_time * 1000:.1f} ms")
+        print(f"Speedup: {loop_time / fast_time:.1f}x, mismatched pixels: {mismatch:.4%}")
+    else:
+        print("OpenCV shape module not available, skipping reference comparison")
@@ -0,0 +1,431 @@
+import os
+import re
+import json
+import time
+import uuid
+import logging
+import threading
+import cv2
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+import sys
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+
+from models.dress_assets import DressAssetStore
+from utils.image_io import read_image
+from utils.image_encoding import ImageEncoder
+
+logger = logging.getLogger(__name__)
+
+class QueueFullError(Exception):
+    """Raised when the try-on worker pool has no room for another job."""
+
+def overlay_height(silhouette_img):
+    """Height overlay_on_silhouette draws the dress at, 70% of the silhouette."""
+    return int(silhouette_img.shape[0] * 0.7)
+
+def overlay_on_silhouette(silhouette_img, dress_img):
+    """
+    Place a dress image onto a silhouette, centred and scaled to 70% of its height.
+    Pure image function shared by the synchronous endpoint and the job workers.
+
+    Args:
+        silhouette_img: BGR silhouette image
+        dress_img: BGR dress image
+
+    Returns:
+        np.ndarray: The composite image
+
+    Raises:
+        ValueError: If the dress cannot be resized or placed on the silhouette
+    """
+    # Resize dress to match silhouette width
+    silhouette_height, silhouette_width = silhouette_img.shape[:2]
+    dress_height, dress_width = dress_img.shape[:2]
+
+    # Calculate dress overlay dimensions that maintain aspect ratio
+    dress_height_new = overlay_height(silhouette_img)  # 70% of silhouette height
+    dress_width_new = int(dress_width * (dress_height_new / dress_height))
+
+    # Make sure the new dress width isn't wider than the silhouette
+    if dress_width_new > silhouette_width:
+        dress_width_new = silhouette_width
+        dress_height_new = int(dress_height * (dress_width_new / dress_height))
+
+    # Resize dress
+    try:
+        resized_dress = cv2.resize(dress_img, (dress_width_new, dress_height_new))
+    except Exception as e:
+        raise ValueError(f"Error resizing dress: {e}")
+
+    # Calculate position to center the dress
+    x_offset = (silhouette_width - dress_width_new) // 2
+    y_offset = silhouette_height // 4  # Place at 1/4 from top
+
+    # Calculate the region to place the dress
+    roi_height = min(dress_height_new, silhouette_height - y_offset)
+    roi_width = min(dress_width_new, silhouette_width - x_offset)
+
+    if roi_height <= 0 or roi_width <= 0:
+        raise ValueError("Dress dimensions don't fit within silhouette")
+
+    # Create a composite image with safe bounds checking
+    result_img = silhouette_img.copy()
+    try:
+        result_img[y_offset:y_offset+roi_height, x_offset:x_offset+roi_width] = resized_dress[:roi_height, :roi_width]
+    except ValueError as e:
+        logger.error(f"ROI dimensions: {roi_height}x{roi_width}")
+        logger.error(f"Resized dress dimensions: {resized_dress.shape}")
+        raise ValueError(f"Dimension mismatch during overlay: {e}")
+
+    return result_img
+
+def dress_source(dress_image, assets=None):
+    """
+    Where a try-on reads the dress from, for result cache keys.
+    Once the background build of an uploaded dress finishes, try-ons draw it from
+    its bundle instead of decoding the upload, so results rendered before and after
+    must not share a key. A reduced JPEG decode needs no entry of its own: the
+    factor follows from the silhouette and dress bytes already in the key.
+
+    Args:
+        dress_image: Path to the dress image
+        assets: Optional DressAssetStore
+
+    Returns:
+        Tuple of (dict to add to the cache key params, bundle or None); render from
+        the bundle exactly when one is returned
+    """
+    bundle = assets.load(dress_image) if assets is not None else None
+    if bundle is None:
+        return {"dress_source": "raw"}, None
+    return {"dress_source": "bundle", "bundle_version": bundle.meta.get('version')}, bundle
+
+def load_overlay_dress(dress_image, assets=None, min_height=None):
+    """
+    BGR dress image for the overlay.
+    Dresses precomputed at upload are read from their bundle's normalized copy,
+    sparing the decode of a full-size photo; others are decoded from disk, large
+    JPEGs at reduced resolution.
+
+    Args:
+        dress_image: Path to the dress image
+        assets: Optional DressAssetStore
+        min_height: Height the dress is drawn at, None for a full decode
+
+    Returns:
+        np.ndarray: BGR image, or None if it cannot be loaded
+    """
+    bundle = assets.load(dress_image) if assets is not None else None
+    if bundle is not None:
+        return cv2.cvtColor(np.asarray(bundle.normalized), cv2.COLOR_RGBA2BGR)
+    return read_image(dress_image, min_height=min_height)
+
+def write_result(result_path, result_img, png_level=None):
+    """
+    Write a result image atomically, so pollers and cache lookups never see a partial file.
+
+    Args:
+        result_path: Destination path, its extension selects the format
+        result_img: Image to write
+        png_level: PNG zlib level of the app's ImageEncoder, None for the OpenCV default
+    """
+    ImageEncoder(png_level=png_level).write(result_path, result_img)
+
+def run_overlay_try_on(silhouette_path, dress_image, result_path, assets_root=None, png_level=None):
+    """
+    Job entry point for the controller's overlay path.
+
+    Args:
+        silhouette_path: Path to the silhouette image
+        dress_image: Path to the dress image
+        result_path: Where to write the PNG result
+        assets_root: Optional dress bundle directory
+        png_level: PNG zlib level of the result
+
+    Returns:
+        str: result_path
+    """
+    silhouette_img = cv2.imread(silhouette_path)
+    if silhouette_img is None:
+        raise ValueError(f"Failed to load silhouette image from {silhouette_path}")
+    dress_img = load_overlay_dress(dress_image, DressAssetStore(assets_root) if assets_root else None,
+                                   min_height=overlay_height(silhouette_img))
+
+    if dress_img is None:
+        raise ValueError(f"Failed to load dress image from {dress_image}")
+
+    write_result(result_path, overlay_on_silhouette(silhouette_img, dress_img), png_level)
+    return result_path
+
+# One fitting room per worker process, built on the first job it runs
+_worker_fitting_room = None
+
+def run_fitting_room_try_on(silhouette_path, dress_image, result_path, body_shape=None,
+                            measurements=None, data_dir=None, blend_mode="fixed", png_level=None,
+                            use_assets=True):
+    """
+    Job entry point running VirtualFittingRoom.try_on in a worker process.
+
+    Args:
+        silhouette_path: Path to the silhouette image
+        dress_image: Path to the dress image
+        result_path: Where to write the PNG result
+        body_shape: Optional body shape used for the template warp
+        measurements: Optional measurements used for the measurement warp
+        data_dir: Data directory holding the body templates
+        blend_mode: Overlay blend mode
+        png_level: PNG zlib level of the result
+        use_assets: False to decode the upload even if its bundle exists, so the
+            result matches the cache key it was queued under
+
+    Returns:
+        str: result_path
+    """
+    global _worker_fitting_room
+    if _worker_fitting_room is None:
+        from fittingroom.virtual_try_on import VirtualFittingRoom
+        _worker_fitting_room = VirtualFittingRoom(data_dir=data_dir, blend_mode=blend_mode)
+
+    result_img = _worker_fitting_room.try_on(silhouette_path, dress_image, body_shape=body_shape,
+                                             measurements=measurements, blend_mode=blend_mode,
+                                             use_assets=use_assets)
+    write_result(result_path, result_img, png_level)
+    return result_path
+
+# Job ids are hex (uuid4 or content hashes); anything else never reaches the status directory
+JOB_ID = re.compile(r'^[0-9a-f]{32,64}$')
+
+def write_job_status(path, record):
+    """
+    Write a job status record atomically, so readers in other workers never see a partial file.
+
+    Args:
+        path: Status file
+        record: JSON-serializable status dict
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(record, f, default=str)
+    os.replace(tmp_path, path)
+
+def read_job_status(path):
+    """Status record written by write_job_status, or None if missing or unreadable."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _run_job(status_path, fn, args, kwargs):
+    # Runs in the worker process: mark the job running for every Flask worker, then run it
+    if status_path is not None:
+        record = read_job_status(status_path)
+        if record is not None and record.get("status") == "queued":
+            write_job_status(status_path, dict(record, status="running", started_at=time.time()))
+    return fn(*args, **kwargs)
+
+class TryOnJobQueue:
+    """
+    Bounded process pool for try-on jobs.
+    Requests submit a job and poll for its status, so slow warps no longer hold
+    a Flask worker for the whole render. With a status_dir every job also has a
+    JSON status file there, so any Flask worker sharing the directory can answer
+    a poll, not just the one that queued the job.
+    """
+
+    def __init__(self, max_workers=2, max_pending=8, job_ttl=3600, status_dir=None):
+        """
+        Initialize the queue. Worker processes are started on the first submit.
+
+        Args:
+            max_workers: Number of worker processes
+            max_pending: Jobs allowed to wait on top of the ones running
+            job_ttl: Seconds a finished job is kept for polling
+            status_dir: Optional directory for job status files shared between
+                Flask workers; without it status is only known to this process
+        """
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.job_ttl = job_ttl
+        self.status_dir = status_dir
+        self._executor = ProcessPoolExecutor(max_workers=max_workers)
+        self._jobs = {}
+        self._last_sweep = 0.0
+        self._lock = threading.Lock()
+
+        if status_dir:
+            os.makedirs(status_dir, exist_ok=True)
+
+    def submit(self, fn, *args, metadata=None, job_id=None, **kwargs):
+        """
+        Queue a job.
+
+        Args:
+            fn: Module-level function to run in a worker process
+            *args: Positional arguments for fn
+            metadata: Optional dict returned with the job status
+            job_id: Optional hex id, e.g. a content hash, replacing any finished job
+                with that id; a new uuid by default
+            **kwargs: Keyword arguments for fn
+
+        Returns:
+            str: Job id
+
+        Raises:
+            QueueFullError: If running plus waiting jobs reach the bound
+        """
+        job_id = job_id or uuid.uuid4().hex
+        status_path = self._status_path(job_id)
+        with self._lock:
+            self._expire()
+            active = sum(1 for job in self._jobs.values() if not job["future"].done())
+            if active >= self.max_workers + self.max_pending:
+                raise QueueFullError(f"Try-on queue is full ({active} jobs in progress)")
+
+            job = {
+                "metadata": metadata or {},
+                "created_at": time.time(),
+                "finished_at": None
+            }
+            if status_path is not None:
+                write_job_status(status_path, {"job_id": job_id, "status": "queued",
+                                               "created_at": job["created_at"], "metadata": job["metadata"]})
+            job["future"] = self._submit(_run_job, status_path, fn, args, kwargs)
+            self._jobs[job_id] = job
+
+        # Outside the lock: the callback runs at once if the job already finished
+        job["future"].add_done_callback(lambda future: self._finish(job_id, job))
+        logger.info(f"Queued try-on job {job_id} ({active + 1} in progress)")
+        return job_id
+
+    def status(self, job_id):
+        """
+        Get the state of a job.
+
+        Args:
+            job_id: Id returned by submit, here or in another worker sharing status_dir
+
+        Returns:
+            Dict with job_id, status (queued, running, done or failed), metadata,
+            and result or error once finished; None for unknown or expired jobs
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return self._read_status(job_id)
+
+        future = job["future"]
+        status = {
+            "job_id": job_id,
+            "created_at": job["created_at"],
+            "metadata": job["metadata"]
+        }
+
+        if not future.done() or job["finished_at"] is None:
+            status["status"] = "running" if future.running() or future.done() else "queued"
+            return status
+
+        status["finished_at"] = job["finished_at"]
+        error = self._job_error(future)
+        if error is not None:
+            status["status"] = "failed"
+            status["error"] = error
+        else:
+            status["status"] = "done"
+            status["result"] = future.result()
+        return status
+
+    def stats(self):
+        """Return worker and job counts."""
+        with self._lock:
+            active = sum(1 for job in self._jobs.values() if not job["future"].done())
+            return {
+                "max_workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "active": active,
+                "tracked": len(self._jobs),
+                "status_dir": self.status_dir
+            }
+
+    def shutdown(self, wait=True):
+        """Stop the worker processes."""
+        self._executor.shutdown(wait=wait)
+
+    def _submit(self, *args):
+        # A worker killed mid-job (e.g. by the OOM killer) breaks the pool for good;
+        # its in-flight futures fail with BrokenProcessPool, and a fresh pool takes new jobs
+        try:
+            return self._executor.submit(*args)
+        except BrokenProcessPool:
+            logger.warning("Try-on worker pool is broken, starting new worker processes")
+            self._executor.shutdown(wait=False)
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._executor.submit(*args)
+
+    @staticmethod
+    def _job_error(future):
+        """Error message of a finished job, None if it succeeded."""
+        if future.cancelled():
+            return "Job was cancelled"
+        error = future.exception()
+        if isinstance(error, BrokenProcessPool):
+            return "Worker process died before the job finished"
+        return str(error) if error is not None else None
+
+    def _status_path(self, job_id):
+        if not self.status_dir or not JOB_ID.match(job_id):
+            return None
+        return os.path.join(self.status_dir, f"{job_id}.json")
+
+    def _finish(self, job_id, job):
+        # Done-callback: stamp the finish time and publish the outcome to the other workers
+        job["finished_at"] = time.time()
+        status_path = self._status_path(job_id)
+        if status_path is None:
+            return
+        future = job["future"]
+        record = {"job_id": job_id, "created_at": job["created_at"], "finished_at": job["finished_at"],
+                  "metadata": job["metadata"]}
+        error = self._job_error(future)
+        if error is not None:
+            record.update(status="failed", error=error)
+        else:
+            record.update(status="done", result=future.result())
+        try:
+            write_job_status(status_path, record)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"Could not write status of job {job_id}: {str(e)}")
+
+    def _read_status(self, job_id):
+        status_path = self._status_path(job_id)
+        record = read_job_status(status_path) if status_path is not None else None
+        if record is None:
+            return None
+        # Jobs of a worker that died never finish; stop reporting them after the TTL
+        if time.time() - (record.get("finished_at") or record.get("created_at", 0)) > self.job_ttl:
+            return None
+        return record
+
+    def _expire(self):
+        # Drop finished jobs nobody polled within the TTL
+        cutoff = time.time() - self.job_ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job["future"].done() and (job["finished_at"] or job["created_at"]) < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+        if not self.status_dir or time.time() - self._last_sweep < 60:
+            return
+        # Status files are shared, so whichever worker submits next removes stale ones
+        self._last_sweep = time.time()
+        for name in os.listdir(self.status_dir):
+            path = os.path.join(self.status_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
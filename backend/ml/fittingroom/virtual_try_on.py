@@ -9,6 +9,12 @@ import sys
 sys.path.append(str(Path(__file__).parent.parent))
 
 from models.body_model import BodyModel
+from fittingroom.tps_warp import ThinPlateSplineWarp, remap_nearest
+from utils.warp_cache import shared_warp_cache
+from utils.compositing import blend_masked, BLEND_MODES
+from models.dress_assets import DressAssetStore, threshold_dress_mask
+from utils.asset_pack import shared_asset_pack
+from utils.image_io import read_image
 
 logger = logging.getLogger(__name__)
 
@@ -18,30 +24,50 @@ class VirtualFittingRoom:
     This class handles the process of overlaying dress images onto user images.
     """
     
-    def __init__(self, data_dir=None):
+    def __init__(self, data_dir=None, warp_cache=None, blend_mode="fixed", assets=None):
         """
         Initialize the virtual fitting room with necessary resources.
         
         Args:
             data_dir: Base directory containing resources and models
+            warp_cache: Optional WarpFieldCache, defaults to the process-wide cache
+            blend_mode: Overlay arithmetic - "fixed" (uint8 with 16-bit fixed point),
+                "float32" or "float64" (original behaviour)
+            assets: Optional DressAssetStore, defaults to data_dir/dress_assets and
+                the shared asset pack when either exists
         """
+        if blend_mode not in BLEND_MODES:
+            raise ValueError(f"Unknown blend mode: {blend_mode}")
+        self.blend_mode = blend_mode
         self.data_dir = data_dir or "e:/Induvidual project/Dresslink-platform/backend/data"
         self.templates_dir = os.path.join(self.data_dir, "templates")
+        self.warp_cache = warp_cache or shared_warp_cache
+        
+        # Prebuilt dress bundles replace decoding and masking on the request path
+        assets_dir = os.path.join(self.data_dir, "dress_assets")
+        pack = shared_asset_pack()
+        if assets is None and (pack is not None or os.path.isdir(assets_dir)):
+            assets = DressAssetStore(assets_dir if os.path.isdir(assets_dir) else None)
+        self.assets = assets
         
         # Create directories if they don't exist
         os.makedirs(self.templates_dir, exist_ok=True)
         
-        # Load body templates for each body shape 
+        # Load body templates for each body shape, as views into the shared pack when packed
         self.body_templates = {}
         for shape in ["hourglass", "apple", "pear", "rectangle"]:
             template_path = os.path.join(self.templates_dir, f"{shape}_template.png")
-            if os.path.exists(template_path):
+            if pack is not None and f"template/{shape}" in pack:
+                self.body_templates[shape] = pack.get(f"template/{shape}")
+                logger.info(f"Mapped body template for {shape} shape from the asset pack")
+            elif os.path.exists(template_path):
                 self.body_templates[shape] = cv2.imread(template_path, cv2.IMREAD_UNCHANGED)
                 logger.info(f"Loaded body template for {shape} shape")
             else:
                 logger.warning(f"No body template found for {shape} shape at {template_path}")
     
-    def try_on(self, silhouette_path, dress_image_path, body_shape=None,measurements=None, output_path=None, is_silhouette=False):
+    def try_on(self, silhouette_path, dress_image_path, body_shape=None,measurements=None, output_path=None, is_silhouette=False, blend_mode=None,
+               use_assets=True):
         """
         Perform virtual try-on by overlaying a dress on a user image.
         
@@ -50,6 +76,8 @@ class VirtualFittingRoom:
             dress_image_path: Path to the dress image
             body_shape: User's body shape (hourglass, apple, pear, rectangle)
             output_path: Path to save the result
+            blend_mode: Optional override of the overlay blend mode
+            use_assets: False to decode the dress image even if it has a prebuilt bundle
             
         Returns:
             The result image as a numpy array
@@ -58,16 +86,25 @@ class VirtualFittingRoom:
         
         # Load images
         silhouette = cv2.imread(silhouette_path)
-        dress_img = cv2.imread(dress_image_path, cv2.IMREAD_UNCHANGED)
+        bundle = self.assets.load(dress_image_path) if self.assets is not None and use_assets else None
+        if bundle is None:
+            # Everything is finally drawn at silhouette size, so large JPEGs are decoded reduced
+            dress_img = read_image(dress_image_path, cv2.IMREAD_UNCHANGED,
+                                   min_height=silhouette.shape[0] if silhouette is not None else None)
+        else:
+            dress_img = None
         
         if silhouette is None:
             raise ValueError(f"Could not load silhouette from {silhouette_path}")
             
-        if dress_img is None:
+        if bundle is None and dress_img is None:
             raise ValueError(f"Could not load dress image from {dress_image_path}")
             
+        if bundle is not None:
+            # Decoded and masked offline
+            dress_img, dress_mask = bundle.bgr_and_mask()
         # Use alpha channel if available, otherwise create a mask
-        if dress_img.shape[2] == 4:
+        elif dress_img.shape[2] == 4:
            
             dress_mask = dress_img[:,:,3]
             dress_img = dress_img[:,:,0:3]
@@ -96,8 +133,10 @@ class VirtualFittingRoom:
             transformed_dress = cv2.resize(dress_img, (silhouette.shape[1], silhouette.shape[0]))
             transformed_mask = cv2.resize(dress_mask, (silhouette.shape[1], silhouette.shape[0]))
         
-        # Position the dress on the silhouette
-        result_img = self._overlay_dress(silhouette, transformed_dress, transformed_mask)
+        # Position the dress on the silhouette; the decoded silhouette is ours alone,
+        # so the dress is blended into it instead of a freshly allocated frame
+        result_img = self._overlay_dress(silhouette, transformed_dress, transformed_mask,
+                                         out=silhouette, blend_mode=blend_mode)
         
         # Save the result if output path provided
         if output_path:
@@ -130,11 +169,47 @@ class VirtualFittingRoom:
         hips = measurements.get('hips', 95)  # cm
         height = measurements.get('height', 165)  # cm
         
-        # Calculate proportions relative to standard measurements
-        bust_ratio = bust / 90.0  
-        waist_ratio = waist / 70.0  
-        hip_ratio = hips / 95.0  
+        # Calculate proportions relative to standard measurements, snapped to
+        # warp-cache buckets so similar measurements share one warp field
+        bust_ratio = self.warp_cache.quantize(bust / 90.0)
+        waist_ratio = self.warp_cache.quantize(waist / 70.0)
+        hip_ratio = self.warp_cache.quantize(hips / 95.0)
+        
+        cache_key = self.warp_cache.make_key(
+            "measurements", body_shape, bust_ratio, waist_ratio, hip_ratio,
+            h_dress, w_dress, target_height, target_width
+        )
+        map_x, map_y = self.warp_cache.get_or_build(
+            cache_key,
+            lambda: self._build_measurement_warp_field(
+                body_shape, bust_ratio, waist_ratio, hip_ratio,
+                h_dress, w_dress, target_height, target_width
+            )
+        )
+        
+        # Sample dress and mask with a single nearest-neighbour remap each
+        transformed_dress, transformed_mask = remap_nearest([dress_img, dress_mask], map_x, map_y)
+        
+        return transformed_dress, transformed_mask
+    
+    def _build_measurement_warp_field(self, body_shape, bust_ratio, waist_ratio, hip_ratio,
+                                      h_dress, w_dress, target_height, target_width):
+        """
+        Build the remap grid that fits a dress of the given size to the measurement ratios.
         
+        Args:
+            body_shape: Body shape classification
+            bust_ratio: Bust relative to the 90 cm reference
+            waist_ratio: Waist relative to the 70 cm reference
+            hip_ratio: Hips relative to the 95 cm reference
+            h_dress: Height of the source dress image
+            w_dress: Width of the source dress image
+            target_height: Height of the target silhouette
+            target_width: Width of the target silhouette
+            
+        Returns:
+            Tuple of float32 (map_x, map_y) arrays
+        """
         # Create transformation mesh
         src_mesh = np.array([
             [0, 0], [w_dress, 0],
@@ -182,28 +257,9 @@ class VirtualFittingRoom:
             [bottom_offset, target_height], [bottom_offset + bottom_width, target_height] 
         ], dtype=np.float32).reshape(-1, 2)
         
-        # Apply transformation using thin plate spline
-        tps = cv2.createThinPlateSplineShapeTransformer()
-        tps.estimateTransformation(dst_mesh.reshape(1, -1, 2), src_mesh.reshape(1, -1, 2), None)
-        
-        # Create output images
-        transformed_dress = np.zeros((target_height, target_width, 3), dtype=np.uint8)
-        transformed_mask = np.zeros((target_height, target_width), dtype=np.uint8)
-        
-        # Apply transformation to each point
-        for y in range(target_height):
-            for x in range(target_width):
-                # Get transformed coordinates
-                pt = np.array([[x, y]], dtype=np.float32).reshape(1, 1, 2)
-                transformed_pt = tps.applyTransformation(pt)[0][0]
-                tx, ty = int(transformed_pt[0]), int(transformed_pt[1])
-                
-                # Check if transformed point is within original dress bounds
-                if 0 <= tx < w_dress and 0 <= ty < h_dress:
-                    transformed_dress[y, x] = dress_img[ty, tx]
-                    transformed_mask[y, x] = dress_mask[ty, tx]
-        
-        return transformed_dress, transformed_mask
+        # Solve the thin plate spline once and evaluate it over the whole target grid
+        tps = ThinPlateSplineWarp(dst_mesh, src_mesh)
+        return tps.build_remap(target_height, target_width, source_size=(w_dress, h_dress))
     
     def adjust_fit(self, previous_result_path, tightness=0, length=0, shoulder_width=0, output_path=None):
         """
@@ -276,17 +332,8 @@ class VirtualFittingRoom:
         Returns:
             Binary mask for the dress
         """
-        # Convert to grayscale
-        gray = cv2.cvtColor(dress_img, cv2.COLOR_BGR2GRAY)
-        
-        # Threshold to get binary mask
-        _, mask = cv2.threshold(gray, 240, 255, cv2.THRESH_BINARY_INV)
-        
-        # Apply morphological operations to clean up the mask
-        kernel = np.ones((5, 5), np.uint8)
-        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
-        
-        return mask
+        # Threshold and clean up; shared with the offline bundle build
+        return threshold_dress_mask(dress_img)
     
     def _transform_dress_for_body_shape(self, dress_img, dress_mask, body_shape):
         """
@@ -310,6 +357,34 @@ class VirtualFittingRoom:
             logger.warning(f"No template available for {body_shape}, using simple resize")
             return cv2.resize(dress_img, (w_dress, h_dress)), cv2.resize(dress_mask, (w_dress, h_dress))
         
+        # Template warps depend only on the shape and sizes, not on the dress pixels
+        h_template, w_template = template.shape[:2]
+        cache_key = self.warp_cache.make_key(
+            "template", body_shape, h_template, w_template, h_dress, w_dress
+        )
+        map_x, map_y = self.warp_cache.get_or_build(
+            cache_key,
+            lambda: self._build_template_warp_field(template, body_shape, h_dress, w_dress)
+        )
+        
+        # Sample dress and mask with a single nearest-neighbour remap each
+        transformed_dress, transformed_mask = remap_nearest([dress_img, dress_mask], map_x, map_y)
+        
+        return transformed_dress, transformed_mask
+    
+    def _build_template_warp_field(self, template, body_shape, h_dress, w_dress):
+        """
+        Build the remap grid that fits a dress of the given size to a body shape template.
+        
+        Args:
+            template: RGBA body template for the shape
+            body_shape: Body shape to transform for
+            h_dress: Height of the dress image
+            w_dress: Width of the dress image
+            
+        Returns:
+            Tuple of float32 (map_x, map_y) arrays
+        """
         h_template, w_template = template.shape[:2]
         
         # Calculate width at different heights based on template
@@ -366,32 +441,11 @@ class VirtualFittingRoom:
             dst_mesh[4][0] -= hip_adjustment * 0.1
             dst_mesh[5][0] += hip_adjustment * 0.1
         
-        
-        # Apply transformation using thin plate spline
-        tps = cv2.createThinPlateSplineShapeTransformer()
-        tps.estimateTransformation(dst_mesh.reshape(1, -1, 2), src_mesh.reshape(1, -1, 2), None)
-        
-        # Apply transformation
-        transformed_dress = np.zeros_like(dress_img)
-        transformed_mask = np.zeros_like(dress_mask)
-        
-        # Apply transformation to each point
-        h, w = dress_img.shape[:2]
-        for y in range(h):
-            for x in range(w):
-                # Get transformed coordinates
-                pt = np.array([[x, y]], dtype=np.float32).reshape(1, 1, 2)
-                transformed_pt = tps.applyTransformation(pt)[0][0]
-                tx, ty = int(transformed_pt[0]), int(transformed_pt[1])
-                
-                # Check if transformed point is within bounds
-                if 0 <= tx < w and 0 <= ty < h:
-                    transformed_dress[y, x] = dress_img[ty, tx]
-                    transformed_mask[y, x] = dress_mask[ty, tx]
-        
-        return transformed_dress, transformed_mask
+        # Solve the thin plate spline once and evaluate it over the whole dress grid
+        tps = ThinPlateSplineWarp(dst_mesh, src_mesh)
+        return tps.build_remap(h_dress, w_dress, source_size=(w_dress, h_dress))
     
-    def _overlay_dress(self, user_img, dress_img, mask):
+    def _overlay_dress(self, user_img, dress_img, mask, out=None, blend_mode=None):
         """
         Overlay dress on user image using the mask.
         
@@ -399,6 +453,8 @@ class VirtualFittingRoom:
             user_img: User image
             dress_img: Transformed dress image
             mask: Binary mask for the dress
+            out: Optional preallocated output buffer with the user image shape
+            blend_mode: Optional override of the instance blend mode
             
         Returns:
             Combined image with dress overlaid on user
@@ -411,14 +467,5 @@ class VirtualFittingRoom:
             dress_img = cv2.resize(dress_img, (w_user, h_user))
             mask = cv2.resize(mask, (w_user, h_user))
         
-        # Create copy of user image
-        result = user_img.copy()
-        
-        # Normalize mask to 0-1 range for alpha blending
-        alpha = mask.astype(float) / 255.0
-        alpha = alpha[:, :, np.newaxis] 
-        
-        # Apply alpha blending
-        result = (1.0 - alpha) * result + alpha * dress_img
-        
-        return result.astype(np.uint8)
\ No newline at end of file
+        # Blend only where the mask is set, writing straight into the output buffer
+        return blend_masked(user_img, dress_img, mask, mode=blend_mode or self.blend_mode, out=out)
@@ -1,4 +1,5 @@
 import os
+import hashlib
 import numpy as np
 import cv2
 import logging
@@ -13,6 +14,8 @@ sys.path.append(str(Path(__file__).parent.parent))
 
 # Import the measurement processor
 from data_preprocessing.body_measurements import BodyMeasurementsProcessor
+from utils.compositing import alpha_composite
+from utils.asset_pack import shared_asset_pack
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -278,12 +281,33 @@ class BodyModel:
             output_path: Optional path to save the rendered image
             
         Returns:
-            np.ndarray: The rendered body model image
+            np.ndarray: The rendered body model image; read-only when it comes
+            from the shared asset pack, so copy it before drawing on it
         """
         # Ensure body segments are calculated
         if not self.body_segments:
             self._calculate_body_segments()
         
+        # Standard bodies are pre-rendered into the shared asset pack
+        pack = shared_asset_pack()
+        canvas = pack.get(f"body/{self.render_key()}") if pack is not None else None
+        if canvas is None:
+            canvas = self.draw_canvas()
+        
+        # Save if needed
+        if output_path:
+            cv2.imwrite(output_path, cv2.cvtColor(canvas, cv2.COLOR_RGBA2BGRA))
+            logger.info(f"Body model saved to {output_path}")
+        
+        return canvas
+    
+    def draw_canvas(self) -> np.ndarray:
+        """
+        Draw the body and its annotation on a new transparent canvas.
+        
+        Returns:
+            np.ndarray: RGBA canvas
+        """
         # Create transparent canvas
         canvas = np.ones((self.canvas_size[1], self.canvas_size[0], 4), dtype=np.uint8) * 255
         canvas[:, :, 3] = 0  
@@ -300,13 +324,21 @@ class BodyModel:
             text_y = int(self.canvas_size[1] * 0.95)
             cv2.putText(canvas, text, (text_x, text_y), font, 0.6, (0, 0, 0, 255), 2)
         
-        # Save if needed
-        if output_path:
-            cv2.imwrite(output_path, cv2.cvtColor(canvas, cv2.COLOR_RGBA2BGRA))
-            logger.info(f"Body model saved to {output_path}")
-        
         return canvas
     
+    def render_key(self) -> str:
+        """
+        Digest of everything render() draws, naming the body in the asset pack.
+        
+        Returns:
+            str: Hex digest
+        """
+        if not self.body_segments:
+            self._calculate_body_segments()
+        state = repr((self.canvas_size, self.body_color, self.outline_color,
+                      self.body_shape, self.size, sorted(self.body_segments.items())))
+        return hashlib.sha1(state.encode('utf-8')).hexdigest()
+    
     def _draw_body(self, canvas):
         """Draw the body on the canvas with shape-specific adjustments."""
         # Extract body segments
@@ -641,27 +673,8 @@ class BodyModel:
         result = np.copy(body_canvas)
         
         # Alpha blend the dress onto the body
-        for y in range(dress_height):
-            if y_offset + y >= self.canvas_size[1]:
-                break
-                
-            for x in range(dress_width):
-                if (y_offset + y) < 0 or (x_offset + x) < 0 or (x_offset + x) >= self.canvas_size[0]:
-                    continue
-                    
-                # Only apply dress pixels with alpha > 0
-                if resized_dress.shape[2] > 3 and resized_dress[y, x, 3] > 0:
-                    alpha = resized_dress[y, x, 3] / 255.0
-                    
-                    # Alpha blend
-                    for c in range(3):  # RGB channels
-                        result[y_offset + y, x_offset + x, c] = int(
-                            alpha * resized_dress[y, x, c] + 
-                            (1 - alpha) * body_canvas[y_offset + y, x_offset + x, c]
-                        )
-                    
-                    # Set alpha channel
-                    result[y_offset + y, x_offset + x, 3] = 255
+        if resized_dress.shape[2] > 3:
+            alpha_composite(result, resized_dress, x_offset, y_offset)
         
         return result
     
@@ -0,0 +1,120 @@
+import time
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Feature order expected by the trained scaler and classifier
+FEATURE_COLUMNS = ['bust', 'waist', 'hips', 'bust_to_waist', 'waist_to_hip', 'bust_to_hip']
+
+def build_feature_arrays(bust, waist, hips, height=None):
+    """
+    Compute measurement and ratio features for many users at once.
+
+    Args:
+        bust: (N,) bust measurements
+        waist: (N,) waist measurements
+        hips: (N,) hip measurements
+        height: Optional (N,) heights, zeros when omitted
+
+    Returns:
+        Dict of float64 arrays keyed like the scalar feature dict,
+        ratios are 0 where the denominator is not positive
+    """
+    bust = np.asarray(bust, dtype=np.float64)
+    waist = np.asarray(waist, dtype=np.float64)
+    hips = np.asarray(hips, dtype=np.float64)
+    height = np.zeros_like(bust) if height is None else np.asarray(height, dtype=np.float64)
+
+    return {
+        'bust': bust,
+        'waist': waist,
+        'hips': hips,
+        'height': height,
+        'bust_to_waist': np.divide(bust, waist, out=np.zeros_like(bust), where=waist > 0),
+        'waist_to_hip': np.divide(waist, hips, out=np.zeros_like(bust), where=hips > 0),
+        'bust_to_hip': np.divide(bust, hips, out=np.zeros_like(bust), where=hips > 0)
+    }
+
+def feature_matrix(features):
+    """Stack feature arrays into the (N, 6) matrix used by the scaler."""
+    return np.column_stack([features[name] for name in FEATURE_COLUMNS])
+
+def classify_rules(features):
+    """
+    Vectorized version of the rule-based body shape classification.
+    Conditions are evaluated in the same order as the scalar if/elif chain.
+
+    Args:
+        features: Feature arrays from build_feature_arrays
+
+    Returns:
+        np.ndarray: Body shape label per user
+    """
+    bust_to_waist = features['bust_to_waist']
+    waist_to_hip = features['waist_to_hip']
+
+    return np.select(
+        [
+            (bust_to_waist > 1.1) & (waist_to_hip < 0.9),
+            (bust_to_waist > 1.05) & (waist_to_hip > 0.8),
+            (bust_to_waist < 1.05) & (waist_to_hip < 0.8)
+        ],
+        ["hourglass", "apple", "pear"],
+        default="rectangle"
+    )
+
+def classify_batch(features, model=None, scaler=None):
+    """
+    Classify many users with one scaler and one model call.
+    Falls back to the vectorized rules when no model is given or prediction fails.
+
+    Args:
+        features: Feature arrays from build_feature_arrays
+        model: Optional trained classifier
+        scaler: Optional scaler fitted on FEATURE_COLUMNS
+
+    Returns:
+        np.ndarray: Body shape label per user
+    """
+    if len(features['bust']) == 0:
+        return np.array([], dtype=object)
+
+    if model is not None and scaler is not None:
+        try:
+            return np.asarray(model.predict(scaler.transform(feature_matrix(features))))
+        except Exception as e:
+            logger.error(f"Error in batch ML classification: {str(e)}")
+            logger.info("Falling back to rule-based classification")
+
+    return classify_rules(features)
+
+
+if __name__ == "__main__":
+    # Check the vectorized rules against the scalar chain and time a size chart sized batch
+    def classify_rules_scalar(bust_to_waist, waist_to_hip):
+        if bust_to_waist > 1.1 and waist_to_hip < 0.9:
+            return "hourglass"
+        elif bust_to_waist > 1.05 and waist_to_hip > 0.8:
+            return "apple"
+        elif bust_to_waist < 1.05 and waist_to_hip < 0.8:
+            return "pear"
+        else:
+            return "rectangle"
+
+    rng = np.random.default_rng(0)
+    n = 100000
+    features = build_feature_arrays(rng.uniform(70, 120, n), rng.uniform(0, 110, n), rng.uniform(0, 130, n))
+
+    start = time.perf_counter()
+    scalar = [classify_rules_scalar(btw, wth) for btw, wth in zip(features['bust_to_waist'].tolist(),
+                                                                  features['waist_to_hip'].tolist())]
+    scalar_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vectorized = classify_rules(features)
+    vector_time = time.perf_counter() - start
+
+    mismatches = int(np.sum(vectorized != np.array(scalar)))
+    print(f"{n} rows: scalar {scalar_time * 1000:.1f} ms, vectorized {vector_time * 1000:.1f} ms, "
+          f"mismatches {mismatches}")
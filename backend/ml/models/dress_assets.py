@@ -0,0 +1,416 @@
+import os
+import json
+import shutil
+import logging
+import threading
+from collections import OrderedDict
+import cv2
+import numpy as np
+from pathlib import Path
+import sys
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+
+from utils.result_cache import file_digest
+from utils.asset_pack import AssetPackWriter, shared_asset_pack
+
+logger = logging.getLogger(__name__)
+
+# Bump when the bundle layout or the mask computation changes
+BUNDLE_VERSION = 1
+
+# Standard working height, as in ImageProcessor; taller dresses also get a copy at this height
+NORMALIZED_HEIGHT = 800
+
+def threshold_dress_mask(dress_img):
+    """
+    Mask of a dress on a white background: threshold at 240, then a 5x5 opening.
+
+    Args:
+        dress_img: BGR dress image without alpha channel
+
+    Returns:
+        np.ndarray: uint8 mask, 255 on the dress
+    """
+    gray = cv2.cvtColor(dress_img, cv2.COLOR_BGR2GRAY)
+    _, mask = cv2.threshold(gray, 240, 255, cv2.THRESH_BINARY_INV)
+    kernel = np.ones((5, 5), np.uint8)
+    return cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
+
+def alpha_bbox(alpha):
+    """
+    Tight bounding box of the non-zero alpha.
+
+    Args:
+        alpha: uint8 alpha channel
+
+    Returns:
+        Tuple of (x, y, width, height), the full image if alpha is empty
+    """
+    rows = np.flatnonzero(alpha.any(axis=1))
+    cols = np.flatnonzero(alpha.any(axis=0))
+    if len(rows) == 0:
+        return 0, 0, alpha.shape[1], alpha.shape[0]
+    return int(cols[0]), int(rows[0]), int(cols[-1] - cols[0] + 1), int(rows[-1] - rows[0] + 1)
+
+class DressBundle:
+    """
+    Decoded, segmented dress ready for try-on.
+    Arrays are memory-mapped read-only and shared between requests, so loading
+    costs no decode; callers copy before modifying them.
+    """
+
+    def __init__(self, meta, rgba, alpha_crop, mips, fitting_mask=None, normalized=None):
+        self.meta = meta
+        self.rgba = rgba
+        self.alpha_crop = alpha_crop
+        self.mips = mips
+        self.fitting_mask = fitting_mask
+        # RGBA scaled to NORMALIZED_HEIGHT, the full image when it is not taller
+        self.normalized = normalized if normalized is not None else rgba
+
+    @property
+    def bbox(self):
+        """Tight (x, y, width, height) of the dress in rgba."""
+        return tuple(self.meta['bbox'])
+
+    @property
+    def dress_type(self):
+        """Clothing type detected at build time: full, top, bottom or unknown."""
+        return self.meta['dress_type']
+
+    def bgr_and_mask(self):
+        """
+        BGR image and mask in the form VirtualFittingRoom works with.
+
+        Returns:
+            Tuple of (BGR uint8 image, uint8 mask)
+        """
+        bgr = cv2.cvtColor(np.asarray(self.rgba), cv2.COLOR_RGBA2BGR)
+        mask = self.fitting_mask if self.fitting_mask is not None else self.rgba[:, :, 3]
+        return bgr, np.asarray(mask)
+
+    def mip(self, max_height):
+        """Smallest stored level at least max_height tall, or the full image."""
+        for level in reversed(self.mips):
+            if level.shape[0] >= max_height:
+                return level
+        return self.rgba
+
+def build_dress_bundle(image_path, bundle_dir, transformer=None, dress_info=None, mip_levels=3):
+    """
+    Decode and segment a dress image once and write its asset bundle.
+
+    Layout of bundle_dir: rgba.npy (RGBA as DressTransformer.preprocess_dress_image
+    returns it), alpha_crop.npy (alpha inside the bounding box), mip1.npy ... (RGBA
+    halved per level), fitting_mask.npy (VirtualFittingRoom's mask, only for sources
+    without alpha), normalized.npy (RGBA at NORMALIZED_HEIGHT, only for taller
+    sources) and meta.json.
+
+    Args:
+        image_path: Source dress image
+        bundle_dir: Directory to write, replaced atomically
+        transformer: DressTransformer used for the mask and type, created if None
+        dress_info: Optional catalog row, its 'type' overrides the detected type
+        mip_levels: Number of downscaled levels
+
+    Returns:
+        Dict: The bundle metadata
+    """
+    if transformer is None:
+        from models.dress_transformer import DressTransformer
+        transformer = DressTransformer()
+
+    # One decode serves the transformer's RGBA and VirtualFittingRoom's mask
+    source = cv2.imread(image_path, cv2.IMREAD_UNCHANGED)
+    if source is None:
+        raise ValueError(f"Could not read dress image {image_path}")
+    content_hash = file_digest(image_path)
+    rgba, segmentation = transformer.prepare_dress_image(source, cache_key=content_hash)
+    fitting_mask = threshold_dress_mask(source) if source.ndim == 3 and source.shape[2] == 3 else None
+
+    x, y, w, h = alpha_bbox(rgba[:, :, 3])
+    normalized = None
+    if rgba.shape[0] > NORMALIZED_HEIGHT:
+        width = max(1, round(rgba.shape[1] * NORMALIZED_HEIGHT / rgba.shape[0]))
+        normalized = cv2.resize(np.asarray(rgba), (width, NORMALIZED_HEIGHT), interpolation=cv2.INTER_AREA)
+    meta = {
+        'version': BUNDLE_VERSION,
+        'source': os.path.abspath(image_path),
+        'content_hash': content_hash,
+        'shape': list(rgba.shape),
+        'bbox': [x, y, w, h],
+        'dress_type': transformer.determine_dress_type(rgba, dress_info),
+        'mip_levels': 0,
+        'has_fitting_mask': fitting_mask is not None,
+        'has_normalized': normalized is not None,
+        # How the alpha was obtained; 'alpha' when the source carried its own
+        'segmentation': segmentation.quality if segmentation is not None else 'alpha'
+    }
+
+    tmp_dir = f"{bundle_dir}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    np.save(os.path.join(tmp_dir, 'rgba.npy'), np.ascontiguousarray(rgba))
+    np.save(os.path.join(tmp_dir, 'alpha_crop.npy'), np.ascontiguousarray(rgba[y:y + h, x:x + w, 3]))
+    if fitting_mask is not None:
+        np.save(os.path.join(tmp_dir, 'fitting_mask.npy'), fitting_mask)
+    if normalized is not None:
+        np.save(os.path.join(tmp_dir, 'normalized.npy'), normalized)
+
+    level = rgba
+    for i in range(1, mip_levels + 1):
+        if min(level.shape[:2]) < 16:
+            break
+        level = cv2.resize(level, (level.shape[1] // 2, level.shape[0] // 2), interpolation=cv2.INTER_AREA)
+        np.save(os.path.join(tmp_dir, f'mip{i}.npy'), level)
+        meta['mip_levels'] = i
+
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+    shutil.rmtree(bundle_dir, ignore_errors=True)
+    os.makedirs(os.path.dirname(os.path.abspath(bundle_dir)), exist_ok=True)
+    os.replace(tmp_dir, bundle_dir)
+    return meta
+
+class DressAssetStore:
+    """
+    Directory of dress bundles keyed by the content hash of the source image.
+    Lookups hash the requested file (memoized on path, size and mtime) and
+    memory-map its bundle, so the request path skips decoding and segmentation.
+    Bundles packed into the shared asset pack are read from there first.
+    """
+
+    def __init__(self, root=None, max_open=64, pack=None):
+        """
+        Initialize the store.
+
+        Args:
+            root: Bundle directory, usually data/dress_assets, or None to use only the pack
+            max_open: Number of memory-mapped bundles kept open
+            pack: Optional AssetPack, defaults to the shared asset pack
+        """
+        self.root = root
+        self.pack = pack
+        self.max_open = max_open
+        self.hits = 0
+        self.misses = 0
+        self._open = OrderedDict()
+        self._lock = threading.Lock()
+
+    def bundle_dir(self, content_hash):
+        """Directory holding the bundle for a source content hash."""
+        return os.path.join(self.root, content_hash[:2], content_hash)
+
+    def build(self, image_path, transformer=None, dress_info=None):
+        """Build or rebuild the bundle for a dress image; see build_dress_bundle."""
+        return build_dress_bundle(image_path, self.bundle_dir(file_digest(image_path)),
+                                  transformer=transformer, dress_info=dress_info)
+
+    def load(self, image_path):
+        """
+        Memory-map the bundle for a dress image.
+
+        Args:
+            image_path: Source dress image
+
+        Returns:
+            DressBundle, or None if the image has no bundle or does not exist
+        """
+        try:
+            content_hash = file_digest(image_path)
+        except OSError:
+            return None
+        return self.load_bundle(content_hash)
+
+    def load_bundle(self, content_hash):
+        """
+        Memory-map the bundle for a source content hash, e.g. an asset id.
+
+        Args:
+            content_hash: SHA-256 of the source image, as file_digest returns it
+
+        Returns:
+            DressBundle, or None if there is no current bundle for it
+        """
+        with self._lock:
+            bundle = self._open.get(content_hash)
+            if bundle is not None:
+                self._open.move_to_end(content_hash)
+                self.hits += 1
+                return bundle
+
+        bundle = self._read_packed(content_hash)
+        if bundle is None and self.root:
+            bundle = self.read_bundle_dir(self.bundle_dir(content_hash))
+        with self._lock:
+            if bundle is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._open[content_hash] = bundle
+            while len(self._open) > self.max_open:
+                self._open.popitem(last=False)
+        return bundle
+
+    def stats(self):
+        """Return open bundle count and hit/miss counters."""
+        with self._lock:
+            return {"open": len(self._open), "hits": self.hits, "misses": self.misses}
+
+    def _read_packed(self, content_hash):
+        pack = self.pack if self.pack is not None else shared_asset_pack()
+        prefix = f"dress/{content_hash}/"
+        if pack is None or f"{prefix}rgba" not in pack:
+            return None
+        meta = pack.attrs(f"{prefix}rgba")
+        if meta.get('version') != BUNDLE_VERSION:
+            return None
+        mips = [pack.get(f"{prefix}mip{i}") for i in range(1, meta['mip_levels'] + 1)]
+        return DressBundle(meta, pack.get(f"{prefix}rgba"), pack.get(f"{prefix}alpha_crop"),
+                           mips, pack.get(f"{prefix}fitting_mask"), pack.get(f"{prefix}normalized"))
+
+    def read_bundle_dir(self, bundle_dir):
+        """
+        Memory-map a bundle directory written by build_dress_bundle, bypassing the open bundles.
+
+        Args:
+            bundle_dir: Bundle directory
+
+        Returns:
+            DressBundle, or None if it is missing, unreadable or of an older version
+        """
+        meta_path = os.path.join(bundle_dir, 'meta.json')
+        if not os.path.exists(meta_path):
+            return None
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta.get('version') != BUNDLE_VERSION:
+                return None
+
+            def array(name):
+                return np.load(os.path.join(bundle_dir, f'{name}.npy'), mmap_mode='r')
+
+            mips = [array(f'mip{i}') for i in range(1, meta['mip_levels'] + 1)]
+            fitting_mask = array('fitting_mask') if meta['has_fitting_mask'] else None
+            normalized = array('normalized') if meta.get('has_normalized') else None
+            return DressBundle(meta, array('rgba'), array('alpha_crop'), mips, fitting_mask, normalized)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Could not read dress bundle {bundle_dir}: {str(e)}")
+            return None
+
+def build_asset_pack(pack_path, bundle_root=None, templates_dir=None, bodies=()):
+    """
+    Pack body templates, dress bundles and pre-rendered bodies into one mappable file.
+
+    Assets are named template/<shape>, dress/<content hash>/<array> (bundle metadata
+    stored with the rgba array) and body/<BodyModel.render_key()>.
+
+    Args:
+        pack_path: Pack file to write
+        bundle_root: Directory of dress bundles from DressAssetStore.build
+        templates_dir: Directory holding <shape>_template.png body templates
+        bodies: Measurement dicts of standard bodies to pre-render
+
+    Returns:
+        int: Number of arrays written
+    """
+    count = 0
+    with AssetPackWriter(pack_path) as writer:
+        if templates_dir:
+            for shape in ["hourglass", "apple", "pear", "rectangle"]:
+                template_path = os.path.join(templates_dir, f"{shape}_template.png")
+                template = cv2.imread(template_path, cv2.IMREAD_UNCHANGED) if os.path.exists(template_path) else None
+                if template is not None:
+                    writer.add(f"template/{shape}", template)
+                    count += 1
+
+        if bundle_root:
+            store = DressAssetStore(bundle_root)
+            for dirpath, _, names in os.walk(bundle_root):
+                if 'meta.json' not in names or dirpath.endswith('.tmp'):
+                    continue
+                bundle = store.read_bundle_dir(dirpath)
+                if bundle is None:
+                    continue
+                prefix = f"dress/{bundle.meta['content_hash']}/"
+                writer.add(f"{prefix}rgba", bundle.rgba, **bundle.meta)
+                writer.add(f"{prefix}alpha_crop", bundle.alpha_crop)
+                for i, level in enumerate(bundle.mips, 1):
+                    writer.add(f"{prefix}mip{i}", level)
+                count += 2 + len(bundle.mips)
+                if bundle.fitting_mask is not None:
+                    writer.add(f"{prefix}fitting_mask", bundle.fitting_mask)
+                    count += 1
+                if bundle.normalized is not bundle.rgba:
+                    writer.add(f"{prefix}normalized", bundle.normalized)
+                    count += 1
+
+        if bodies:
+            from models.body_model import BodyModel
+            seen = set()
+            for measurements in bodies:
+                body = BodyModel()
+                body.update_measurements(measurements)
+                key = body.render_key()
+                if key not in seen:
+                    seen.add(key)
+                    writer.add(f"body/{key}", body.draw_canvas())
+                    count += 1
+    return count
+
+
+if __name__ == "__main__":
+    # Offline build: python models/dress_assets.py <image dir or ingestion manifest> <bundle dir> [pack file]
+    # The optional pack also takes the body templates under $DATA_DIR/templates and a standard size chart
+    import time
+    from data_preprocessing.ingest_manifest import IngestManifest, MANIFEST_EXTENSIONS
+    from models.dress_transformer import DressTransformer
+    from models.dress_segmentation import DressSegmenter
+
+    source, root = sys.argv[1], sys.argv[2]
+    if source.endswith(MANIFEST_EXTENSIONS):
+        manifest = IngestManifest(source)
+        image_paths = list(manifest.to_dataframe()['output_path'])
+        manifest.close()
+    else:
+        image_paths = [os.path.join(dirpath, name) for dirpath, _, names in os.walk(source)
+                       for name in sorted(names) if name.lower().endswith(('.png', '.jpg', '.jpeg'))]
+
+    store = DressAssetStore(root)
+    # Offline builds can afford GrabCut without a time budget
+    transformer = DressTransformer(segmenter=DressSegmenter(time_budget_ms=None))
+    start = time.perf_counter()
+    built = 0
+    for path in image_paths:
+        if store.load(path) is None:
+            store.build(path, transformer)
+            built += 1
+    print(f"Built {built} bundles ({len(image_paths) - built} up to date) "
+          f"in {time.perf_counter() - start:.1f}s under {root}")
+
+    # Request-path cost for the largest image: decode and segment vs memory-mapping the bundle
+    if image_paths:
+        path = max(image_paths, key=os.path.getsize)
+        start = time.perf_counter()
+        for _ in range(20):
+            transformer.preprocess_dress_image(path)
+        decode_ms = (time.perf_counter() - start) / 20 * 1000
+        bundle_dir = store.bundle_dir(file_digest(path))
+        start = time.perf_counter()
+        for _ in range(20):
+            np.asarray(store.read_bundle_dir(bundle_dir).rgba).sum()
+        mmap_ms = (time.perf_counter() - start) / 20 * 1000
+        print(f"{os.path.basename(path)}: decode and segment {decode_ms:.1f} ms, mmap bundle {mmap_ms:.1f} ms")
+
+    if len(sys.argv) > 3:
+        chart = [{'bust': bust, 'waist': bust - waist_gap, 'hips': bust + hip_gap, 'height': height}
+                 for bust in (80, 85, 90, 95, 100, 105)
+                 for waist_gap, hip_gap in ((25, 0), (10, -8), (15, 10), (12, 2))
+                 for height in (160, 170)]
+        templates_dir = os.path.join(os.environ.get('DATA_DIR', os.path.dirname(os.path.abspath(root))), 'templates')
+        count = build_asset_pack(sys.argv[3], bundle_root=root, templates_dir=templates_dir, bodies=chart)
+        print(f"Packed {count} arrays into {sys.argv[3]} ({os.path.getsize(sys.argv[3]) / 1e6:.1f} MB)")
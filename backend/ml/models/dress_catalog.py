@@ -0,0 +1,321 @@
+import os
+import json
+import logging
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional
+from pathlib import Path
+import sys
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+
+from data_preprocessing.dress_images import DressImageProcessor
+from data_preprocessing.ingest_manifest import IngestManifest, MANIFEST_FILENAME, MANIFEST_EXTENSIONS
+
+logger = logging.getLogger(__name__)
+
+# Ratio of body to garment measurement considered a good fit, per measurement
+FIT_TOLERANCES = {
+    'bust': (0.9, 1.1),
+    'waist': (0.85, 1.15),
+    'hips': (0.9, 1.1)
+}
+
+class DressCatalog:
+    """
+    Long-lived, read-only dress catalog service.
+    Parses the catalog once and owns its indexes so they can be shared
+    across requests instead of being rebuilt by every DressTransformer.
+    """
+
+    def __init__(self, catalog_path: str):
+        """
+        Load the catalog and build its indexes.
+
+        Args:
+            catalog_path: Path to the preprocessed dress catalog dataset, a CSV
+                or an ingestion manifest (.sqlite)
+        """
+        self.catalog_path = catalog_path
+        self.processor = DressImageProcessor(catalog_path)
+
+        # Processed image paths from the ingestion manifest stored beside the catalog
+        self.image_paths = self._load_image_index(catalog_path)
+
+        try:
+            if catalog_path.endswith(MANIFEST_EXTENSIONS):
+                self.catalog_df = self._read_manifest(catalog_path)
+            else:
+                self.catalog_df = pd.read_csv(catalog_path)
+            self.records = self.catalog_df.to_dict('records')
+            # Lookup dictionary for fast access by ID
+            self.dress_lookup = {str(record['id']): record for record in self.records}
+        except Exception as e:
+            logger.warning(f"Could not create lookup table from catalog CSV: {str(e)}")
+            self.catalog_df = None
+            self.records = []
+            self.dress_lookup = {}
+
+        # Garment measurements as NumPy columns, NaN where a dress has no value
+        self.measurement_columns = self._build_measurement_columns()
+
+        logger.info(f"Dress catalog service ready with {len(self)} items from {catalog_path}")
+
+    def __len__(self):
+        return len(self.catalog_df) if self.catalog_df is not None else 0
+
+    def get_dress_by_id(self, dress_id: str) -> Optional[Dict]:
+        """
+        Get dress information by ID.
+
+        Args:
+            dress_id: ID of the dress in the catalog
+
+        Returns:
+            Dict with the catalog row, or None if not found
+        """
+        return self.dress_lookup.get(str(dress_id))
+
+    def image_path(self, name: str) -> Optional[str]:
+        """
+        Processed image for a dress id or image file name, from the ingestion manifest.
+
+        Args:
+            name: Dress id, file name or path
+
+        Returns:
+            Path of the processed image, or None if the manifest does not know it
+        """
+        stem = os.path.splitext(os.path.basename(str(name)))[0]
+        return self.image_paths.get(stem)
+
+    @staticmethod
+    def _read_manifest(manifest_path: str) -> pd.DataFrame:
+        manifest = IngestManifest(manifest_path)
+        try:
+            return manifest.to_dataframe()
+        finally:
+            manifest.close()
+
+    def _load_image_index(self, catalog_path: str) -> Dict[str, str]:
+        if catalog_path.endswith(MANIFEST_EXTENSIONS):
+            manifest_path = catalog_path
+        else:
+            manifest_path = os.path.join(os.path.dirname(catalog_path), MANIFEST_FILENAME)
+        if not os.path.exists(manifest_path):
+            return {}
+
+        try:
+            df = self._read_manifest(manifest_path)
+        except Exception as e:
+            logger.warning(f"Could not read ingestion manifest {manifest_path}: {str(e)}")
+            return {}
+        return dict(zip(df['id'], df['output_path']))
+
+    def _build_measurement_columns(self) -> Dict[str, np.ndarray]:
+        """
+        Extract bust, waist and hips garment measurements into float64 columns.
+        Values come from plain columns when present, otherwise from a
+        per-row 'measurements' dict (or its JSON string form).
+        """
+        n = len(self.records)
+        columns = {name: np.full(n, np.nan) for name in FIT_TOLERANCES}
+
+        if self.catalog_df is None or n == 0:
+            return columns
+
+        for name in FIT_TOLERANCES:
+            if name in self.catalog_df.columns:
+                columns[name] = pd.to_numeric(self.catalog_df[name], errors='coerce').to_numpy(dtype=np.float64, copy=True)
+
+        if 'measurements' in self.catalog_df.columns:
+            for i, value in enumerate(self.catalog_df['measurements']):
+                if isinstance(value, str):
+                    try:
+                        value = json.loads(value)
+                    except ValueError:
+                        continue
+                if not isinstance(value, dict):
+                    continue
+                for name, column in columns.items():
+                    if np.isnan(column[i]) and name in value:
+                        try:
+                            column[i] = float(value[name])
+                        except (TypeError, ValueError):
+                            pass
+
+        # A zero garment measurement cannot be scored
+        for column in columns.values():
+            column[column <= 0] = np.nan
+
+        return columns
+
+    def fit_scores(self, body_measurements: Dict[str, float]) -> np.ndarray:
+        """
+        Score every dress against one set of body measurements in a single pass.
+
+        Args:
+            body_measurements: Body measurements with bust, waist and hips
+
+        Returns:
+            np.ndarray: Mean fit score per dress from 0 to 1, NaN if nothing could be scored
+        """
+        total = np.zeros(len(self.records))
+        count = np.zeros(len(self.records))
+
+        for name, (min_good, max_good) in FIT_TOLERANCES.items():
+            body_value = body_measurements.get(name, 0)
+            if not body_value or body_value <= 0:
+                continue
+            column = self.measurement_columns[name]
+            valid = ~np.isnan(column)
+            ratio = body_value / column[valid]
+            # Too tight or too loose loses 5 points per unit of ratio outside the good range
+            penalty = np.maximum(np.maximum(min_good - ratio, ratio - max_good), 0.0)
+            total[valid] += np.maximum(0.0, 1.0 - penalty * 5)
+            count[valid] += 1
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return total / count
+
+    def fit_score_matrix(self, bust: np.ndarray, waist: np.ndarray, hips: np.ndarray,
+                         block_size: int = 8192) -> np.ndarray:
+        """
+        Score many users against every dress at once.
+        The catalog is walked in blocks of dresses so the temporaries stay cache sized.
+
+        Args:
+            bust: (U,) body bust measurements, values <= 0 are ignored
+            waist: (U,) body waist measurements, values <= 0 are ignored
+            hips: (U,) body hips measurements, values <= 0 are ignored
+            block_size: Number of dresses scored per block
+
+        Returns:
+            np.ndarray: (U, D) mean fit scores, NaN where nothing could be scored
+        """
+        body = {}
+        body_valid = np.empty((len(bust), len(FIT_TOLERANCES)))
+        for i, (name, values) in enumerate((('bust', bust), ('waist', waist), ('hips', hips))):
+            values = np.asarray(values, dtype=np.float64)
+            body_valid[:, i] = values > 0
+            # Unusable body values become NaN so they drop out with the missing garment values
+            body[name] = np.where(values > 0, values, np.nan)[:, np.newaxis]
+
+        n_dresses = len(self.records)
+        total = np.zeros((len(bust), n_dresses))
+        ratio = np.empty((len(bust), min(block_size, n_dresses)))
+        score = np.empty_like(ratio)
+
+        for start in range(0, n_dresses, block_size):
+            stop = min(start + block_size, n_dresses)
+            r, s = ratio[:, :stop - start], score[:, :stop - start]
+            for name, (min_good, max_good) in FIT_TOLERANCES.items():
+                # Same arithmetic as fit_scores, applied in place
+                np.divide(body[name], self.measurement_columns[name][start:stop], out=r)
+                np.subtract(r, max_good, out=s)
+                np.subtract(min_good, r, out=r)
+                np.maximum(s, r, out=s)
+                np.maximum(s, 0.0, out=s)
+                s *= -5
+                s += 1
+                # fmax maps the NaN entries to 0 so they add nothing to the total
+                np.fmax(s, 0.0, out=s)
+                total[:, start:stop] += s
+
+        # Number of scored measurements per (user, dress) pair
+        column_valid = np.stack([~np.isnan(self.measurement_columns[name]) for name in FIT_TOLERANCES])
+        count = body_valid @ column_valid
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.divide(total, count, out=total)
+
+    def top_compatible_batch(self,
+                             measurements: List[Dict[str, float]],
+                             limit: Optional[int] = 5,
+                             min_score: float = 0.7,
+                             chunk_size: int = 32):
+        """
+        Rank the catalog for many users, scoring a users x dresses matrix chunk by chunk.
+
+        Args:
+            measurements: Body measurements per user
+            limit: Maximum number of dresses per user, None for all compatible dresses
+            min_score: Minimum fit score for a dress to be compatible
+            chunk_size: Number of users scored per matrix chunk
+
+        Yields:
+            List[Dict]: Ranked catalog rows with fit_score, one list per user in input order
+        """
+        for start in range(0, len(measurements), chunk_size):
+            chunk = measurements[start:start + chunk_size]
+            matrix = self.fit_score_matrix(
+                np.array([m.get('bust', 0) or 0 for m in chunk], dtype=np.float64),
+                np.array([m.get('waist', 0) or 0 for m in chunk], dtype=np.float64),
+                np.array([m.get('hips', 0) or 0 for m in chunk], dtype=np.float64)
+            )
+            for row in matrix:
+                indices = np.flatnonzero(row >= min_score)
+                yield self._rank(indices, row[indices], limit)
+
+    def style_mask(self, style_preferences: Optional[Dict]) -> np.ndarray:
+        """
+        Boolean mask of dresses matching all style preferences present in the catalog.
+
+        Args:
+            style_preferences: Mapping of catalog column to required value
+
+        Returns:
+            np.ndarray: Boolean mask per dress
+        """
+        mask = np.ones(len(self.records), dtype=bool)
+        if not style_preferences or self.catalog_df is None:
+            return mask
+        for key, value in style_preferences.items():
+            if key in self.catalog_df.columns:
+                mask &= (self.catalog_df[key] == value).to_numpy()
+        return mask
+
+    def top_compatible(self,
+                       body_measurements: Dict[str, float],
+                       limit: Optional[int] = None,
+                       min_score: float = 0.7,
+                       candidates: Optional[np.ndarray] = None) -> List[Dict]:
+        """
+        Get the best fitting dresses, highest fit score first.
+
+        Args:
+            body_measurements: Body measurements with bust, waist and hips
+            limit: Maximum number of dresses, None for all compatible dresses
+            min_score: Minimum fit score for a dress to be compatible
+            candidates: Optional boolean mask restricting the dresses considered
+
+        Returns:
+            List[Dict]: Catalog rows with an added fit_score
+        """
+        scores = self.fit_scores(body_measurements)
+        eligible = scores >= min_score
+        if candidates is not None:
+            eligible &= candidates
+
+        indices = np.flatnonzero(eligible)
+        return self._rank(indices, scores[indices], limit)
+
+    def _rank(self, indices: np.ndarray, scores: np.ndarray, limit: Optional[int]) -> List[Dict]:
+        """Select the top-k with a partition instead of a full sort; ties keep catalog order."""
+        if limit is not None and limit <= 0:
+            return []
+        if limit is not None and limit < len(indices):
+            kth = np.partition(-scores, limit - 1)[limit - 1]
+            above = np.flatnonzero(-scores < kth)
+            ties = np.flatnonzero(-scores == kth)[:limit - len(above)]
+            keep = np.concatenate([above, ties])
+            indices, scores = indices[keep], scores[keep]
+
+        order = np.lexsort((indices, -scores))
+        results = []
+        for i in order:
+            dress_info = dict(self.records[indices[i]])
+            dress_info['fit_score'] = float(scores[i])
+            results.append(dress_info)
+        return results
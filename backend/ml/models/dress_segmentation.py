@@ -0,0 +1,253 @@
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict, namedtuple
+import numpy as np
+import cv2
+
+logger = logging.getLogger(__name__)
+
+# How a mask was obtained, from cheapest to most expensive
+QUALITY_THRESHOLD = "threshold"                    # white-background threshold was enough
+QUALITY_GRABCUT = "grabcut"                        # all GrabCut iterations at full resolution
+QUALITY_GRABCUT_DOWNSCALED = "grabcut_downscaled"  # all iterations on a downscaled copy
+QUALITY_GRABCUT_PARTIAL = "grabcut_partial"        # time budget cut the iterations short
+QUALITY_THRESHOLD_FALLBACK = "threshold_fallback"  # GrabCut failed or no budget was left
+
+SegmentationResult = namedtuple('SegmentationResult', ['mask', 'quality', 'iterations', 'elapsed_ms', 'cached'])
+
+def guided_upsample(mask, guide, radius=2, eps=1e-3):
+    """
+    Upsample a low-resolution mask, snapping its edges to the full-resolution image.
+    Fast guided filter (He and Sun): the local linear model mask ~ a * gray + b is
+    fitted at the mask's resolution, and only the upsampled coefficients are applied
+    to the full-resolution gray image, so edges follow the dress outline in the photo
+    instead of the blocky steps of a plain resize.
+
+    Args:
+        mask: uint8 mask, 255 on the foreground
+        guide: Full-resolution RGB image
+        radius: Filter window radius in mask pixels
+        eps: Regularization, larger values follow the guide less closely
+
+    Returns:
+        np.ndarray: uint8 mask at the guide's resolution
+    """
+    height, width = guide.shape[:2]
+    I = cv2.cvtColor(guide, cv2.COLOR_RGB2GRAY).astype(np.float32) / 255
+    I_small = cv2.resize(I, (mask.shape[1], mask.shape[0]), interpolation=cv2.INTER_AREA)
+    p = mask.astype(np.float32) / 255
+
+    window = (2 * radius + 1, 2 * radius + 1)
+    mean_I = cv2.boxFilter(I_small, -1, window)
+    mean_p = cv2.boxFilter(p, -1, window)
+    cov_Ip = cv2.boxFilter(I_small * p, -1, window) - mean_I * mean_p
+    var_I = cv2.boxFilter(I_small * I_small, -1, window) - mean_I * mean_I
+
+    a = cov_Ip / (var_I + eps)
+    b = mean_p - a * mean_I
+    a = cv2.resize(cv2.boxFilter(a, -1, window), (width, height), interpolation=cv2.INTER_LINEAR)
+    b = cv2.resize(cv2.boxFilter(b, -1, window), (width, height), interpolation=cv2.INTER_LINEAR)
+    return np.where(a * I + b > 0.5, 255, 0).astype(np.uint8)
+
+class DressSegmenter:
+    """
+    Tiered dress segmentation.
+    A white-background threshold handles most catalog images. When it finds almost
+    no foreground, GrabCut runs on a downscaled copy, one iteration at a time until
+    the time budget is spent, and the mask is upsampled with a guided filter.
+    Masks that ran every iteration are cached by image key, and every result
+    records how it was obtained.
+    """
+
+    def __init__(self, background_threshold=240, min_coverage=0.01, max_side=320,
+                 iterations=5, time_budget_ms=400, max_cached=128):
+        """
+        Initialize the segmenter.
+
+        Args:
+            background_threshold: Gray level above which pixels count as background
+            min_coverage: Foreground fraction below which the threshold is not trusted
+            max_side: Longest side of the copy GrabCut runs on, None for full resolution
+            iterations: GrabCut iterations when the budget allows
+            time_budget_ms: Wall time allowed for GrabCut, None for no limit
+            max_cached: Maximum number of complete GrabCut masks kept
+        """
+        self.background_threshold = background_threshold
+        self.min_coverage = min_coverage
+        self.max_side = max_side
+        self.iterations = iterations
+        self.time_budget_ms = time_budget_ms
+        self.max_cached = max_cached
+        self._cache = OrderedDict()
+        self._counts = {}
+        # Seconds per pixel of the last initializing iteration, to predict the next one
+        self._init_cost = None
+        self._lock = threading.Lock()
+
+    def set_time_budget(self, time_budget_ms):
+        """
+        Change the GrabCut time budget.
+
+        Args:
+            time_budget_ms: Milliseconds, or None for no limit
+        """
+        self.time_budget_ms = time_budget_ms
+
+    def segment(self, img, cache_key=None, background_threshold=None):
+        """
+        Segment a dress image.
+
+        Args:
+            img: RGB image
+            cache_key: Optional key identifying the image, e.g. its file digest;
+                defaults to a hash of the downscaled pixels
+            background_threshold: Optional override of the segmenter's threshold
+
+        Returns:
+            SegmentationResult with a uint8 mask (255 on the dress) and its quality
+        """
+        start = time.perf_counter()
+        gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
+        threshold = background_threshold if background_threshold is not None else self.background_threshold
+        _, mask_threshold = cv2.threshold(gray, threshold, 255, cv2.THRESH_BINARY_INV)
+        if cv2.countNonZero(mask_threshold) >= img.shape[0] * img.shape[1] * self.min_coverage:
+            return self._finish(SegmentationResult(mask_threshold, QUALITY_THRESHOLD, 0, 0.0, False), start)
+
+        small = None
+        if cache_key is None:
+            small = self._downscale(img)
+            cache_key = hashlib.sha1(small.tobytes() + str(img.shape).encode('ascii')).hexdigest()
+        key = cache_key
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+        if cached is not None and cached.mask.shape == img.shape[:2]:
+            return self._finish(cached._replace(cached=True), start)
+
+        if small is None:
+            small = self._downscale(img)
+        try:
+            mask, iterations = self._grabcut(small, start)
+        except cv2.error as e:
+            logger.warning(f"GrabCut failed, falling back to threshold method: {str(e)}")
+            mask, iterations = None, 0
+
+        if mask is None:
+            result = SegmentationResult(mask_threshold, QUALITY_THRESHOLD_FALLBACK, 0, 0.0, False)
+        else:
+            if small is not img:
+                mask = guided_upsample(mask, img)
+            if iterations < self.iterations:
+                quality = QUALITY_GRABCUT_PARTIAL
+            else:
+                quality = QUALITY_GRABCUT if small is img else QUALITY_GRABCUT_DOWNSCALED
+            result = SegmentationResult(mask, quality, iterations, 0.0, False)
+
+        result = self._finish(result, start)
+        if result.quality in (QUALITY_THRESHOLD_FALLBACK, QUALITY_GRABCUT_PARTIAL):
+            # Not worth keeping: the next request may have the budget for all iterations
+            return result
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+        return result
+
+    def stats(self):
+        """Return the number of results per quality and cached masks."""
+        with self._lock:
+            return dict(self._counts, cached_masks=len(self._cache))
+
+    def _downscale(self, img):
+        """Copy of the image with its longest side at most max_side, or the image itself."""
+        longest = max(img.shape[:2])
+        if not self.max_side or longest <= self.max_side:
+            return img
+        scale = self.max_side / longest
+        size = (max(1, round(img.shape[1] * scale)), max(1, round(img.shape[0] * scale)))
+        return cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+
+    def _grabcut(self, img, start):
+        """
+        GrabCut initialized with the centre rectangle, run one iteration at a time.
+
+        Args:
+            img: RGB image to segment
+            start: perf_counter value the time budget counts from
+
+        Returns:
+            Tuple of (uint8 mask, iterations run), the mask None if no iteration fit the budget
+        """
+        mask = np.zeros(img.shape[:2], np.uint8)
+        bgd_model = np.zeros((1, 65), np.float64)
+        fgd_model = np.zeros((1, 65), np.float64)
+
+        # Assume the center portion is the foreground
+        rect = (img.shape[1] // 4, img.shape[0] // 4, img.shape[1] // 2, img.shape[0] // 2)
+
+        budget = self.time_budget_ms / 1000 if self.time_budget_ms is not None else None
+        iterations = 0
+        last_iteration = self._init_cost * mask.size if self._init_cost is not None else 0.0
+        while iterations < self.iterations:
+            elapsed = time.perf_counter() - start
+            # Stop when the next iteration, expected to cost as much as the last, would overrun
+            if budget is not None and elapsed + last_iteration > budget:
+                break
+            iteration_start = time.perf_counter()
+            mode = cv2.GC_INIT_WITH_RECT if iterations == 0 else cv2.GC_EVAL
+            cv2.grabCut(img, mask, rect, bgd_model, fgd_model, 1, mode)
+            last_iteration = time.perf_counter() - iteration_start
+            if iterations == 0:
+                self._init_cost = last_iteration / mask.size
+            iterations += 1
+
+        if iterations == 0:
+            return None, 0
+        return np.where((mask == cv2.GC_BGD) | (mask == cv2.GC_PR_BGD), 0, 255).astype(np.uint8), iterations
+
+    def _finish(self, result, start):
+        """Stamp the elapsed time on a result and count its quality."""
+        result = result._replace(elapsed_ms=(time.perf_counter() - start) * 1000)
+        with self._lock:
+            self._counts[result.quality] = self._counts.get(result.quality, 0) + 1
+        if result.quality not in (QUALITY_THRESHOLD, QUALITY_GRABCUT, QUALITY_GRABCUT_DOWNSCALED):
+            logger.info(f"Dress segmented with {result.quality} ({result.iterations} GrabCut iterations) "
+                        f"in {result.elapsed_ms:.0f} ms")
+        return result
+
+# Process-wide segmenter shared by every DressTransformer, so masks are cached across requests
+shared_dress_segmenter = DressSegmenter()
+
+
+if __name__ == "__main__":
+    # Worst case of the legacy path: a light dress on a near-white studio backdrop,
+    # where thresholding finds nothing and GrabCut runs at full resolution
+    rng = np.random.default_rng(0)
+    height, width = 2400, 1600
+    photo = np.clip(rng.normal(250, 2, (height, width, 3)), 0, 255).astype(np.uint8)
+    truth = np.zeros((height, width), np.uint8)
+    outline = np.array([[700, 500], [900, 500], [1150, 1900], [450, 1900]], np.int32)
+    cv2.fillPoly(truth, [outline], 255)
+    dress = np.clip(rng.normal(249, 2, (height, width, 3)), 0, 255).astype(np.uint8)
+    dress[..., 0] = np.clip(dress[..., 0].astype(np.int16) - 12, 0, 255).astype(np.uint8)
+    photo[truth > 0] = dress[truth > 0]
+
+    def iou(mask):
+        return np.logical_and(mask > 0, truth > 0).sum() / max(np.logical_or(mask > 0, truth > 0).sum(), 1)
+
+    start = time.perf_counter()
+    legacy = DressSegmenter(max_side=None, time_budget_ms=None).segment(photo)
+    legacy_ms = (time.perf_counter() - start) * 1000
+    print(f"full-resolution GrabCut: {legacy_ms:7.0f} ms, IoU {iou(legacy.mask):.3f} ({legacy.quality})")
+
+    segmenter = DressSegmenter()
+    for max_side, budget in ((320, None), (320, 400), (480, 150), (320, 20)):
+        segmenter.max_side = max_side
+        segmenter.set_time_budget(budget)
+        result = segmenter.segment(photo, cache_key=f"{max_side}-{budget}")
+        again = segmenter.segment(photo, cache_key=f"{max_side}-{budget}")
+        print(f"max_side {max_side}, budget {budget} ms: {result.elapsed_ms:5.0f} ms, IoU {iou(result.mask):.3f} "
+              f"({result.quality}, {result.iterations} iterations), cached {again.elapsed_ms:.1f} ms")
@@ -13,7 +13,14 @@ sys.path.append(str(Path(__file__).parent.parent))
 
 # Import the body model
 from models.body_model import BodyModel
-from data_preprocessing.dress_images import DressImageProcessor
+from models.dress_catalog import DressCatalog
+from models.dress_assets import DressAssetStore
+from models.dress_segmentation import shared_dress_segmenter, SegmentationResult
+from utils.asset_pack import shared_asset_pack
+from models.dress_warp import build_body_shape_remap
+from utils.warp_cache import shared_warp_cache
+from utils.compositing import alpha_composite
+from utils.result_cache import file_digest
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -71,29 +78,46 @@ class DressTransformer:
     
     def __init__(self, 
                 body_model: Optional[BodyModel] = None, 
-                dress_catalog_path: Optional[str] = None):
+                dress_catalog_path: Optional[str] = None,
+                warp_cache=None,
+                catalog: Optional[DressCatalog] = None,
+                assets: Optional[DressAssetStore] = None,
+                segmenter=None):
         """
         Initialize the dress transformer.
         
         Args:
             body_model: BodyModel instance to use for transformations
             dress_catalog_path: Path to the preprocessed dress catalog dataset
+            warp_cache: Optional WarpFieldCache, defaults to the process-wide cache
+            catalog: Optional shared DressCatalog, avoids re-reading the catalog
+            assets: Optional DressAssetStore with prebuilt dress bundles, defaults
+                to the shared asset pack when one is configured
+            segmenter: Optional DressSegmenter, defaults to the process-wide segmenter
         """
         self.body_model = body_model
+        self.warp_cache = warp_cache or shared_warp_cache
+        if assets is None and shared_asset_pack() is not None:
+            assets = DressAssetStore()
+        self.assets = assets
         
         # Default background removal settings
         self.background_threshold = 240 
         self.use_alpha_mask = True
+        self.segmenter = segmenter or shared_dress_segmenter
         
         # Transformation settings
         self.resize_method = cv2.INTER_AREA
         self.padding = 20  
         
         # Initialize dress catalog processor
+        self.catalog = None
         self.dress_catalog = None
         self.dress_images = {}  
         
-        if dress_catalog_path:
+        if catalog is not None:
+            self.use_catalog(catalog)
+        elif dress_catalog_path:
             self.load_dress_catalog(dress_catalog_path)
         else:
             # Try to locate the default dress catalog
@@ -115,26 +139,24 @@ class DressTransformer:
             catalog_path: Path to the dress catalog dataset
         """
         try:
-            self.dress_catalog = DressImageProcessor(catalog_path)
-            self.catalog_path = catalog_path
+            self.use_catalog(DressCatalog(catalog_path))
             logger.info(f"Successfully loaded dress catalog from {catalog_path}")
-            
-            # Load the catalog into a dataframe for direct access
-            try:
-                self.catalog_df = pd.read_csv(catalog_path)
-                # Create a lookup dictionary for fast access by ID
-                self.dress_lookup = {
-                    str(row['id']): row.to_dict() 
-                    for _, row in self.catalog_df.iterrows()
-                }
-            except Exception as e:
-                logger.warning(f"Could not create lookup table from catalog CSV: {str(e)}")
-                self.catalog_df = None
-                self.dress_lookup = {}
-                
         except Exception as e:
             logger.error(f"Failed to load dress catalog: {str(e)}")
     
+    def use_catalog(self, catalog: DressCatalog):
+        """
+        Attach an already loaded catalog service.
+        
+        Args:
+            catalog: Shared DressCatalog instance
+        """
+        self.catalog = catalog
+        self.dress_catalog = catalog.processor
+        self.catalog_path = catalog.catalog_path
+        self.catalog_df = catalog.catalog_df
+        self.dress_lookup = catalog.dress_lookup
+    
     def set_body_model(self, body_model: BodyModel):
         """
         Set or update the body model used for transformations.
@@ -175,69 +197,30 @@ class DressTransformer:
         
         raise ValueError(f"Dress with ID {dress_id} not found in catalog.")
     
-    def get_compatible_dresses(self, body_measurements: Dict[str, float]) -> List[Dict]:
+    def get_compatible_dresses(self, 
+                               body_measurements: Dict[str, float],
+                               limit: Optional[int] = None,
+                               style_preferences: Optional[Dict] = None) -> List[Dict]:
         """
         Get dresses from the catalog compatible with the given body measurements.
         
         Args:
             body_measurements: Body measurements
+            limit: Optional maximum number of dresses to return
+            style_preferences: Optional style filter applied before ranking
             
         Returns:
-            List[Dict]: List of compatible dresses
+            List[Dict]: List of compatible dresses, best fit first
         """
         if not self.dress_catalog:
             raise ValueError("Dress catalog not loaded. Call load_dress_catalog() first.")
         
-        # If the DressImageProcessor has this method, use it
-        if hasattr(self.dress_catalog, 'get_compatible_dresses'):
-            return self.dress_catalog.get_compatible_dresses(body_measurements)
-            
-        # Fallback implementation - simple size matching
-        if not hasattr(self, 'catalog_df') or self.catalog_df is None:
+        if self.catalog is None or self.catalog_df is None:
             return []
-            
-        compatible_dresses = []
-        
-        # Extract key measurements
-        bust = body_measurements.get('bust', 0)
-        waist = body_measurements.get('waist', 0)
-        hips = body_measurements.get('hips', 0)
-        
-        # Find compatible dresses based on measurements
-        for _, dress in self.catalog_df.iterrows():
-            # Skip if dress doesn't have measurements
-            if 'measurements' not in dress:
-                continue
-                
-            dress_measurements = dress['measurements']
-            
-            # Calculate fit scores
-            fit_scores = {}
-            if 'bust' in dress_measurements and bust > 0:
-                bust_ratio = bust / dress_measurements['bust']
-                fit_scores['bust'] = self._calculate_fit_score(bust_ratio, 0.9, 1.1)
-                
-            if 'waist' in dress_measurements and waist > 0:
-                waist_ratio = waist / dress_measurements['waist']
-                fit_scores['waist'] = self._calculate_fit_score(waist_ratio, 0.85, 1.15)
-                
-            if 'hips' in dress_measurements and hips > 0:
-                hips_ratio = hips / dress_measurements['hips']
-                fit_scores['hips'] = self._calculate_fit_score(hips_ratio, 0.9, 1.1)
-            
-            # Calculate overall fit score
-            if fit_scores:
-                overall_fit = sum(fit_scores.values()) / len(fit_scores)
-                
-                # If dress has decent fit, add to compatible list
-                if overall_fit >= 0.7:
-                    dress_info = dress.to_dict()
-                    dress_info['fit_score'] = overall_fit
-                    compatible_dresses.append(dress_info)
         
-        # Sort by fit score
-        compatible_dresses.sort(key=lambda d: d.get('fit_score', 0), reverse=True)
-        return compatible_dresses
+        # Score the whole catalog in one vectorized pass over the measurement columns
+        candidates = self.catalog.style_mask(style_preferences) if style_preferences else None
+        return self.catalog.top_compatible(body_measurements, limit=limit, candidates=candidates)
     
     def get_dress_recommendations(self, 
                                body_measurements: Dict[str, float], 
@@ -263,46 +246,32 @@ class DressTransformer:
                 body_measurements, style_preferences, limit
             )
             
-        # Fallback to get_compatible_dresses with filtering
-        compatible_dresses = self.get_compatible_dresses(body_measurements)
-        
-        # Apply style preferences filtering if provided
-        if style_preferences and compatible_dresses:
-            filtered_dresses = []
-            for dress in compatible_dresses:
-                # Check if dress matches style preferences
-                style_match = True
-                for key, value in style_preferences.items():
-                    if key in dress and dress[key] != value:
-                        style_match = False
-                        break
-                
-                if style_match:
-                    filtered_dresses.append(dress)
-            
-            # If we found dresses matching style, use them
-            if filtered_dresses:
-                recommendations = filtered_dresses
-            else:
-                # Fall back to compatible dresses if no style matches
-                recommendations = compatible_dresses
-        else:
-            recommendations = compatible_dresses
-            
-        # Limit results
-        return recommendations[:limit]
+        # Fallback to get_compatible_dresses, preferring dresses that match the style
+        if style_preferences:
+            recommendations = self.get_compatible_dresses(body_measurements, limit, style_preferences)
+            if recommendations:
+                return recommendations
+        
+        # Fall back to compatible dresses if no style matches
+        return self.get_compatible_dresses(body_measurements, limit)
     
-    def preprocess_dress_image(self, image_path: str) -> np.ndarray:
+    def resolve_dress_image(self, image_path: str) -> str:
         """
-        Load and preprocess the dress image.
+        Find a dress image on disk.
         
         Args:
-            image_path: Path to the dress image file
+            image_path: Path, file name or catalog id of the dress image
             
         Returns:
-            np.ndarray: Preprocessed RGBA image
+            str: Existing image path
         """
         # Check if file exists
+        if not os.path.exists(image_path) and self.catalog is not None:
+            # The ingestion manifest knows where each processed dress image lives
+            indexed_path = self.catalog.image_path(image_path)
+            if indexed_path and os.path.exists(indexed_path):
+                image_path = indexed_path
+        
         if not os.path.exists(image_path):
             # Try searching in common directories for the dress image
             image_filename = os.path.basename(image_path)
@@ -325,77 +294,91 @@ class DressTransformer:
             if not os.path.exists(image_path):
                 raise FileNotFoundError(f"Image not found: {image_path}")
         
+        return image_path
+    
+    def preprocess_dress_image(self, image_path: str) -> np.ndarray:
+        """
+        Load and preprocess the dress image.
+        
+        Args:
+            image_path: Path to the dress image file
+            
+        Returns:
+            np.ndarray: Preprocessed RGBA image
+        """
+        image_path = self.resolve_dress_image(image_path)
+        
+        # A prebuilt bundle is memory-mapped instead of decoded and segmented
+        bundle = self.assets.load(image_path) if self.assets is not None else None
+        if bundle is not None:
+            return bundle.rgba
+        return self._decode_dress_image(image_path)[0]
+    
+    def prepare_dress_image(self, img: np.ndarray,
+                            cache_key: Optional[str] = None) -> Tuple[np.ndarray, Optional[SegmentationResult]]:
+        """
+        Turn a decoded dress image into the RGBA the transformer works with.
+        
+        Args:
+            img: Image as cv2.imread returns it with IMREAD_UNCHANGED (BGR or BGRA), not modified
+            cache_key: Optional key of the image, lets known images reuse their GrabCut mask
+            
+        Returns:
+            Tuple of (RGBA image, SegmentationResult), the result None when the
+            image carried its own alpha
+        """
+        segmentation = None
+        
+        # Convert BGR to RGB
+        if img.shape[2] == 3:  # No alpha channel
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+            # Add alpha channel
+            alpha, segmentation = self._create_alpha_mask(img, cache_key=cache_key)
+            img = np.dstack((img, alpha))
+        elif img.shape[2] == 4:  # With alpha channel
+            img = cv2.cvtColor(img, cv2.COLOR_BGRA2RGBA)
+        
+        return img, segmentation
+    
+    def _decode_dress_image(self, image_path: str) -> Tuple[np.ndarray, Optional[SegmentationResult]]:
+        """Decode a resolved dress image and prepare it, without looking for a bundle."""
         try:
             # Load image with alpha channel if available
             img = cv2.imread(image_path, cv2.IMREAD_UNCHANGED)
-            
-            # Convert BGR to RGB
-            if img.shape[2] == 3:  # No alpha channel
-                img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-                # Add alpha channel
-                alpha = self._create_alpha_mask(img)
-                img = np.dstack((img, alpha))
-            elif img.shape[2] == 4:  # With alpha channel
-                img = cv2.cvtColor(img, cv2.COLOR_BGRA2RGBA)
+            img, segmentation = self.prepare_dress_image(img, cache_key=file_digest(image_path))
             
             logger.info(f"Loaded dress image: {image_path}, shape: {img.shape}")
-            return img
+            return img, segmentation
             
         except Exception as e:
             logger.error(f"Error loading image {image_path}: {str(e)}")
             raise
     
-    def _create_alpha_mask(self, img: np.ndarray) -> np.ndarray:
+    def _create_alpha_mask(self, img: np.ndarray,
+                           cache_key: Optional[str] = None) -> Tuple[np.ndarray, SegmentationResult]:
         """
         Create an alpha mask by removing background.
         
         Args:
             img: RGB image
+            cache_key: Optional key of the image, lets known images reuse their GrabCut mask
             
         Returns:
-            np.ndarray: Alpha channel mask
+            Tuple of (alpha channel mask, SegmentationResult the mask was cleaned up from)
         """
-        # Convert to grayscale for processing
-        gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
-        
-        # Method 1: Simple threshold for white/light backgrounds
-        _, mask_threshold = cv2.threshold(
-            gray, self.background_threshold, 255, cv2.THRESH_BINARY_INV
+        # Threshold for white/light backgrounds, downscaled GrabCut within the
+        # segmenter's time budget when that finds almost nothing
+        segmentation = self.segmenter.segment(
+            img, cache_key=cache_key, background_threshold=self.background_threshold
         )
-        
-        # Method 2: Use GrabCut for more complex backgrounds
-        if np.sum(mask_threshold) / 255 < img.shape[0] * img.shape[1] * 0.01:
-            # If threshold method gave almost empty mask, try GrabCut
-            mask = np.zeros(img.shape[:2], np.uint8)
-            bgd_model = np.zeros((1, 65), np.float64)
-            fgd_model = np.zeros((1, 65), np.float64)
-            
-            # Assume the center portion is the foreground
-            rect = (
-                img.shape[1] // 4, 
-                img.shape[0] // 4,
-                img.shape[1] // 2, 
-                img.shape[0] // 2
-            )
-            
-            try:
-                cv2.grabCut(
-                    img, mask, rect, bgd_model, fgd_model, 5, cv2.GC_INIT_WITH_RECT
-                )
-                mask = np.where((mask == 2) | (mask == 0), 0, 255).astype('uint8')
-            except:
-                # Fallback to threshold method if GrabCut fails
-                logger.warning("GrabCut failed, falling back to threshold method")
-                mask = mask_threshold
-        else:
-            mask = mask_threshold
+        mask = segmentation.mask
         
         # Apply morphological operations to clean up the mask
         kernel = np.ones((5, 5), np.uint8)
         mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
         mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
         
-        return mask
+        return mask, segmentation
     
     def determine_dress_type(self, dress_img: np.ndarray, dress_info: Optional[Dict] = None) -> str:
         """
@@ -573,36 +556,14 @@ class DressTransformer:
             # No warping needed for bottoms on apple-shaped bodies
             return warped_dress
         
-     
-        # Create a map of how much to shift each pixel
-        map_x = np.zeros((height, width), np.float32)
-        map_y = np.zeros((height, width), np.float32)
-        
-        center_x = width // 2
-        
-        for y in range(height):
-            for x in range(width):
-                # Calculate normalized horizontal distance from center
-                dist_from_center = (x - center_x) / (width / 2)
-                
-                # No vertical shift
-                map_y[y, x] = y
-                
-                # Calculate horizontal shift based on vertical position
-                if y < waist_y:
-                    # Top portion - minimal warping
-                    shift_factor = 1.0 + (waist_factor - 1.0) * (y / waist_y) * 0.5
-                elif dress_type == "top" or y < hip_y:
-                    # Waist portion - apply waist factor
-                    shift_factor = waist_factor
-                else:
-                    # Hip portion - apply hip factor
-                    hip_progress = (y - hip_y) / (height - hip_y)
-                    shift_factor = waist_factor + (hip_factor - waist_factor) * hip_progress
-                
-                # Calculate new x position
-                new_x = center_x + dist_from_center * (width / 2) * shift_factor
-                map_x[y, x] = new_x
+        # The remap grid depends only on shape, dress type and size, so it is cached
+        cache_key = self.warp_cache.make_key("body_shape", body_shape, dress_type, height, width)
+        map_x, map_y = self.warp_cache.get_or_build(
+            cache_key,
+            lambda: build_body_shape_remap(
+                height, width, waist_y, hip_y, waist_factor, hip_factor, dress_type
+            )
+        )
         
         # Apply the transformation
         warped_dress = cv2.remap(dress_img, map_x, map_y, cv2.INTER_LINEAR)
@@ -667,27 +628,7 @@ class DressTransformer:
         result = np.copy(body_canvas)
         
         # Alpha blend the dress onto the body
-        for y in range(warped_dress.shape[0]):
-            if y_offset + y >= canvas_size[1]:
-                break
-                
-            for x in range(warped_dress.shape[1]):
-                if (y_offset + y) < 0 or (x_offset + x) < 0 or (x_offset + x) >= canvas_size[0]:
-                    continue
-                    
-                # Only apply dress pixels with alpha > 0
-                if warped_dress[y, x, 3] > 0:
-                    alpha = warped_dress[y, x, 3] / 255.0
-                    
-                    # Alpha blend
-                    for c in range(3):  
-                        result[y_offset + y, x_offset + x, c] = int(
-                            alpha * warped_dress[y, x, c] + 
-                            (1 - alpha) * body_canvas[y_offset + y, x_offset + x, c]
-                        )
-                    
-                    # Set alpha channel
-                    result[y_offset + y, x_offset + x, 3] = 255
+        alpha_composite(result, warped_dress, x_offset, y_offset)
         
         logger.info(f"Applied {dress_type} dress to body model")
         return result
@@ -710,8 +651,15 @@ class DressTransformer:
         if self.body_model is None:
             raise ValueError("Body model not set. Call set_body_model() first.")
         
-        # Load and preprocess the dress image
-        dress_img = self.preprocess_dress_image(image_path)
+        # Load and preprocess the dress image; one lookup serves the pixels and the offline type
+        image_path = self.resolve_dress_image(image_path)
+        bundle = self.assets.load(image_path) if self.assets is not None else None
+        if bundle is not None:
+            dress_img = bundle.rgba
+            if dress_type is None and not (dress_info and 'type' in dress_info):
+                dress_type = bundle.dress_type
+        else:
+            dress_img = self._decode_dress_image(image_path)[0]
         
         # Apply to the body model
         result = self.apply_dress_to_body(dress_img, dress_type, dress_info)
@@ -756,6 +704,50 @@ class DressTransformer:
             return 1.0
 
 
+class DressRecommender:
+    """
+    Stateless dress recommender over a shared DressCatalog.
+    Holds no per-user state, so one instance serves every request and
+    only the BodyModel changes between calls.
+    """
+    
+    def __init__(self, catalog: DressCatalog):
+        """
+        Initialize the recommender.
+        
+        Args:
+            catalog: Shared DressCatalog instance
+        """
+        self.catalog = catalog
+    
+    def recommend(self, 
+                  body_model: BodyModel, 
+                  limit: int = 5,
+                  style_preferences: Optional[Dict] = None) -> List[Dict]:
+        """
+        Recommend dresses for a body model.
+        
+        Args:
+            body_model: BodyModel with the user's measurements
+            limit: Maximum number of recommendations
+            style_preferences: Style preferences (optional)
+            
+        Returns:
+            List[Dict]: List of recommended dresses
+        """
+        if self.catalog.catalog_df is None:
+            return []
+        
+        # Prefer dresses matching the style, falling back to all compatible dresses
+        if style_preferences:
+            recommendations = self.catalog.top_compatible(
+                body_model.measurements, limit=limit,
+                candidates=self.catalog.style_mask(style_preferences)
+            )
+            if recommendations:
+                return recommendations
+        return self.catalog.top_compatible(body_model.measurements, limit=limit)
+
 if __name__ == "__main__":
     # Ensure test files exist
     catalog_path, sample_dir = ensure_test_files_exist()
@@ -0,0 +1,111 @@
+import time
+import numpy as np
+
+def row_shift_factors(height, waist_y, hip_y, waist_factor, hip_factor, dress_type="full"):
+    """
+    Compute the horizontal scale factor applied to each row of the dress.
+
+    Args:
+        height: Dress image height
+        waist_y: Row where the waist section starts
+        hip_y: Row where the hip section starts
+        waist_factor: Horizontal scale applied at the waist
+        hip_factor: Horizontal scale reached at the hem
+        dress_type: Type of clothing ("full", "top", or "bottom")
+
+    Returns:
+        np.ndarray: float64 array of length height
+    """
+    rows = np.arange(height, dtype=np.float64)
+    factors = np.full(height, waist_factor, dtype=np.float64)
+
+    # Top portion - minimal warping, easing towards the waist factor
+    top = rows < waist_y
+    factors[top] = 1.0 + (waist_factor - 1.0) * (rows[top] / waist_y) * 0.5
+
+    # Hip portion - interpolate from the waist factor to the hip factor
+    if dress_type != "top":
+        hip = rows >= max(waist_y, hip_y)
+        factors[hip] = waist_factor + (hip_factor - waist_factor) * ((rows[hip] - hip_y) / (height - hip_y))
+
+    return factors
+
+def build_body_shape_remap(height, width, waist_y, hip_y, waist_factor, hip_factor, dress_type="full"):
+    """
+    Build the remap grid for DressTransformer.warp_dress_to_body_shape.
+    The shift factor depends only on the row, so the grid is one per-row factor
+    array broadcast over the per-column offsets from the centre.
+
+    Args:
+        height: Dress image height
+        width: Dress image width
+        waist_y: Row where the waist section starts
+        hip_y: Row where the hip section starts
+        waist_factor: Horizontal scale applied at the waist
+        hip_factor: Horizontal scale reached at the hem
+        dress_type: Type of clothing ("full", "top", or "bottom")
+
+    Returns:
+        Tuple of float32 (map_x, map_y) arrays with shape (height, width)
+    """
+    center_x = width // 2
+    half_width = width / 2
+
+    # Same operation order as the per-pixel formula so results are bit-identical
+    offsets = ((np.arange(width, dtype=np.float64) - center_x) / half_width) * half_width
+    factors = row_shift_factors(height, waist_y, hip_y, waist_factor, hip_factor, dress_type)
+
+    map_x = (center_x + offsets[np.newaxis, :] * factors[:, np.newaxis]).astype(np.float32)
+    map_y = np.repeat(np.arange(height, dtype=np.float32)[:, np.newaxis], width, axis=1)
+
+    return map_x, map_y
+
+def _build_body_shape_remap_loop(height, width, waist_y, hip_y, waist_factor, hip_factor, dress_type="full"):
+    """Per-pixel reference implementation used for regression checks and benchmarks."""
+    map_x = np.zeros((height, width), np.float32)
+    map_y = np.zeros((height, width), np.float32)
+    center_x = width // 2
+
+    for y in range(height):
+        for x in range(width):
+            dist_from_center = (x - center_x) / (width / 2)
+            map_y[y, x] = y
+            if y < waist_y:
+                shift_factor = 1.0 + (waist_factor - 1.0) * (y / waist_y) * 0.5
+            elif dress_type == "top" or y < hip_y:
+                shift_factor = waist_factor
+            else:
+                hip_progress = (y - hip_y) / (height - hip_y)
+                shift_factor = waist_factor + (hip_factor - waist_factor) * hip_progress
+            map_x[y, x] = center_x + dist_from_center * (width / 2) * shift_factor
+
+    return map_x, map_y
+
+
+if __name__ == "__main__":
+    # Regression check against the per-pixel loop and micro-benchmark over typical dress sizes
+    cases = [
+        ("full", 0.45, 0.7, 0.85, 1.05),
+        ("top", 0.7, 1.0, 1.15, 1.0),
+        ("bottom", 0.2, 0.5, 0.9, 1.15),
+    ]
+    sizes = [(250, 150), (414, 248), (600, 400), (800, 600)]
+
+    for height, width in sizes:
+        for dress_type, waist_ratio, hip_ratio, waist_factor, hip_factor in cases:
+            waist_y = int(height * waist_ratio)
+            hip_y = height if dress_type == "top" else int(height * hip_ratio)
+            args = (height, width, waist_y, hip_y, waist_factor, hip_factor, dress_type)
+
+            start = time.perf_counter()
+            ref_x, ref_y = _build_body_shape_remap_loop(*args)
+            loop_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            map_x, map_y = build_body_shape_remap(*args)
+            fast_time = time.perf_counter() - start
+
+            max_diff = max(np.abs(ref_x - map_x).max(), np.abs(ref_y - map_y).max())
+            print(f"{width}x{height} {dress_type:<6} loop {loop_time * 1000:8.1f} ms  "
+                  f"vectorized {fast_time * 1000:6.2f} ms  "
+                  f"speedup {loop_time / fast_time:7.0f}x  max diff {max_diff:.2e}")
@@ -0,0 +1,265 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+import cv2
+import numpy as np
+from pathlib import Path
+import sys
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+
+from utils.image_encoding import ImageEncoder
+
+logger = logging.getLogger(__name__)
+
+def silhouette_spec(body_shape, bust, waist, hips, height):
+    """
+    Compute the geometry of a body silhouette from measurements.
+
+    Args:
+        body_shape: Body shape (hourglass, apple, pear, rectangle)
+        bust: Bust measurement
+        waist: Waist measurement
+        hips: Hip measurement
+        height: Height
+
+    Returns:
+        Dict with the canvas size, head circle, shoulder line and body polygon
+    """
+    width = max(300, int(max(bust, hips) * 1.5))
+    canvas_height = max(600, int(height * 3.5))
+
+    head_y = int(canvas_height * 0.1)
+    head_radius = int(width * 0.1)
+
+    shoulder_y = head_y + head_radius * 2
+    shoulder_width = int(bust * 1.2)
+    bust_y = int(shoulder_y + canvas_height * 0.1)
+    waist_y = int(bust_y + canvas_height * 0.15)
+    hip_y = int(waist_y + canvas_height * 0.15)
+
+    # Scale dimensions based on body shape but maintain proportions
+    if body_shape == 'hourglass':
+        bust_width = int(bust * 1.1)
+        waist_width = int(waist * 0.9)  # Narrower waist for hourglass
+        hip_width = int(hips * 1.1)
+    elif body_shape == 'apple':
+        bust_width = int(bust * 1.1)
+        waist_width = int(waist * 1.2)  # Wider waist for apple
+        hip_width = int(hips * 1.0)
+    elif body_shape == 'pear':
+        bust_width = int(bust * 0.9)
+        waist_width = int(waist * 1.0)
+        hip_width = int(hips * 1.2)  # Wider hips for pear
+    else:  # rectangle
+        bust_width = int(bust * 1.0)
+        waist_width = int(waist * 1.0)
+        hip_width = int(hips * 1.0)
+
+    # Ensure all widths are within canvas bounds and at least 30% of width
+    min_width = int(width * 0.3)
+    bust_width = max(min_width, min(width - 20, bust_width))
+    waist_width = max(min_width, min(width - 20, waist_width))
+    hip_width = max(min_width, min(width - 20, hip_width))
+
+    center_x = width // 2
+    points = np.array([
+        [center_x - shoulder_width // 2, shoulder_y],
+        [center_x - bust_width // 2, bust_y],
+        [center_x - waist_width // 2, waist_y],
+        [center_x - hip_width // 2, hip_y],
+        [center_x - hip_width // 3, canvas_height - 50],
+        [center_x + hip_width // 3, canvas_height - 50],
+        [center_x + hip_width // 2, hip_y],
+        [center_x + waist_width // 2, waist_y],
+        [center_x + bust_width // 2, bust_y],
+        [center_x + shoulder_width // 2, shoulder_y]
+    ], np.int32)
+
+    return {
+        'width': width,
+        'height': canvas_height,
+        'head': ((center_x, head_y), head_radius),
+        'shoulders': ((center_x - shoulder_width // 2, shoulder_y),
+                      (center_x + shoulder_width // 2, shoulder_y)),
+        'points': points
+    }
+
+def render_silhouette(spec):
+    """
+    Draw a silhouette from its geometry on a white canvas.
+
+    Args:
+        spec: Geometry from silhouette_spec
+
+    Returns:
+        np.ndarray: BGR uint8 image
+    """
+    # Allocate the white canvas directly as uint8 instead of scaling a ones array
+    silhouette = np.full((spec['height'], spec['width'], 3), 255, dtype=np.uint8)
+
+    center, radius = spec['head']
+    cv2.circle(silhouette, center, radius, (200, 200, 200), -1)
+    cv2.line(silhouette, spec['shoulders'][0], spec['shoulders'][1], (150, 150, 150), 3)
+    cv2.fillPoly(silhouette, [spec['points']], (180, 180, 180))
+    cv2.polylines(silhouette, [spec['points']], True, (120, 120, 120), 2)
+
+    return silhouette
+
+class SilhouetteRenderer:
+    """
+    Memoized silhouette rendering.
+    Outputs are keyed by body shape and quantized measurements; encoded PNG bytes
+    are kept in an in-memory LRU and written once to a deduplicated file on disk.
+    """
+
+    def __init__(self, output_dir, max_entries=128, measurement_step=0.5, encoder=None):
+        """
+        Initialize the renderer.
+
+        Args:
+            output_dir: Directory for the silhouette PNG files
+            max_entries: Maximum number of encoded silhouettes kept in memory
+            measurement_step: Bucket width in cm used to quantize measurements
+            encoder: ImageEncoder producing the PNG bytes
+        """
+        self.output_dir = output_dir
+        self.max_entries = max_entries
+        self.measurement_step = measurement_step
+        self.encoder = encoder or ImageEncoder()
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        os.makedirs(output_dir, exist_ok=True)
+
+    def quantize(self, body_shape, measurements):
+        """
+        Snap measurements to the renderer buckets.
+
+        Args:
+            body_shape: Body shape name
+            measurements: Dict with bust, waist, hips and height
+
+        Returns:
+            Tuple of (body_shape, bust, waist, hips, height) used as the cache key
+        """
+        step = self.measurement_step
+        values = [
+            float(measurements.get('bust', 90)),
+            float(measurements.get('waist', 70)),
+            float(measurements.get('hips', 95)),
+            float(measurements.get('height', 170))
+        ]
+        return (body_shape,) + tuple(round(round(value / step) * step, 3) for value in values)
+
+    def path_for(self, key):
+        """Deduplicated file path for a quantized key."""
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.output_dir, f"silhouette_{key[0]}_{digest}.png")
+
+    def render(self, body_shape, measurements):
+        """
+        Get the silhouette for a body shape and measurements, rendering it on a miss.
+
+        Args:
+            body_shape: Body shape name
+            measurements: Dict with bust, waist, hips and height
+
+        Returns:
+            Tuple of (path, png_bytes)
+        """
+        key = self.quantize(body_shape, measurements)
+        path = self.path_for(key)
+
+        with self._lock:
+            png_bytes = self._entries.get(key)
+            if png_bytes is not None:
+                self._entries.move_to_end(key)
+
+        if png_bytes is None and os.path.exists(path):
+            # Rendered earlier or by another worker; reuse the stored file
+            with open(path, 'rb') as f:
+                png_bytes = f.read()
+
+        if png_bytes is not None:
+            if not os.path.exists(path):
+                self._write(path, png_bytes)
+            with self._lock:
+                self.hits += 1
+                self._store(key, png_bytes)
+            return path, png_bytes
+
+        silhouette = render_silhouette(silhouette_spec(*key))
+        png_bytes = self.encoder.encode(silhouette, 'png').data
+        self._write(path, png_bytes)
+        logger.info(f"Generated silhouette with dimensions: {silhouette.shape}")
+
+        with self._lock:
+            self.misses += 1
+            self._store(key, png_bytes)
+        return path, png_bytes
+
+    def render_image(self, body_shape, measurements):
+        """
+        Draw the silhouette for the quantized measurements without encoding or storing it.
+
+        Args:
+            body_shape: Body shape name
+            measurements: Dict with bust, waist, hips and height
+
+        Returns:
+            np.ndarray: BGR uint8 image
+        """
+        return render_silhouette(silhouette_spec(*self.quantize(body_shape, measurements)))
+
+    def stats(self):
+        """Return cache size and hit/miss counters."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+    def _store(self, key, png_bytes):
+        self._entries[key] = png_bytes
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _write(self, path, png_bytes):
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(png_bytes)
+        os.replace(tmp_path, path)
+
+
+if __name__ == "__main__":
+    # Compare cold renders against memoized lookups for a typical size chart
+    import tempfile
+
+    renderer = SilhouetteRenderer(tempfile.mkdtemp())
+    requests = [(shape, {'bust': 80 + i % 4 * 5, 'waist': 65 + i % 3 * 5, 'hips': 90 + i % 4 * 5, 'height': 165})
+                for i in range(240) for shape in ('hourglass', 'apple', 'pear', 'rectangle')]
+
+    start = time.perf_counter()
+    for shape, measurements in requests:
+        spec = silhouette_spec(shape, *renderer.quantize(shape, measurements)[1:])
+        renderer.encoder.encode(render_silhouette(spec), 'png')
+    uncached_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for shape, measurements in requests:
+        renderer.render(shape, measurements)
+    cached_time = time.perf_counter() - start
+
+    print(f"{len(requests)} requests: render every time {uncached_time * 1000:.1f} ms, "
+          f"memoized {cached_time * 1000:.1f} ms, files written {len(os.listdir(renderer.output_dir))}, "
+          f"stats {renderer.stats()}")
@@ -1,5 +1,7 @@
 import logging
-from flask import request, jsonify, send_file, send_from_directory
+import json
+from flask import request, jsonify, Response, stream_with_context
+from werkzeug.security import safe_join
 import os
 
 # Import controllers
@@ -10,14 +12,26 @@ from controllers import (
     upload_controller,
     try_on_controller,
     visualization_controller,
-    silhouette_controller
+    silhouette_controller,
+    encoded_response
 )
+from utils.registry import component_registry
+from utils.image_encoding import normalize_format
+from utils.http_cache import send_cached_file, cached_bytes_response
 
 logger = logging.getLogger(__name__)
 
 def register_routes(app):
     """Register all routes for the application"""
 
+    def get_classifier():
+        """Body shape model and scaler, loaded on first use"""
+        return component_registry.get('classifier') or (None, None)
+    
+    def get_catalog():
+        """Dress catalog service and recommender, loaded on first use"""
+        return component_registry.get('catalog') or (None, None)
+
     # Add CORS headers to all responses
     @app.after_request
     def add_cors_headers(response):
@@ -35,10 +49,7 @@ def register_routes(app):
     @app.route('/api/health', methods=['GET'])
     def health_check():
         """Health check endpoint"""
-        return health_controller.check_health(
-            app.config['MODEL'],
-            app.config['DRESS_CATALOG']
-        )
+        return health_controller.check_health(component_registry)
 
     @app.route('/api/body-shape', methods=['POST'])
     def classify_body_shape():
@@ -49,6 +60,10 @@ def register_routes(app):
         try:
             data = request.json
 
+            # A list of measurement sets is classified in one batch
+            if isinstance(data, list) or isinstance(data.get('measurements'), list):
+                return classify_body_shape_batch(data)
+
             if 'measurements' in data:
                 # Handle the case where measurements are nested
                 measurements_data = data['measurements']
@@ -71,16 +86,57 @@ def register_routes(app):
             if measurements["bust"] <= 0 or measurements["waist"] <= 0 or measurements["hips"] <= 0:
                 return jsonify({"error": "Invalid measurements provided"}), 400
             
+            model, scaler = get_classifier()
             return body_shape_controller.get_body_shape(
                 measurements, 
                 use_ml, 
-                app.config['MODEL'], 
-                app.config['SCALER']
+                model, 
+                scaler
             )        
         except Exception as e:
             logger.error(f"Error classifying body shape: {str(e)}")
             return jsonify({"error": f"Error processing request: {str(e)}"}), 500
         
+    def classify_body_shape_batch(data):
+        """Classify a list of measurement sets with one model call"""
+        if isinstance(data, list):
+            measurements_list, use_ml = data, True
+        else:
+            measurements_list, use_ml = data['measurements'], data.get('use_ml', True)
+        
+        results = [None] * len(measurements_list)
+        valid_indices = []
+        valid_measurements = []
+        for i, measurements_data in enumerate(measurements_list):
+            try:
+                measurements = {
+                    "bust": float(measurements_data.get('bust', 0)),
+                    "waist": float(measurements_data.get('waist', 0)),
+                    "hips": float(measurements_data.get('hips', 0)),
+                    "height": float(measurements_data.get('height', 0))
+                }
+            except (AttributeError, TypeError, ValueError):
+                measurements = None
+            
+            # Invalid rows get an error entry instead of failing the whole batch
+            if measurements is None or measurements["bust"] <= 0 or measurements["waist"] <= 0 or measurements["hips"] <= 0:
+                results[i] = {"error": "Invalid measurements provided"}
+                continue
+            valid_indices.append(i)
+            valid_measurements.append(measurements)
+        
+        model, scaler = get_classifier()
+        classified = body_shape_controller.get_body_shape_batch(
+            valid_measurements,
+            use_ml,
+            model,
+            scaler
+        )
+        for i, result in zip(valid_indices, classified):
+            results[i] = result
+        
+        return jsonify(results)
+        
     @app.route('/body-shape', methods=['POST', 'OPTIONS'])
     def body_shape_direct():
         """Direct endpoint for body shape classification"""
@@ -113,20 +169,68 @@ def register_routes(app):
             if measurements["bust"] <= 0 or measurements["waist"] <= 0 or measurements["hips"] <= 0:
                 return jsonify({"error": "Invalid measurements provided"}), 400
                 
+            model, scaler = get_classifier()
+            recommender = get_catalog()[1]
             return recommendation_controller.recommend_dresses(
                 measurements,
                 use_ml,
                 limit,
-                app.config['MODEL'],
-                app.config['SCALER'],
-                app.config['DRESS_CATALOG'],
-                app.config['CATALOG_PATH']
+                model,
+                scaler,
+                recommender
             )
             
         except Exception as e:
             logger.error(f"Error recommending dresses: {str(e)}")
             return jsonify({"error": f"Error processing request: {str(e)}"}), 500
 
+    @app.route('/api/recommend-dresses/batch', methods=['POST'])
+    def recommend_dresses_batch():
+        """Endpoint to recommend dresses for many users, streamed back as NDJSON"""
+        data = request.get_json(silent=True)
+        if data is None:
+            return jsonify({"error": "No JSON data provided"}), 400
+        
+        catalog = get_catalog()[0]
+        if catalog is None:
+            return jsonify({"error": "Dress catalog not available"}), 503
+        
+        try:
+            # Accept either a bare list or an object with a measurements list
+            if isinstance(data, list):
+                measurements_list, options = data, {}
+            else:
+                measurements_list, options = data.get('measurements', []), data
+            
+            if not isinstance(measurements_list, list):
+                return jsonify({"error": "measurements must be a list"}), 400
+            
+            use_ml = options.get('use_ml', True)
+            try:
+                limit = int(options.get('limit', 5))
+            except (TypeError, ValueError):
+                return jsonify({"error": "limit must be an integer"}), 400
+            
+            model, scaler = get_classifier()
+            results = recommendation_controller.recommend_dresses_batch(
+                measurements_list,
+                use_ml,
+                limit,
+                model,
+                scaler,
+                catalog
+            )
+            
+            def generate():
+                for result in results:
+                    yield json.dumps(result, default=str) + "\n"
+            
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+            
+        except Exception as e:
+            logger.error(f"Error recommending dresses in batch: {str(e)}")
+            return jsonify({"error": f"Error processing request: {str(e)}"}), 500
+
     @app.route('/api/generate-silhouette', methods=['POST'])
     def create_silhouette():
         """Generate a body silhouette from measurements"""
@@ -137,7 +241,9 @@ def register_routes(app):
             data = request.json
             return silhouette_controller.generate_silhouette(
                 data,
-                app.config['RESULTS_DIR']
+                app.config['RESULTS_DIR'],
+                component_registry.get('silhouette_renderer'),
+                component_registry.get('image_store')
             )
             
         except Exception as e:
@@ -158,9 +264,23 @@ def register_routes(app):
         return upload_controller.upload_dress_image(
             request,
             app.config['UPLOAD_FOLDER'],
-            app.config['ALLOWED_EXTENSIONS']
+            app.config['ALLOWED_EXTENSIONS'],
+            component_registry.get('dress_asset_jobs')
         )
     
+    @app.route('/api/dress-assets/<asset_id>', methods=['GET'])
+    def get_dress_asset(asset_id):
+        """
+        Readiness of an uploaded dress: processing, ready, failed or unprocessed.
+        Builds record their status under JOB_STATUS_DIR, so every worker sees them.
+        """
+        try:
+            return upload_controller.get_dress_asset(asset_id, component_registry.get('dress_asset_jobs'))
+        
+        except Exception as e:
+            logger.error(f"Error getting dress asset {asset_id}: {str(e)}")
+            return jsonify({"error": str(e)}), 500
+    
     @app.route('/upload-dress-image', methods=['POST', 'OPTIONS'])
     def upload_dress_image_direct():
         if request.method == 'OPTIONS':
@@ -182,7 +302,11 @@ def register_routes(app):
             return try_on_controller.virtual_try_on(
                 data,
                 None,  
-                app.config['RESULTS_DIR']
+                app.config['RESULTS_DIR'],
+                component_registry.get('try_on_results'),
+                component_registry.get('image_store'),
+                component_registry.get('dress_assets'),
+                component_registry.get('image_encoder')
             )
             
         except Exception as e:
@@ -191,6 +315,76 @@ def register_routes(app):
             logger.error(traceback.format_exc())
             return jsonify({"error": str(e)}), 500
         
+    @app.route('/api/virtual-try-on/jobs', methods=['POST'])
+    def submit_try_on_job():
+        """Queue a virtual try-on and return a job id to poll"""
+        if not request.is_json:
+            return jsonify({"error": "Request must be JSON"}), 400
+        
+        try:
+            return try_on_controller.submit_try_on(
+                request.json,
+                component_registry.get('try_on_jobs'),
+                app.config['RESULTS_DIR'],
+                app.config['DATA_DIR'],
+                component_registry.get('try_on_results'),
+                app.config['DRESS_ASSETS_DIR'],
+                component_registry.get('image_encoder'),
+                component_registry.get('dress_assets')
+            )
+            
+        except Exception as e:
+            logger.error(f"Error queueing virtual try-on: {str(e)}")
+            return jsonify({"error": str(e)}), 500
+    
+    @app.route('/api/virtual-try-on/jobs/<job_id>', methods=['GET'])
+    def get_try_on_job(job_id):
+        """
+        Status of a queued virtual try-on, including the result once done.
+        Status lives in files under JOB_STATUS_DIR, so any worker sharing the data
+        directory can answer, not only the one that queued the job.
+        """
+        try:
+            return try_on_controller.get_try_on_job(
+                job_id,
+                component_registry.get('try_on_jobs'),
+                component_registry.get('try_on_results')
+            )
+            
+        except Exception as e:
+            logger.error(f"Error getting try-on job {job_id}: {str(e)}")
+            return jsonify({"error": str(e)}), 500
+    
+    @app.route('/api/virtual-try-on/jobs/<job_id>/result', methods=['GET'])
+    def get_try_on_job_result(job_id):
+        """Result image of a finished virtual try-on job"""
+        job_queue = component_registry.get('try_on_jobs')
+        if job_queue is None:
+            return jsonify({"error": "Try-on jobs not available"}), 503
+        job = job_queue.status(job_id)
+        if job is None:
+            return jsonify({"error": f"Try-on job {job_id} not found"}), 404
+        if job["status"] == "failed":
+            return jsonify({"error": job["error"]}), 500
+        if job["status"] != "done":
+            return jsonify({"job_id": job_id, "status": job["status"]}), 202
+        
+        # Results live in the bounded result cache and may be evicted after the job finished
+        if not os.path.isfile(job["result"]):
+            return jsonify({"error": "Try-on result has expired. Please submit the try-on again."}), 410
+        try:
+            return send_cached_file(job["result"])
+        except FileNotFoundError:
+            return jsonify({"error": "Try-on result has expired. Please submit the try-on again."}), 410
+        
+    @app.route('/api/virtual-try-on/cache', methods=['GET'])
+    def try_on_cache_stats():
+        """Hit/miss counters and size of the try-on result cache"""
+        result_cache = component_registry.get('try_on_results')
+        if result_cache is None:
+            return jsonify({"error": "Result cache not available"}), 503
+        return jsonify(result_cache.stats())
+    
     @app.route('/virtual-try-on', methods=['POST', 'OPTIONS'])
     def virtual_try_on_direct():
         if request.method == 'OPTIONS':
@@ -207,13 +401,46 @@ def register_routes(app):
         try:
             return try_on_controller.adjust_dress_fit(
                 request.json,
-                app.config['TEMP_DIR']
+                app.config['TEMP_DIR'],
+                component_registry.get('image_store'),
+                component_registry.get('adjust_fit_engine'),
+                component_registry.get('image_encoder')
             )
             
         except Exception as e:
             logger.error(f"Error adjusting fit: {str(e)}")
             return jsonify({"error": f"Error processing request: {str(e)}"}), 500
 
+    @app.route('/api/image/<handle>', methods=['GET'])
+    def get_stored_image(handle):
+        """Serve an image from the in-memory store, encoded on first fetch (?format=png|webp|jpeg)"""
+        image_store = component_registry.get('image_store')
+        if image_store is None:
+            return jsonify({"error": "Image store not available"}), 503
+        
+        try:
+            encoded = image_store.encode(
+                handle,
+                request.args.get('session_id'),
+                fmt=normalize_format(request.args.get('format', 'png')),
+                quality=request.args.get('quality', type=int)
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if encoded is None:
+            return jsonify({"error": "Image not found or expired"}), 404
+        
+        # Handles never change content, so clients may keep them for the store's lifetime
+        return cached_bytes_response(encoded_response(encoded), image_store.ttl)
+    
+    @app.route('/api/encoding/stats', methods=['GET'])
+    def encoding_stats():
+        """Encode count, size and time per output format"""
+        encoder = component_registry.get('image_encoder')
+        if encoder is None:
+            return jsonify({"error": "Image encoder not available"}), 503
+        return jsonify(encoder.stats())
+    
     @app.route('/api/get-image/<path:image_path>', methods=['GET'])
     def get_image(image_path):
         """Serve stored images"""
@@ -229,14 +456,33 @@ def register_routes(app):
             if not os.path.exists(full_path):
                 return jsonify({"error": "Image not found"}), 404
                 
-            # Serve the image
-            return send_file(full_path)
+            # Serve the image with an ETag so unchanged images are answered with 304
+            return send_cached_file(full_path)
             
         except Exception as e:
             logger.error(f"Error serving image: {str(e)}")
             return jsonify({"error": str(e)}), 500
         
     
+    @app.route('/api/adjust-fit/preview', methods=['POST'])
+    def adjust_fit_preview():
+        """Endpoint returning a sprite of low-resolution fit previews for slider scrubbing"""
+        if not request.json:
+            return jsonify({"error": "No JSON data provided"}), 400
+            
+        try:
+            return try_on_controller.preview_fit_lattice(
+                request.json,
+                app.config['TEMP_DIR'],
+                component_registry.get('adjust_fit_engine'),
+                component_registry.get('image_store'),
+                component_registry.get('image_encoder')
+            )
+            
+        except Exception as e:
+            logger.error(f"Error rendering fit previews: {str(e)}")
+            return jsonify({"error": str(e)}), 500
+    
     @app.route('/adjust-fit', methods=['POST', 'OPTIONS'])
     def adjust_fit_direct():
         """Direct endpoint for adjusting fit"""
@@ -250,7 +496,9 @@ def register_routes(app):
     def serve_static_file(filename):
         """Serve static files from the results directory"""
         if filename.startswith('try_on_') or filename.startswith('silhouette_') or filename.startswith('adjusted_'):
-            return send_from_directory(app.config['TEMP_DIR'], filename)
+            full_path = safe_join(app.config['TEMP_DIR'], filename)
+            if full_path and os.path.isfile(full_path):
+                return send_cached_file(full_path)
         return jsonify({"error": "File not found"}), 404
     
     # New route to catch /get-image/* URLs
@@ -261,12 +509,14 @@ def register_routes(app):
         if image_path.startswith('results/'):
             filename = image_path.replace('results/', '')
             if filename.startswith('try_on_') or filename.startswith('silhouette_') or filename.startswith('adjusted_'):
-                return send_from_directory(app.config['RESULTS_DIR'], filename)
+                full_path = safe_join(app.config['RESULTS_DIR'], filename)
+                if full_path and os.path.isfile(full_path):
+                    return send_cached_file(full_path)
     
         # Build the full path for other cases
         full_path = os.path.join(app.config['DATA_DIR'], image_path)
-        if os.path.exists(full_path):
-            return send_file(full_path)
+        if os.path.isfile(full_path):
+            return send_cached_file(full_path)
     
         return jsonify({"error": "Image not found"}), 404
 
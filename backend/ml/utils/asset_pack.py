@@ -0,0 +1,238 @@
+import os
+import json
+import logging
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Array offsets are aligned so every view starts on a cache line
+ALIGNMENT = 64
+INDEX_SUFFIX = ".index.json"
+
+class AssetPackWriter:
+    """
+    Writes named arrays back to back into one pack file plus a JSON offset index.
+    The pack is built under temporary names and swapped in on close, so readers
+    mapping the previous pack are never exposed to a partial file.
+    """
+
+    def __init__(self, path):
+        """
+        Start a new pack.
+
+        Args:
+            path: Destination pack file; the index is written to path + INDEX_SUFFIX
+        """
+        self.path = path
+        self._tmp_path = f"{path}.{os.getpid()}.tmp"
+        self._file = open(self._tmp_path, 'wb')
+        self._index = {}
+        self._offset = 0
+
+    def add(self, name, array, **attrs):
+        """
+        Append an array.
+
+        Args:
+            name: Unique asset name, e.g. 'template/pear'
+            array: NumPy array, stored C-contiguous
+            **attrs: JSON-serializable metadata returned by AssetPack.attrs
+        """
+        if name in self._index:
+            raise ValueError(f"Duplicate asset name: {name}")
+        array = np.ascontiguousarray(array)
+
+        padding = -self._offset % ALIGNMENT
+        self._file.write(b'\0' * padding)
+        self._offset += padding
+
+        self._file.write(array.tobytes())
+        self._index[name] = {
+            "offset": self._offset,
+            "shape": list(array.shape),
+            "dtype": array.dtype.str,
+            "attrs": attrs
+        }
+        self._offset += array.nbytes
+
+    def close(self):
+        """Finish the pack and atomically replace any previous one."""
+        self._file.close()
+        index_tmp = f"{self._tmp_path}{INDEX_SUFFIX}"
+        with open(index_tmp, 'w') as f:
+            json.dump(self._index, f)
+        # Data first: a reader pairing the new index with the old data would see bad offsets
+        os.replace(self._tmp_path, self.path)
+        os.replace(index_tmp, f"{self.path}{INDEX_SUFFIX}")
+        logger.info(f"Wrote asset pack {self.path} with {len(self._index)} arrays ({self._offset} bytes)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+            os.remove(self._tmp_path)
+
+class AssetPack:
+    """
+    Read-only view of a pack file.
+    The file is memory-mapped once and every asset is a zero-copy NumPy view
+    into it, so worker processes share one copy of the pages through the OS
+    page cache instead of each holding decoded arrays.
+    """
+
+    def __init__(self, path):
+        """
+        Map a pack.
+
+        Args:
+            path: Pack file written by AssetPackWriter
+        """
+        self.path = path
+        with open(f"{path}{INDEX_SUFFIX}") as f:
+            self._index = json.load(f)
+        size = os.path.getsize(path)
+        self._data = np.memmap(path, dtype=np.uint8, mode='r') if size else np.zeros(0, np.uint8)
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def names(self, prefix=""):
+        """Asset names starting with a prefix."""
+        return [name for name in self._index if name.startswith(prefix)]
+
+    def get(self, name):
+        """
+        Read-only view of an asset.
+
+        Args:
+            name: Asset name
+
+        Returns:
+            np.ndarray: View into the mapped file, or None if the pack has no such asset
+        """
+        entry = self._index.get(name)
+        if entry is None:
+            return None
+        dtype = np.dtype(entry["dtype"])
+        count = int(np.prod(entry["shape"], dtype=np.int64))
+        view = self._data[entry["offset"]:entry["offset"] + count * dtype.itemsize]
+        return view.view(dtype).reshape(entry["shape"])
+
+    def attrs(self, name):
+        """Metadata stored with an asset, or None if the pack has no such asset."""
+        entry = self._index.get(name)
+        return entry["attrs"] if entry is not None else None
+
+# Process-wide pack, opened by the app factory or lazily from ASSET_PACK_PATH
+_shared_pack = None
+_shared_pack_lock = threading.Lock()
+
+def set_shared_asset_pack(path):
+    """
+    Open the pack shared by the fitting room, the dress transformer and the body model.
+    Call it before forking workers so they inherit the mapping.
+
+    Args:
+        path: Pack file, or None to disable
+
+    Returns:
+        AssetPack or None
+    """
+    global _shared_pack
+    with _shared_pack_lock:
+        _shared_pack = AssetPack(path) if path else None
+        if path:
+            # Workers started with spawn open the same file on first use
+            os.environ['ASSET_PACK_PATH'] = path
+        else:
+            os.environ.pop('ASSET_PACK_PATH', None)
+    return _shared_pack
+
+def shared_asset_pack():
+    """
+    The process-wide asset pack.
+
+    Returns:
+        AssetPack, or None if no pack is configured or it cannot be opened
+    """
+    global _shared_pack
+    if _shared_pack is None and os.environ.get('ASSET_PACK_PATH'):
+        with _shared_pack_lock:
+            if _shared_pack is None:
+                try:
+                    _shared_pack = AssetPack(os.environ['ASSET_PACK_PATH'])
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Could not open asset pack {os.environ['ASSET_PACK_PATH']}: {str(e)}")
+                    os.environ.pop('ASSET_PACK_PATH', None)
+    return _shared_pack
+
+
+if __name__ == "__main__":
+    # Memory of concurrent workers holding the same dress assets: decoded copies vs one shared pack.
+    # Pss splits shared pages between the processes mapping them, so the sum over workers is the real cost.
+    import sys
+    import time
+    import tempfile
+
+    def proportional_kb():
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                if line.startswith('Pss:'):
+                    return int(line.split()[1])
+        return 0
+
+    def run_workers(load_assets, workers):
+        pipes = []
+        for _ in range(workers):
+            read_fd, write_fd = os.pipe()
+            if os.fork() == 0:
+                os.close(read_fd)
+                before = proportional_kb()
+                held = load_assets()
+                checksum = int(sum(int(array.max()) for array in held))
+                # Stay alive until every worker holds its assets
+                time.sleep(1.0)
+                os.write(write_fd, json.dumps([proportional_kb() - before, checksum]).encode())
+                os._exit(0)
+            os.close(write_fd)
+            pipes.append(read_fd)
+        results = []
+        for read_fd in pipes:
+            with os.fdopen(read_fd) as f:
+                results.append(json.loads(f.read()))
+            os.wait()
+        return results
+
+    rng = np.random.default_rng(0)
+    assets = {f"dress/{i}/rgba": rng.integers(0, 255, (1200, 800, 4), dtype=np.uint8) for i in range(16)}
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'assets.pack')
+        copies = []
+        with AssetPackWriter(path) as writer:
+            for name, array in assets.items():
+                writer.add(name, array)
+                copies.append(os.path.join(tmp, name.replace('/', '_') + '.npy'))
+                np.save(copies[-1], array)
+        del assets
+
+        set_shared_asset_pack(path)
+        pack = shared_asset_pack()
+        readers = {
+            "decoded copies": lambda: [np.load(copy) for copy in copies],
+            "shared pack": lambda: [pack.get(name) for name in pack.names("dress/")]
+        }
+        for label, load_assets in readers.items():
+            results = run_workers(load_assets, workers)
+            assert len({checksum for _, checksum in results}) == 1
+            total = sum(kb for kb, _ in results) / 1024
+            print(f"{label:14s}: {workers} workers hold {total:6.1f} MB in total ({total / workers:5.1f} MB each)")
@@ -0,0 +1,154 @@
+import numpy as np
+
+def clip_overlay_region(canvas_shape, overlay_shape, x_offset, y_offset):
+    """
+    Clip an overlay placed at (x_offset, y_offset) to the canvas bounds.
+
+    Args:
+        canvas_shape: Shape of the canvas array
+        overlay_shape: Shape of the overlay array
+        x_offset: Left position of the overlay on the canvas
+        y_offset: Top position of the overlay on the canvas
+
+    Returns:
+        Tuple of (canvas_slices, overlay_slices), or None if they do not overlap
+    """
+    canvas_h, canvas_w = canvas_shape[:2]
+    overlay_h, overlay_w = overlay_shape[:2]
+
+    x0, y0 = max(x_offset, 0), max(y_offset, 0)
+    x1, y1 = min(x_offset + overlay_w, canvas_w), min(y_offset + overlay_h, canvas_h)
+
+    if x0 >= x1 or y0 >= y1:
+        return None
+
+    canvas_slices = (slice(y0, y1), slice(x0, x1))
+    overlay_slices = (slice(y0 - y_offset, y1 - y_offset), slice(x0 - x_offset, x1 - x_offset))
+    return canvas_slices, overlay_slices
+
+def alpha_composite(canvas, overlay, x_offset=0, y_offset=0, premultiplied=False, arithmetic="integer"):
+    """
+    Alpha blend an RGBA overlay onto a canvas in place.
+    The overlay rectangle is clipped to the canvas once and blended with NumPy;
+    pixels with zero alpha leave the canvas untouched.
+
+    Args:
+        canvas: uint8 canvas with 3 or 4 channels, modified in place
+        overlay: uint8 RGBA overlay in the same channel order as the canvas
+        x_offset: Left position of the overlay on the canvas
+        y_offset: Top position of the overlay on the canvas
+        premultiplied: Whether the overlay colours are already multiplied by alpha
+        arithmetic: "integer" for exact uint16 arithmetic or "float32"
+
+    Returns:
+        np.ndarray: The canvas, for chaining
+    """
+    if overlay.ndim != 3 or overlay.shape[2] < 4:
+        raise ValueError("Overlay must have an alpha channel")
+
+    region = clip_overlay_region(canvas.shape, overlay.shape, x_offset, y_offset)
+    if region is None:
+        return canvas
+
+    canvas_slices, overlay_slices = region
+    roi = canvas[canvas_slices]
+    src = overlay[overlay_slices]
+    alpha = src[:, :, 3:4]
+
+    if arithmetic == "integer":
+        a = alpha.astype(np.uint16)
+        inv_a = 255 - a
+        if premultiplied:
+            blended = src[:, :, :3] + (roi[:, :, :3] * inv_a) // 255
+            np.minimum(blended, 255, out=blended)
+        else:
+            blended = (src[:, :, :3] * a + roi[:, :, :3] * inv_a) // 255
+    elif arithmetic == "float32":
+        a = alpha.astype(np.float32) * (1.0 / 255.0)
+        if premultiplied:
+            blended = src[:, :, :3] + roi[:, :, :3] * (1.0 - a)
+        else:
+            blended = a * src[:, :, :3] + (1.0 - a) * roi[:, :, :3]
+        np.clip(blended, 0, 255, out=blended)
+    else:
+        raise ValueError(f"Unknown blend arithmetic: {arithmetic}")
+
+    # Zero-alpha pixels blend back to the canvas value, so no per-pixel mask is needed
+    roi[:, :, :3] = blended
+
+    # Covered pixels become fully opaque on RGBA canvases
+    if canvas.shape[2] > 3:
+        roi[:, :, 3][alpha[:, :, 0] > 0] = 255
+
+    return canvas
+
+# Selectable blend arithmetic for masked overlays, "float64" is the legacy path
+BLEND_MODES = ("fixed", "float32", "float64")
+
+def mask_bounding_box(mask):
+    """
+    Find the rows and columns that contain non-zero mask values.
+
+    Args:
+        mask: 2D mask array
+
+    Returns:
+        Tuple (y0, y1, x0, x1) of the tight bounding box, or None for an empty mask
+    """
+    rows = np.flatnonzero(mask.any(axis=1))
+    if rows.size == 0:
+        return None
+    cols = np.flatnonzero(mask.any(axis=0))
+    return rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+
+def blend_masked(base, overlay, mask, mode="fixed", out=None, chunk_rows=128):
+    """
+    Blend a 3-channel overlay onto a base image using a uint8 mask as alpha.
+    Only the bounding box of the non-zero mask is processed, in row chunks,
+    so temporaries stay small regardless of the frame size.
+
+    Args:
+        base: uint8 base image (H, W, 3)
+        overlay: uint8 overlay image with the same shape as base
+        mask: uint8 alpha mask (H, W), 255 means fully overlay
+        mode: "fixed" for uint16 fixed-point, "float32", or "float64" (legacy)
+        out: Optional preallocated uint8 output buffer, may be base itself
+        chunk_rows: Number of rows blended per step
+
+    Returns:
+        np.ndarray: The blended image (out)
+    """
+    if mode not in BLEND_MODES:
+        raise ValueError(f"Unknown blend mode: {mode}")
+
+    if out is None:
+        out = base.copy()
+    elif out is not base:
+        np.copyto(out, base)
+
+    box = mask_bounding_box(mask)
+    if box is None:
+        return out
+    y0, y1, x0, x1 = box
+
+    for start in range(y0, y1, chunk_rows):
+        stop = min(start + chunk_rows, y1)
+        a = mask[start:stop, x0:x1, np.newaxis]
+        src = overlay[start:stop, x0:x1]
+        dst = out[start:stop, x0:x1]
+
+        if mode == "fixed":
+            # a*src + (255-a)*dst <= 65025 fits in uint16; divide by 255 with rounding
+            a16 = a.astype(np.uint16)
+            acc = src * a16
+            acc += dst * (255 - a16)
+            acc += 128
+            acc += acc >> 8
+            acc >>= 8
+            dst[...] = acc
+        else:
+            dtype = np.float32 if mode == "float32" else np.float64
+            alpha = a.astype(dtype) / dtype(255.0)
+            dst[...] = (1.0 - alpha) * dst + alpha * src
+
+    return out
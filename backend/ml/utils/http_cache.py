@@ -0,0 +1,61 @@
+import os
+import re
+import hashlib
+from flask import request, send_file
+
+from utils.result_cache import file_digest
+
+# One year, the conventional max-age for immutable assets
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# Names that change whenever the content does: try-on cache keys and hashed silhouettes
+CONTENT_ADDRESSED_NAME = re.compile(r'^(?:[0-9a-f]{64}|silhouette_[a-z]+_[0-9a-f]{16})\.[a-z]+$')
+
+def is_content_addressed(path):
+    """Whether a file name is derived from its content, so the file never changes."""
+    return CONTENT_ADDRESSED_NAME.match(os.path.basename(path)) is not None
+
+def send_cached_file(path):
+    """
+    Send a file with a strong content-hash ETag, conditional and range support.
+    Content-addressed files are marked public and immutable for a year; other
+    results (try_on_<timestamp>, adjusted_<timestamp>) must be revalidated,
+    which costs a 304 instead of the full image when they have not changed.
+
+    Args:
+        path: Existing file to send
+
+    Returns:
+        flask.Response: 200, 206 or 304 response
+    """
+    immutable = is_content_addressed(path)
+    response = send_file(path, conditional=True, etag=file_digest(path),
+                         max_age=IMMUTABLE_MAX_AGE if immutable else 0)
+    if immutable:
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+def cached_bytes_response(response, max_age, private=True):
+    """
+    Add a strong content-hash ETag and an immutable policy to an in-memory image response.
+
+    Args:
+        response: Response whose body never changes for its URL
+        max_age: Seconds the client may reuse it
+        private: Keep shared caches from storing it
+
+    Returns:
+        flask.Response: The response, turned into a 304 or 206 if the request allows
+    """
+    data = response.get_data()
+    response.set_etag(hashlib.sha256(data).hexdigest())
+    response.cache_control.max_age = max_age
+    response.cache_control.immutable = True
+    if private:
+        response.cache_control.private = True
+    else:
+        response.cache_control.public = True
+    return response.make_conditional(request, accept_ranges=True, complete_length=len(data))
@@ -0,0 +1,159 @@
+import os
+import time
+import logging
+import threading
+from collections import namedtuple
+import cv2
+
+logger = logging.getLogger(__name__)
+
+# Supported output formats: file extension and response mimetype
+FORMATS = {
+    'png': ('.png', 'image/png'),
+    'webp': ('.webp', 'image/webp'),
+    'jpeg': ('.jpg', 'image/jpeg')
+}
+FORMAT_ALIASES = {'jpg': 'jpeg'}
+
+EncodedImage = namedtuple('EncodedImage', ['data', 'format', 'mimetype', 'encode_ms'])
+
+def normalize_format(fmt):
+    """
+    Canonical name of an output format.
+
+    Args:
+        fmt: Format name or file extension, e.g. 'PNG', '.jpg', 'webp'
+
+    Returns:
+        str: One of the FORMATS keys
+
+    Raises:
+        ValueError: If the format is not supported
+    """
+    name = str(fmt).lower().lstrip('.')
+    name = FORMAT_ALIASES.get(name, name)
+    if name not in FORMATS:
+        raise ValueError(f"Unsupported image format: {fmt}")
+    return name
+
+def encode_params(fmt, quality=None, png_level=None):
+    """
+    cv2.imencode parameters for a format.
+
+    Args:
+        fmt: Canonical format name
+        quality: WebP/JPEG quality 1-100, None for the OpenCV default
+        png_level: zlib level 0-9 for PNG, None for the OpenCV default
+
+    Returns:
+        list: Flag/value pairs for cv2.imencode
+    """
+    if fmt == 'png' and png_level is not None:
+        return [cv2.IMWRITE_PNG_COMPRESSION, int(png_level)]
+    if fmt == 'webp' and quality is not None:
+        return [cv2.IMWRITE_WEBP_QUALITY, int(quality)]
+    if fmt == 'jpeg' and quality is not None:
+        return [cv2.IMWRITE_JPEG_QUALITY, int(quality)]
+    return []
+
+class ImageEncoder:
+    """
+    In-memory encoder for result images.
+    Lossy WebP/JPEG for previews, PNG with a tunable zlib level for downloads;
+    encode time and output size are tracked per format.
+    """
+
+    def __init__(self, png_level=None, webp_quality=80, jpeg_quality=85):
+        """
+        Initialize the encoder.
+
+        Args:
+            png_level: Default zlib level for PNG, None keeps the OpenCV default
+            webp_quality: Default WebP quality
+            jpeg_quality: Default JPEG quality
+        """
+        self.png_level = png_level
+        self.quality = {'webp': webp_quality, 'jpeg': jpeg_quality}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def encode(self, image, fmt='png', quality=None, png_level=None):
+        """
+        Encode an image in memory.
+
+        Args:
+            image: uint8 image array
+            fmt: Output format name or extension
+            quality: WebP/JPEG quality, defaults to the encoder setting
+            png_level: PNG zlib level, defaults to the encoder setting
+
+        Returns:
+            EncodedImage with the bytes, format, mimetype and encode time in ms
+        """
+        fmt = normalize_format(fmt)
+        extension, mimetype = FORMATS[fmt]
+        quality = quality if quality is not None else self.quality.get(fmt)
+        png_level = png_level if png_level is not None else self.png_level
+
+        start = time.perf_counter()
+        success, encoded = cv2.imencode(extension, image, encode_params(fmt, quality, png_level))
+        if not success:
+            raise ValueError(f"Could not encode image as {fmt}")
+        data = encoded.tobytes()
+        encode_ms = (time.perf_counter() - start) * 1000
+
+        with self._lock:
+            stats = self._stats.setdefault(fmt, {"count": 0, "bytes": 0, "encode_ms": 0.0})
+            stats["count"] += 1
+            stats["bytes"] += len(data)
+            stats["encode_ms"] += encode_ms
+        logger.debug(f"Encoded {image.shape} as {fmt}: {len(data)} bytes in {encode_ms:.1f} ms")
+        return EncodedImage(data, fmt, mimetype, encode_ms)
+
+    def write(self, path, image, quality=None, png_level=None):
+        """
+        Encode an image in the format given by the path's extension and write it atomically.
+
+        Args:
+            path: Destination file
+            image: uint8 image array
+            quality: WebP/JPEG quality, defaults to the encoder setting
+            png_level: PNG zlib level, defaults to the encoder setting
+
+        Returns:
+            EncodedImage that was written
+        """
+        encoded = self.encode(image, os.path.splitext(path)[1], quality, png_level)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(encoded.data)
+        os.replace(tmp_path, path)
+        return encoded
+
+    def stats(self):
+        """Return encode count, total and mean size and time per format."""
+        with self._lock:
+            return {
+                fmt: dict(stats,
+                          mean_bytes=stats["bytes"] / stats["count"],
+                          mean_encode_ms=stats["encode_ms"] / stats["count"])
+                for fmt, stats in self._stats.items()
+            }
+
+
+if __name__ == "__main__":
+    # Size and encode time of a try-on sized image per format and setting
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    image = np.full((1200, 800, 3), 255, dtype=np.uint8)
+    image[300:1100, 200:600] = cv2.GaussianBlur(
+        rng.integers(0, 255, (800, 400, 3), dtype=np.uint8), (15, 15), 0)
+
+    encoder = ImageEncoder()
+    settings = [('png', {'png_level': level}) for level in (1, 3, 6, 9)]
+    settings += [('webp', {'quality': q}) for q in (60, 80)] + [('jpeg', {'quality': q}) for q in (75, 90)]
+    for fmt, options in settings:
+        times = [encoder.encode(image, fmt, **options).encode_ms for _ in range(5)]
+        size = len(encoder.encode(image, fmt, **options).data)
+        print(f"{fmt:5s} {options}: {size / 1024:7.1f} KiB, {np.median(times):6.1f} ms")
@@ -0,0 +1,125 @@
+import os
+import logging
+from collections import namedtuple
+import cv2
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Formats libjpeg can decode at 1/2, 1/4 and 1/8 scale without decoding the full image
+REDUCIBLE_FORMATS = ('JPEG', 'MPO')
+REDUCED_FLAGS = {
+    'color': ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2)),
+    'grayscale': ((8, cv2.IMREAD_REDUCED_GRAYSCALE_8), (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+                  (2, cv2.IMREAD_REDUCED_GRAYSCALE_2))
+}
+
+# EXIF orientations that swap width and height once applied
+_TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+ImageHeader = namedtuple('ImageHeader', ['width', 'height', 'format', 'mode', 'orientation'])
+
+def image_header(path):
+    """
+    Dimensions and format of an image, read from its header without decoding pixels.
+
+    Args:
+        path: Image file
+
+    Returns:
+        ImageHeader, or None if the file is not an image PIL recognizes
+    """
+    try:
+        with Image.open(path) as img:
+            orientation = img.getexif().get(0x0112, 1) if img.format in REDUCIBLE_FORMATS else 1
+            return ImageHeader(img.width, img.height, img.format, img.mode, orientation)
+    except (OSError, SyntaxError, ValueError) as e:
+        logger.debug(f"Could not read image header of {path}: {str(e)}")
+        return None
+
+def reduction_factor(height, min_height):
+    """
+    Largest JPEG reduction that still leaves at least min_height rows.
+
+    Args:
+        height: Full image height
+        min_height: Rows the caller needs
+
+    Returns:
+        int: 8, 4, 2 or 1
+    """
+    for factor, _ in REDUCED_FLAGS['color']:
+        if height // factor >= min_height:
+            return factor
+    return 1
+
+def read_image(path, flags=cv2.IMREAD_COLOR, min_height=None):
+    """
+    cv2.imread that decodes large JPEGs at reduced resolution.
+    When the image is at least twice as tall as the caller needs, libjpeg decodes
+    it at 1/2, 1/4 or 1/8 scale directly, which costs a fraction of the memory and
+    time of a full decode followed by a resize. Other formats and small images
+    are read as cv2.imread would.
+
+    Args:
+        path: Image file
+        flags: cv2.IMREAD_COLOR, cv2.IMREAD_GRAYSCALE or cv2.IMREAD_UNCHANGED
+        min_height: Height of the largest render target, None for a full decode
+
+    Returns:
+        np.ndarray, or None if the image cannot be read
+    """
+    header = image_header(path) if min_height else None
+    if header is None or header.format not in REDUCIBLE_FORMATS:
+        return cv2.imread(path, flags)
+
+    # cv2 applies EXIF orientation except with IMREAD_UNCHANGED, and so do the reduced flags
+    applies_orientation = flags != cv2.IMREAD_UNCHANGED
+    height = header.height
+    if applies_orientation and header.orientation in _TRANSPOSED_ORIENTATIONS:
+        height = header.width
+
+    factor = reduction_factor(height, min_height)
+    if factor == 1:
+        return cv2.imread(path, flags)
+
+    grayscale = flags == cv2.IMREAD_GRAYSCALE or (flags == cv2.IMREAD_UNCHANGED and header.mode == 'L')
+    reduced = dict(REDUCED_FLAGS['grayscale' if grayscale else 'color'])[factor]
+    if not applies_orientation:
+        reduced |= cv2.IMREAD_IGNORE_ORIENTATION
+    return cv2.imread(path, reduced)
+
+
+if __name__ == "__main__":
+    # Decode cost of a phone-sized JPEG for an 800 px high render target
+    import time
+    import tempfile
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    photo = cv2.GaussianBlur(rng.integers(0, 255, (4032, 3024, 3), dtype=np.uint8), (9, 9), 0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'photo.jpg')
+        cv2.imwrite(path, photo, [cv2.IMWRITE_JPEG_QUALITY, 90])
+        print(f"{os.path.getsize(path) / 1e6:.1f} MB JPEG, header {image_header(path)}")
+
+        for label, read in (("full decode + resize", lambda: cv2.resize(cv2.imread(path), (600, 800), interpolation=cv2.INTER_AREA)),
+                            ("reduced decode + resize", lambda: cv2.resize(read_image(path, min_height=800), (600, 800), interpolation=cv2.INTER_AREA))):
+            times = []
+            for _ in range(5):
+                start = time.perf_counter()
+                result = read()
+                times.append((time.perf_counter() - start) * 1000)
+            print(f"{label:24s}: {np.median(times):6.1f} ms")
+
+        full, reduced = cv2.imread(path), read_image(path, min_height=800)
+        print(f"decoded arrays: full {full.shape} {full.nbytes / 1e6:.1f} MB, reduced {reduced.shape} {reduced.nbytes / 1e6:.1f} MB")
+        diff = np.abs(cv2.resize(full, (600, 800), interpolation=cv2.INTER_AREA).astype(np.int16) -
+                      cv2.resize(reduced, (600, 800), interpolation=cv2.INTER_AREA).astype(np.int16))
+        print(f"800 px result, mean abs difference {diff.mean():.2f}, max {diff.max()}")
+
+        start = time.perf_counter()
+        for _ in range(100):
+            image_header(path)
+        print(f"header only: {(time.perf_counter() - start) * 10:.2f} ms")
@@ -0,0 +1,180 @@
+import time
+import secrets
+from urllib.parse import quote
+import logging
+import threading
+from collections import OrderedDict
+from utils.image_encoding import ImageEncoder
+
+logger = logging.getLogger(__name__)
+
+# URL prefix under which stored images are served
+IMAGE_URL_PREFIX = "/api/image/"
+
+def image_url(handle, session_id=None):
+    """URL serving a stored image, carrying the owning session if it has one."""
+    if session_id is None:
+        return f"{IMAGE_URL_PREFIX}{handle}"
+    return f"{IMAGE_URL_PREFIX}{handle}?session_id={quote(str(session_id), safe='')}"
+
+def image_handle(reference):
+    """
+    Extract the handle from an image store URL.
+
+    Args:
+        reference: Path or URL sent back by a client, possibly absolute
+
+    Returns:
+        str: The handle, or None if the reference is not an image store URL
+    """
+    if not isinstance(reference, str) or IMAGE_URL_PREFIX not in reference:
+        return None
+    return reference.split(IMAGE_URL_PREFIX, 1)[1].split('?', 1)[0] or None
+
+class ImageStore:
+    """
+    Bounded in-process store of decoded uint8 images keyed by opaque handles.
+    Lets the silhouette, try-on and adjust-fit endpoints pass images to each other
+    without a PNG encode, a disk write and a decode at every step; images are only
+    encoded when a client fetches them, and the latest bytes per format are kept with
+    the entry and counted against the size budget.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, ttl=1800, encoder=None):
+        """
+        Initialize the store.
+
+        Args:
+            max_bytes: Maximum total size of the stored arrays and their encoded bytes
+            ttl: Seconds an image stays available after its last use
+            encoder: ImageEncoder used when images are fetched
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.encoder = encoder or ImageEncoder()
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def put(self, image, session_id=None):
+        """
+        Store an image.
+
+        Args:
+            image: uint8 image array, treated as read-only from now on
+            session_id: Optional session owning the image
+
+        Returns:
+            str: Opaque handle
+        """
+        image.flags.writeable = False
+        handle = secrets.token_urlsafe(16)
+
+        with self._lock:
+            self._entries[handle] = {
+                "image": image,
+                "session_id": session_id,
+                "encoded": {},
+                "last_used": time.time()
+            }
+            self._total_bytes += image.nbytes
+            self._evict()
+        return handle
+
+    def get(self, handle, session_id=None):
+        """
+        Get a stored image.
+
+        Args:
+            handle: Handle returned by put
+            session_id: Session asking for the image; must match the owner if it has one
+
+        Returns:
+            np.ndarray: Read-only image, or None if unknown, expired or owned by another session
+        """
+        with self._lock:
+            entry = self._lookup(handle, session_id)
+            return entry["image"] if entry is not None else None
+
+    def encode(self, handle, session_id=None, fmt='png', quality=None):
+        """
+        Encode a stored image on first fetch in a format, reusing the bytes afterwards.
+        Only one encoding is kept per format; asking for another quality replaces it.
+
+        Args:
+            handle: Handle returned by put
+            session_id: Session asking for the image; must match the owner if it has one
+            fmt: Output format (png, webp or jpeg)
+            quality: WebP/JPEG quality, defaults to the encoder setting
+
+        Returns:
+            EncodedImage, or None if the handle is not available
+        """
+        with self._lock:
+            entry = self._lookup(handle, session_id)
+            if entry is None:
+                return None
+            cached = entry["encoded"].get(fmt)
+            if cached is not None and cached[0] == quality:
+                return cached[1]
+            image = entry["image"]
+
+        encoded = self.encoder.encode(image, fmt, quality)
+
+        with self._lock:
+            entry = self._entries.get(handle)
+            if entry is not None:
+                previous = entry["encoded"].get(fmt)
+                if previous is not None:
+                    self._total_bytes -= len(previous[1].data)
+                entry["encoded"][fmt] = (quality, encoded)
+                self._total_bytes += len(encoded.data)
+                self._evict()
+        return encoded
+
+    def discard_session(self, session_id):
+        """Drop every image owned by a session."""
+        with self._lock:
+            for handle in [h for h, e in self._entries.items() if e["session_id"] == session_id]:
+                self._remove(handle)
+
+    def stats(self):
+        """Return entry count, size and hit/miss counters."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+    def _lookup(self, handle, session_id):
+        entry = self._entries.get(handle)
+        if entry is not None and time.time() - entry["last_used"] > self.ttl:
+            self._remove(handle)
+            entry = None
+        if entry is None or (entry["session_id"] is not None and entry["session_id"] != session_id):
+            self.misses += 1
+            return None
+
+        entry["last_used"] = time.time()
+        self._entries.move_to_end(handle)
+        self.hits += 1
+        return entry
+
+    def _remove(self, handle):
+        entry = self._entries.pop(handle)
+        self._total_bytes -= entry["image"].nbytes
+        self._total_bytes -= sum(len(encoded.data) for _, encoded in entry["encoded"].values())
+
+    def _evict(self):
+        now = time.time()
+        # The newest image is always kept, even when it alone exceeds the budget
+        while len(self._entries) > 1:
+            handle, entry = next(iter(self._entries.items()))
+            if self._total_bytes <= self.max_bytes and now - entry["last_used"] <= self.ttl:
+                break
+            self._remove(handle)
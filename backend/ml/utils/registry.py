@@ -0,0 +1,167 @@
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+class ComponentRegistry:
+    """
+    Lazily constructed, process-wide components.
+    Factories import their heavy modules (OpenCV cascades, matplotlib, sklearn,
+    pickled models, the dress catalog) on first use instead of at import time,
+    and can optionally be warmed up in a background thread. A factory that raises
+    is not cached: get returns None and retries it once retry_after has passed,
+    so a transient error during warm-up does not disable the component for good.
+    """
+
+    def __init__(self, retry_after=30):
+        """
+        Initialize the registry.
+
+        Args:
+            retry_after: Seconds before a failed factory is tried again
+        """
+        self.retry_after = retry_after
+        self._factories = {}
+        self._instances = {}
+        self._errors = {}
+        self._failed_at = {}
+        self._load_times = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._warm_up_thread = None
+
+    def register(self, name, factory):
+        """
+        Register a component factory, replacing any previous one.
+
+        Args:
+            name: Component name
+            factory: Callable with no arguments returning the component
+        """
+        with self._lock:
+            self._factories[name] = factory
+            self._locks[name] = threading.Lock()
+            self._instances.pop(name, None)
+            self._errors.pop(name, None)
+            self._failed_at.pop(name, None)
+            self._load_times.pop(name, None)
+
+    def get(self, name):
+        """
+        Return a component, constructing it on first use.
+
+        Args:
+            name: Component name
+
+        Returns:
+            The component, or None if its factory failed; the factory is retried
+            on a later call once retry_after has passed
+        """
+        if name in self._instances:
+            return self._instances[name]
+
+        with self._lock:
+            if name not in self._factories:
+                raise KeyError(f"Unknown component: {name}")
+            lock = self._locks[name]
+
+        # Per-component lock so concurrent first requests build it only once
+        with lock:
+            if name in self._instances:
+                return self._instances[name]
+            failed_at = self._failed_at.get(name)
+            if failed_at is not None and time.monotonic() - failed_at < self.retry_after:
+                return None
+
+            start = time.perf_counter()
+            try:
+                instance = self._factories[name]()
+            except Exception as e:
+                logger.error(f"Error initializing component {name}: {str(e)}")
+                self._errors[name] = str(e)
+                self._failed_at[name] = time.monotonic()
+                return None
+
+            self._errors.pop(name, None)
+            self._failed_at.pop(name, None)
+            self._load_times[name] = time.perf_counter() - start
+            self._instances[name] = instance
+            logger.info(f"Initialized component {name} in {self._load_times[name]:.2f}s")
+            return instance
+
+    def is_loaded(self, name):
+        """Whether a component has been constructed successfully."""
+        return name in self._instances
+
+    def warm_up(self, names=None, background=True):
+        """
+        Construct components ahead of the first request.
+
+        Args:
+            names: Components to construct, defaults to all registered ones
+            background: Run in a daemon thread instead of blocking
+
+        Returns:
+            threading.Thread or None
+        """
+        names = list(names or self._factories)
+
+        def load_all():
+            for name in names:
+                self.get(name)
+            logger.info(f"Warm-up finished for {len(names)} components")
+
+        if not background:
+            load_all()
+            return None
+
+        self._warm_up_thread = threading.Thread(target=load_all, name="component-warm-up", daemon=True)
+        self._warm_up_thread.start()
+        return self._warm_up_thread
+
+    def status(self):
+        """Return load state, time and error per registered component."""
+        with self._lock:
+            names = list(self._factories)
+        return {
+            name: {
+                "loaded": self._instances.get(name) is not None,
+                "load_time": self._load_times.get(name),
+                "error": self._errors.get(name)
+            }
+            for name in names
+        }
+
+    @property
+    def warming_up(self):
+        """Whether a background warm-up is still running."""
+        return self._warm_up_thread is not None and self._warm_up_thread.is_alive()
+
+# Process-wide registry shared by the app factory and the controllers
+component_registry = ComponentRegistry()
+
+
+if __name__ == "__main__":
+    # Cold-start budget check: import the app in a fresh interpreter and answer one
+    # health check without warm-up. Exits non-zero when the budget is exceeded.
+    import os
+    import sys
+    import subprocess
+
+    budget_ms = float(os.environ.get('COLD_START_BUDGET_MS', 500))
+    ml_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = (
+        "import time; start = time.perf_counter()\n"
+        "from app import create_app\n"
+        "response = create_app().test_client().get('/api/health')\n"
+        "assert response.status_code == 200\n"
+        "print((time.perf_counter() - start) * 1000)\n"
+    )
+    env = dict(os.environ, WARM_UP_COMPONENTS='False')
+    output = subprocess.run([sys.executable, "-c", script], cwd=ml_dir, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    elapsed_ms = float(output.strip().splitlines()[-1])
+
+    print(f"Cold start to first health check: {elapsed_ms:.0f} ms (budget {budget_ms:.0f} ms)")
+    sys.exit(0 if elapsed_ms <= budget_ms else 1)
@@ -0,0 +1,223 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from utils.image_encoding import ImageEncoder
+
+logger = logging.getLogger(__name__)
+
+# File in the cache directory recording the LRU order, oldest key first
+INDEX_NAME = "lru_index.json"
+
+# Digests memoized on (path, size, mtime) so unchanged inputs are hashed once
+_file_digests = OrderedDict()
+_file_digests_lock = threading.Lock()
+
+def file_digest(path):
+    """
+    SHA-256 of a file's contents, memoized on path, size and modification time.
+
+    Args:
+        path: File to hash
+
+    Returns:
+        str: Hex digest
+    """
+    stat = os.stat(path)
+    memo_key = (os.path.realpath(path), stat.st_size, stat.st_mtime_ns)
+    with _file_digests_lock:
+        if memo_key in _file_digests:
+            _file_digests.move_to_end(memo_key)
+            return _file_digests[memo_key]
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    digest = digest.hexdigest()
+
+    with _file_digests_lock:
+        _file_digests[memo_key] = digest
+        while len(_file_digests) > 1024:
+            _file_digests.popitem(last=False)
+    return digest
+
+class ResultCache:
+    """
+    Content-addressed cache of rendered try-on images on disk.
+    Keys hash the bytes of the input files together with the render parameters,
+    so identical requests share one stored PNG. The directory is bounded in bytes
+    and evicted least recently used first. Stored files are never modified after
+    they are written, so their ETag memo and Last-Modified date stay valid; the
+    LRU order is kept in an index file instead.
+    """
+
+    def __init__(self, cache_dir, max_bytes=512 * 1024 * 1024, extension=".png", encoder=None):
+        """
+        Initialize the cache and index any files already on disk.
+
+        Args:
+            cache_dir: Directory holding the cached results
+            max_bytes: Maximum total size of the cached files
+            extension: File extension of the stored results
+            encoder: ImageEncoder used to store results
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.extension = extension
+        self.encoder = encoder or ImageEncoder()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._scan()
+
+    def file_digest(self, path):
+        """SHA-256 of a file's contents, see file_digest."""
+        return file_digest(path)
+
+    def make_key(self, input_paths, params):
+        """
+        Build the content address for a render.
+
+        Args:
+            input_paths: Input files whose bytes determine the result
+            params: JSON-serializable render parameters
+
+        Returns:
+            str: Hex key
+        """
+        key = hashlib.sha256()
+        for path in input_paths:
+            key.update(self.file_digest(path).encode('ascii'))
+        key.update(json.dumps(params, sort_keys=True, default=str).encode('utf-8'))
+        return key.hexdigest()
+
+    def path_for(self, key):
+        """Path where the result for a key is stored."""
+        return os.path.join(self.cache_dir, f"{key}{self.extension}")
+
+    def get(self, key):
+        """
+        Look up a cached result.
+
+        Args:
+            key: Key from make_key
+
+        Returns:
+            str: Path of the cached file, or None on a miss
+        """
+        path = self.path_for(key)
+        with self._lock:
+            if not os.path.exists(path):
+                self._forget(key)
+                self.misses += 1
+                return None
+            self._touch(key, path)
+            self.hits += 1
+        return path
+
+    def put(self, key, image):
+        """
+        Encode and store a rendered image.
+
+        Args:
+            key: Key from make_key
+            image: uint8 image array
+
+        Returns:
+            str: Path of the stored file
+        """
+        path = self.path_for(key)
+        # Written under a temporary name so readers never see a partial file
+        self.encoder.write(path, image)
+
+        self.adopt(key)
+        return path
+
+    def adopt(self, key):
+        """
+        Index a result written to path_for(key) by another process, then evict.
+
+        Args:
+            key: Key from make_key
+        """
+        path = self.path_for(key)
+        with self._lock:
+            if os.path.exists(path):
+                self._touch(key, path)
+            self._evict()
+            self._save_index()
+
+    def stats(self):
+        """Return entry count, size and hit/miss counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions
+            }
+
+    def _scan(self):
+        # Rebuild the LRU order after a restart: indexed keys in their saved order,
+        # files the index does not know yet after them by modification time
+        try:
+            with open(os.path.join(self.cache_dir, INDEX_NAME)) as f:
+                order = {key: position for position, key in enumerate(json.load(f))}
+        except (OSError, ValueError):
+            order = {}
+
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(self.extension) or '.tmp' in name:
+                continue
+            path = os.path.join(self.cache_dir, name)
+            stat = os.stat(path)
+            key = name[:-len(self.extension)]
+            files.append(((key not in order, order.get(key, 0), stat.st_mtime), key, stat.st_size))
+
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._total_bytes += size
+        self._evict()
+
+    def _save_index(self):
+        # Written on every store, so hits since the last one are lost on a crash at worst
+        path = os.path.join(self.cache_dir, INDEX_NAME)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(list(self._entries), f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not save result cache index: {str(e)}")
+
+    def _touch(self, key, path):
+        size = os.path.getsize(path)
+        self._total_bytes += size - self._entries.get(key, 0)
+        self._entries[key] = size
+        self._entries.move_to_end(key)
+
+    def _forget(self, key):
+        self._total_bytes -= self._entries.pop(key, 0)
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self.path_for(key))
+            except OSError as e:
+                logger.warning(f"Could not evict cached result {key}: {str(e)}")
@@ -0,0 +1,73 @@
+import os
+import shutil
+import logging
+import tempfile
+from flask import Request, current_app
+
+logger = logging.getLogger(__name__)
+
+# Suffix of upload parts being written by the multipart parser
+PART_SUFFIX = ".part"
+COPY_CHUNK_SIZE = 1024 * 1024
+
+class StreamingUploadRequest(Request):
+    """
+    Request whose multipart file parts are written straight to disk.
+    Werkzeug's default keeps uploads in a spooled temporary file, in memory up
+    to 500 KB and then under the system temp dir, and FileStorage.save copies
+    it once more. Here the parser writes each chunk into a part file in the
+    app's UPLOAD_TMP_DIR, so save_upload only renames it into place. Parts
+    nobody saved are removed when the request closes.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        upload_dir = current_app.config.get('UPLOAD_TMP_DIR') if filename else None
+        if not upload_dir:
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+
+        os.makedirs(upload_dir, exist_ok=True)
+        part = tempfile.NamedTemporaryFile('wb+', dir=upload_dir, prefix='upload-', suffix=PART_SUFFIX, delete=False)
+        if not hasattr(self, '_upload_parts'):
+            self._upload_parts = []
+        self._upload_parts.append(part.name)
+        return part
+
+    def close(self):
+        super().close()
+        for path in getattr(self, '_upload_parts', ()):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+def save_upload(file, path):
+    """
+    Store an uploaded file at path.
+    A part streamed to disk by StreamingUploadRequest is renamed into place;
+    any other upload is copied in chunks. Either way the destination appears
+    atomically.
+
+    Args:
+        file: werkzeug FileStorage from request.files
+        path: Destination file
+
+    Returns:
+        int: Size of the stored file in bytes
+    """
+    stream = file.stream
+    part_path = getattr(stream, 'name', None)
+    if isinstance(part_path, str) and part_path.endswith(PART_SUFFIX) and os.path.exists(part_path):
+        stream.flush()
+        try:
+            os.replace(part_path, path)
+            return os.path.getsize(path)
+        except OSError as e:
+            # Upload dir and destination on different filesystems
+            logger.debug(f"Could not rename upload part {part_path}: {str(e)}")
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    stream.seek(0)
+    with open(tmp_path, 'wb') as f:
+        shutil.copyfileobj(stream, f, COPY_CHUNK_SIZE)
+    os.replace(tmp_path, path)
+    return os.path.getsize(path)
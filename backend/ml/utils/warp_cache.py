@@ -0,0 +1,254 @@
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class WarpFieldCache:
+    """
+    Bounded LRU cache of float32 (map_x, map_y) remap grids.
+    Warp fields depend only on body shape, a few measurement ratios, the dress type
+    and the image sizes, so requests falling into the same bucket share one grid.
+    Entries can optionally be persisted as .npy files and memory-mapped back.
+    Both the in-memory entries and the persist directory are bounded in bytes,
+    since a grid pair grows with the image size, and evicted least recently used
+    first.
+    """
+
+    def __init__(self, max_bytes=128 * 1024 * 1024, persist_dir=None,
+                 persist_max_bytes=512 * 1024 * 1024, ratio_step=0.02):
+        """
+        Initialize the cache.
+
+        Args:
+            max_bytes: Maximum total size of the warp fields kept in memory
+            persist_dir: Optional directory for .npy copies of the warp fields
+            persist_max_bytes: Maximum total size of the files in persist_dir
+            ratio_step: Bucket width used when quantizing measurement ratios
+        """
+        self.max_bytes = max_bytes
+        self.persist_max_bytes = persist_max_bytes
+        self.ratio_step = ratio_step
+        self.persist_dir = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        # Persisted warp fields by file digest, with the size of both files
+        self._persisted = OrderedDict()
+        self._persisted_bytes = 0
+        self._lock = threading.Lock()
+
+        if persist_dir:
+            self.set_persist_dir(persist_dir)
+
+    def set_max_bytes(self, max_bytes, persist_max_bytes=None):
+        """
+        Change the size limits and evict down to them.
+
+        Args:
+            max_bytes: Maximum total size of the warp fields kept in memory
+            persist_max_bytes: Optional new maximum size of the persist directory
+        """
+        with self._lock:
+            self.max_bytes = max_bytes
+            if persist_max_bytes is not None:
+                self.persist_max_bytes = persist_max_bytes
+            self._evict()
+            self._evict_persisted()
+
+    def set_persist_dir(self, persist_dir):
+        """
+        Enable on-disk persistence of warp fields and index the files already there.
+
+        Args:
+            persist_dir: Directory to store the .npy files in, or None to disable
+        """
+        if persist_dir:
+            os.makedirs(persist_dir, exist_ok=True)
+        with self._lock:
+            self.persist_dir = persist_dir
+            self._persisted.clear()
+            self._persisted_bytes = 0
+            if persist_dir:
+                self._scan()
+
+    def quantize(self, value, step=None):
+        """
+        Snap a measurement ratio to the centre of its bucket.
+
+        Args:
+            value: Ratio to quantize
+            step: Optional bucket width, defaults to the cache ratio_step
+
+        Returns:
+            float: Bucketed ratio
+        """
+        step = step or self.ratio_step
+        return round(round(value / step) * step, 6)
+
+    @staticmethod
+    def make_key(*parts):
+        """Build a cache key from shape, bucket and size components."""
+        return "_".join(str(part) for part in parts)
+
+    def get_or_build(self, key, builder):
+        """
+        Return the warp field for a key, building it on a miss.
+
+        Args:
+            key: Cache key from make_key
+            builder: Callable returning (map_x, map_y) for this key
+
+        Returns:
+            Tuple of float32 (map_x, map_y) arrays, treat them as read-only
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        maps = self._load(key)
+        if maps is None:
+            map_x, map_y = builder()
+            maps = (np.ascontiguousarray(map_x, dtype=np.float32),
+                    np.ascontiguousarray(map_y, dtype=np.float32))
+            self._save(key, maps)
+            with self._lock:
+                self.misses += 1
+        else:
+            with self._lock:
+                self.hits += 1
+
+        with self._lock:
+            self._total_bytes += maps[0].nbytes + maps[1].nbytes - self._entry_bytes(self._entries.get(key))
+            self._entries[key] = maps
+            self._entries.move_to_end(key)
+            self._evict()
+
+        return maps
+
+    def clear(self):
+        """Drop all in-memory entries and reset counters."""
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        """Return cache sizes and hit/miss counters."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "persist_dir": self.persist_dir,
+                "persisted": len(self._persisted),
+                "persisted_bytes": self._persisted_bytes,
+                "persist_max_bytes": self.persist_max_bytes
+            }
+
+    @staticmethod
+    def _entry_bytes(maps):
+        return maps[0].nbytes + maps[1].nbytes if maps is not None else 0
+
+    def _digest(self, key):
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    def _paths(self, digest):
+        return (os.path.join(self.persist_dir, f"{digest}_x.npy"),
+                os.path.join(self.persist_dir, f"{digest}_y.npy"))
+
+    def _load(self, key):
+        if not self.persist_dir:
+            return None
+        digest = self._digest(key)
+        path_x, path_y = self._paths(digest)
+        if not (os.path.exists(path_x) and os.path.exists(path_y)):
+            return None
+        try:
+            maps = (np.load(path_x, mmap_mode='r'), np.load(path_y, mmap_mode='r'))
+        except Exception as e:
+            logger.warning(f"Could not load persisted warp field {key}: {str(e)}")
+            return None
+        with self._lock:
+            self._touch_persisted(digest)
+        return maps
+
+    def _save(self, key, maps):
+        if not self.persist_dir:
+            return
+        digest = self._digest(key)
+        try:
+            # Write to temporary names first so concurrent workers never read partial files
+            for path, grid in zip(self._paths(digest), maps):
+                tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    np.save(f, grid)
+                os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Could not persist warp field {key}: {str(e)}")
+            return
+        with self._lock:
+            self._touch_persisted(digest)
+            self._evict_persisted()
+
+    def _scan(self):
+        # Rebuild the LRU order of the persist directory from modification times
+        files = {}
+        for name in os.listdir(self.persist_dir):
+            if not name.endswith("_x.npy") and not name.endswith("_y.npy"):
+                continue
+            stat = os.stat(os.path.join(self.persist_dir, name))
+            mtime, size = files.get(name[:-len("_x.npy")], (0, 0))
+            files[name[:-len("_x.npy")]] = (max(mtime, stat.st_mtime), size + stat.st_size)
+
+        for digest, (_, size) in sorted(files.items(), key=lambda item: item[1][0]):
+            self._persisted[digest] = size
+            self._persisted_bytes += size
+        self._evict_persisted()
+
+    def _touch_persisted(self, digest):
+        size = 0
+        for path in self._paths(digest):
+            try:
+                size += os.path.getsize(path)
+                # Keep the on-disk order in step so a restart rebuilds the same LRU
+                os.utime(path)
+            except OSError:
+                pass
+        self._persisted_bytes += size - self._persisted.get(digest, 0)
+        self._persisted[digest] = size
+        self._persisted.move_to_end(digest)
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            _, maps = self._entries.popitem(last=False)
+            self._total_bytes -= self._entry_bytes(maps)
+            self.evictions += 1
+
+    def _evict_persisted(self):
+        while self._persisted_bytes > self.persist_max_bytes and len(self._persisted) > 1:
+            digest, size = self._persisted.popitem(last=False)
+            self._persisted_bytes -= size
+            # Workers that memory-mapped the files keep their mapping after the unlink
+            for path in self._paths(digest):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logger.warning(f"Could not evict persisted warp field {digest}: {str(e)}")
+
+# Process-wide cache shared by the fitting room and dress transformer
+shared_warp_cache = WarpFieldCache()